@@ -0,0 +1,116 @@
+from db import get_db
+from repositories import list_students, user_topic_stats
+
+
+def _empty_progress():
+    return {
+        "overall_accuracy": 0,
+        "total_attempts": 0,
+        "topic_stats": {},
+        "weaknesses": []
+    }
+
+
+def compute_cohort_progress(user_ids):
+    """Progress for many students from one read of user_topic_stats.
+
+    Returns {user_id: progress} where progress has the same shape as
+    compute_overall_progress_for_user.
+    """
+    user_ids = [int(uid) for uid in user_ids]
+    if not user_ids:
+        return {}
+
+    result = {uid: _empty_progress() for uid in user_ids}
+
+    # user_topic_stats only holds smart/bank attempts, already grouped by topic
+    correct_by_user = {}
+    for r in user_topic_stats(get_db(), user_ids):
+        prog = result[r["user_id"]]
+        prog["total_attempts"] += r["total"]
+        correct_by_user[r["user_id"]] = correct_by_user.get(r["user_id"], 0) + r["correct"]
+        if not r["topic"]:
+            # attempts on deleted questions: in the totals, under no topic
+            continue
+        acc = int(r["correct"] * 100 / r["total"]) if r["total"] else 0
+        prog["topic_stats"][r["topic"]] = {
+            "name": r["topic"],
+            "accuracy": acc,
+            "correct": r["correct"],
+            "total": r["total"]
+        }
+        if acc <= 50:
+            prog["weaknesses"].append(r["topic"])
+
+    for uid, correct in correct_by_user.items():
+        prog = result[uid]
+        total = prog["total_attempts"]
+        prog["overall_accuracy"] = int(correct * 100 / total) if total else 0
+
+    return result
+
+
+def compute_student_overview():
+    """Rows for the mentor students table: one users query + one stats query."""
+    students = list_students(get_db())
+    progress = compute_cohort_progress([s["id"] for s in students])
+
+    result = []
+    for s in students:
+        prog = progress[s["id"]]
+        result.append({
+            "id": s["id"],
+            "name": s["name"],
+            "overall_accuracy": prog["overall_accuracy"],
+            "total_attempts": prog["total_attempts"],
+            "weaknesses": prog["weaknesses"]
+        })
+    return result
+
+
+
+# attempts on a deleted question keep counting towards the totals, under
+# topic ''; migration 9's triggers keep the projection to the same rule
+# when questions are added, deleted or moved to another topic
+TOPIC_STATS_FROM_ATTEMPTS = """
+    SELECT qa.user_id,
+           COALESCE(q.topic, '') AS topic,
+           SUM(CASE WHEN qa.is_correct = 1 THEN 1 ELSE 0 END) AS correct,
+           COUNT(*) AS total
+    FROM quiz_attempts qa
+    LEFT JOIN questions q ON q.id = qa.question_id
+    WHERE qa.source = 'bank'
+    GROUP BY qa.user_id, COALESCE(q.topic, '')
+"""
+
+
+def rebuild_topic_stats(db):
+    """Recompute user_topic_stats from raw attempts; returns the row count."""
+    c = db.cursor()
+    db.begin_exclusive()
+    c.execute("DELETE FROM user_topic_stats")
+    c.execute("""
+        INSERT INTO user_topic_stats (user_id, topic, correct, total)
+    """ + TOPIC_STATS_FROM_ATTEMPTS)
+    rows = c.rowcount
+    db.commit()
+    return rows
+
+
+def verify_topic_stats(db):
+    """Compare user_topic_stats with raw attempts.
+
+    Returns a list of (user_id, topic, stored (correct, total),
+    expected (correct, total)) for every row that differs.
+    """
+    c = db.cursor()
+    c.execute(TOPIC_STATS_FROM_ATTEMPTS)
+    expected = {(r["user_id"], r["topic"]): (r["correct"], r["total"]) for r in c.fetchall()}
+    c.execute("SELECT user_id, topic, correct, total FROM user_topic_stats")
+    stored = {(r["user_id"], r["topic"]): (r["correct"], r["total"]) for r in c.fetchall()}
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((key[0], key[1], stored.get(key), expected.get(key)))
+    return mismatches
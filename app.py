@@ -1,15 +1,50 @@
+import base64
+import json
 import os
+import time
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, session, jsonify, flash, g,
+    stream_with_context
+)
 from flask_cors import CORS
 from dotenv import load_dotenv
-import requests
+import click
+from flask.cli import AppGroup
 
-from db import get_db, close_db, init_db
+# load .env before the local modules below read their SMARTPATH_* settings
+load_dotenv()
 
-COURSE_NAME = "SMARTPATH"
+from db import get_db, close_db, init_db, pool_stats, run_write, writer_stats
+from analytics import (
+    compute_cohort_progress, compute_student_overview, rebuild_topic_stats, verify_topic_stats
+)
+from catalog_cache import catalog_cache
+from explanation_cache import explanation_cache, prompt_key
+from explanations import explanation_queue
+from identity import user_cache
+from llm_client import GeminiClient, LLMError
+from metrics import flatten_stats, observe_gemini, route_metrics
+from question_index import question_index
+from quiz_sessions import quiz_sessions
+from rate_limit import ai_limiter
+from repositories import (
+    ASSIGNMENT_STATUS_FILTERS, answer_mentor_message, assignment_submissions, explainable_questions,
+    find_login, first_mentor, get_assignment, get_user, insert_assignment, insert_lesson,
+    insert_mentor_message, insert_mentor_quiz, insert_mentor_quiz_question,
+    insert_user, lessons_by, list_assignments, list_lessons, list_quizzes, mentor_messages_page,
+    quiz_questions, quizzes_by, save_feedback, save_submission, student_assignment_count,
+    student_assignment_rows, unanswered_count
+)
+from synthetic import generate_dataset
 
-load_dotenv()
+COURSE_NAME = "SMARTPATH"
+SMART_QUIZ_SIZE = 5
+MAX_BATCH_ANSWERS = 100
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+# render the dashboard's initial data into the page instead of fetching it
+INLINE_STUDENT_BOOTSTRAP = os.getenv("SMARTPATH_INLINE_BOOTSTRAP", "1") == "1"
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "super-secret-key")
@@ -17,18 +52,126 @@ CORS(app)
 
 # Gemini v2 config
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_URL = os.getenv(
+    "GEMINI_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+)
+gemini_client = GeminiClient(
+    GEMINI_URL,
+    GEMINI_API_KEY,
+    stream_url=os.getenv("GEMINI_STREAM_URL"),
+    timeout=float(os.getenv("GEMINI_TIMEOUT", "20")),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "2")),
+    # share one upstream call among identical prompts in flight
+    coalesce=os.getenv("GEMINI_COALESCE", "1") == "1",
+)
+
+# DB lifecycle: schema and seed data are bootstrapped once at startup, never
+# per request. Serve with `flask --app app:create_app run` (or python app.py);
+# `flask --app app smartpath init-db` runs the same bootstrap on its own.
+smartpath_cli = AppGroup("smartpath", help="SmartPath maintenance commands.")
+app.cli.add_command(smartpath_cli)
+
+
+@smartpath_cli.command("init-db")
+def init_db_command():
+    """Apply pending schema migrations and seed starter data."""
+    applied = init_db()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        click.echo("Database schema is up to date.")
 
-# DB lifecycle
-db_initialized = False
 
+@smartpath_cli.command("warm-explanations")
+def warm_explanations_command():
+    """Fill the explanation cache for every question and option in the bank."""
+    if not GEMINI_API_KEY:
+        raise click.ClickException(GEMINI_NOT_CONFIGURED)
+    db = get_db()
+    rows = explainable_questions(db)
 
-@app.before_request
-def initialize_database_once():
-    global db_initialized
-    if not db_initialized:
+    filled = skipped = failed = 0
+    for r in rows:
+        for option in ("a", "b", "c", "d"):
+            prompt = explanation_prompt(r["question"], option, r["correct_option"])
+            if explanation_cache.get(db, prompt_key(prompt)) is not None:
+                skipped += 1
+            elif explain_and_cache(prompt) == GEMINI_UNAVAILABLE:
+                failed += 1
+            else:
+                filled += 1
+    click.echo(f"Explanations cached: {filled}, already cached: {skipped}, failed: {failed}")
+
+
+@smartpath_cli.command("rebuild-topic-stats")
+def rebuild_topic_stats_command():
+    """Recompute the user_topic_stats projection from raw quiz attempts."""
+    rows = rebuild_topic_stats(get_db())
+    click.echo(f"Rebuilt user_topic_stats: {rows} rows.")
+
+
+@smartpath_cli.command("verify-topic-stats")
+def verify_topic_stats_command():
+    """Check user_topic_stats against raw quiz attempts."""
+    mismatches = verify_topic_stats(get_db())
+    for user_id, topic, stored, expected in mismatches:
+        click.echo(f"user {user_id} topic {topic!r}: stored {stored}, expected {expected}")
+    if mismatches:
+        raise click.ClickException(
+            f"{len(mismatches)} mismatched rows; run `flask --app app smartpath rebuild-topic-stats`."
+        )
+    click.echo("user_topic_stats matches quiz_attempts.")
+
+
+@smartpath_cli.command("generate-data")
+@click.option("--students", default=1000, show_default=True)
+@click.option("--mentors", default=10, show_default=True)
+@click.option("--questions", default=500, show_default=True)
+@click.option("--attempts", default=100000, show_default=True, help="Total quiz attempts.")
+@click.option("--assignments", default=20, show_default=True)
+@click.option("--submission-rate", default=0.5, show_default=True,
+              help="Chance each student submitted each assignment.")
+@click.option("--messages", default=5000, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+def generate_data_command(**options):
+    """Load a synthetic course for benchmarking (password: synthetic)."""
+    init_db()
+    start = time.perf_counter()
+    counts = generate_dataset(get_db(), **options)
+    for table, rows in counts.items():
+        click.echo(f"{table}: {rows}")
+    click.echo(f"Loaded in {time.perf_counter() - start:.1f}s")
+
+
+def create_app(warm=False):
+    """Bootstrap the database and return the app, ready to serve.
+
+    warm=True also fills what requests would otherwise load on first
+    use, so a server forking workers from this process hands each of
+    them warm caches.
+    """
+    with app.app_context():
         init_db()
-        db_initialized = True
+        if warm:
+            warm_caches()
+    return app
+
+
+def warm_caches():
+    """Load the question index and the shared catalogs, and compile every
+    template."""
+    db = get_db()
+    question_index.refresh(db)
+    for name, build in (
+        ("lessons", lesson_catalog),
+        ("manual_quizzes", manual_quiz_catalog),
+        ("assignments", assignment_catalog),
+    ):
+        catalog_cache.get(db, name, build, app.json.dumps)
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
 
 
 @app.teardown_appcontext
@@ -36,14 +179,37 @@ def teardown_db(exception):
     close_db()
 
 
+@app.before_request
+def start_request_metrics():
+    route_metrics.start_request()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    return route_metrics.finish_request(response)
+
+
 # Helpers
 def current_user():
+    """The logged-in users row, looked up at most once per request."""
     if "user_id" not in session:
         return None
-    db = get_db()
-    c = db.cursor()
-    c.execute("SELECT * FROM users WHERE id = ?", (session["user_id"],))
-    return c.fetchone()
+    if "user" in g:
+        user_cache.count("request_hits")
+        return g.user
+
+    g.user = load_user(session["user_id"])
+    return g.user
+
+
+def load_user(user_id):
+    """The users row for user_id, from user_cache when it has it."""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = get_user(get_db(), user_id)
+        user_cache.count("db_lookups")
+        user_cache.put(user_id, user)
+    return user
 
 
 def login_required(role=None):
@@ -60,81 +226,69 @@ def login_required(role=None):
     return decorator
 
 
+GEMINI_NOT_CONFIGURED = "Gemini API key not configured on server."
+GEMINI_UNAVAILABLE = "Error contacting AI service."
+AI_MENTOR_EMPTY_MESSAGE = "Type a question so I can actually help you."
+
+
 def call_gemini(prompt: str) -> str:
     if not GEMINI_API_KEY:
-        return "Gemini API key not configured on server."
+        return GEMINI_NOT_CONFIGURED
+    start = time.perf_counter()
     try:
-        headers = {
-            "Content-Type": "application/json",
-            "X-goog-api-key": GEMINI_API_KEY
-        }
-        payload = {
-            "contents": [
-                {
-                    "parts": [{"text": prompt}]
-                }
-            ]
-        }
-        resp = requests.post(GEMINI_URL, headers=headers, json=payload, timeout=20)
-        data = resp.json()
-        text = data["candidates"][0]["content"]["parts"][0]["text"]
-        return text.strip()
-    except Exception as e:
+        return gemini_client.generate(prompt)
+    except LLMError as e:
         print("Gemini error:", e)
-        return "Error contacting AI service."
+        return GEMINI_UNAVAILABLE
+    finally:
+        observe_gemini(time.perf_counter() - start)
 
 
-def compute_overall_progress_for_user(user_id: int):
-    db = get_db()
-    c = db.cursor()
-
-    # only count smart/bank questions in analytics
-    c.execute("""
-        SELECT COUNT(*) AS total
-        FROM quiz_attempts
-        WHERE user_id = ? AND source = 'bank'
-    """, (user_id,))
-    total_attempts = c.fetchone()["total"]
-
-    c.execute("""
-        SELECT COUNT(*) AS correct
-        FROM quiz_attempts
-        WHERE user_id = ? AND is_correct = 1 AND source = 'bank'
-    """, (user_id,))
-    correct_attempts = c.fetchone()["correct"]
-
-    overall_accuracy = int(correct_attempts * 100 / total_attempts) if total_attempts else 0
-
-    c.execute("""
-        SELECT q.topic,
-               SUM(CASE WHEN qa.is_correct = 1 THEN 1 ELSE 0 END) AS correct,
-               COUNT(*) AS total
-        FROM quiz_attempts qa
-        JOIN questions q ON q.id = qa.question_id
-        WHERE qa.user_id = ? AND qa.source = 'bank'
-        GROUP BY q.topic
-    """, (user_id,))
-    rows = c.fetchall()
-
-    topic_stats = {}
-    weaknesses = []
-    for r in rows:
-        acc = int(r["correct"] * 100 / r["total"]) if r["total"] else 0
-        topic_stats[r["topic"]] = {
-            "name": r["topic"],
-            "accuracy": acc,
-            "correct": r["correct"],
-            "total": r["total"]
-        }
-        if acc <= 50:
-            weaknesses.append(r["topic"])
+def stream_gemini(prompt: str):
+    """Like call_gemini, but yields the reply in chunks as they arrive."""
+    if not GEMINI_API_KEY:
+        yield GEMINI_NOT_CONFIGURED
+        return
+    sent_any = False
+    start = time.perf_counter()
+    try:
+        for chunk in gemini_client.stream(prompt):
+            sent_any = True
+            yield chunk
+    except LLMError as e:
+        print("Gemini error:", e)
+        if not sent_any:
+            yield GEMINI_UNAVAILABLE
+    finally:
+        observe_gemini(time.perf_counter() - start)
 
-    return {
-        "overall_accuracy": overall_accuracy,
-        "total_attempts": total_attempts,
-        "topic_stats": topic_stats,
-        "weaknesses": weaknesses
-    }
+
+def explanation_prompt(question: str, selected_option: str, correct_option: str) -> str:
+    return f"""
+    Question: {question}
+    Student's chosen option: {selected_option}
+    Correct option: {correct_option}
+
+    Explain in 2-3 simple sentences why the student's answer is correct or incorrect,
+    and give one small hint + one short recommended topic title.
+    """
+
+
+def throttled(throttle):
+    """The fast refusal for a call the AI rate limiter turned away."""
+    return jsonify(throttle.body()), throttle.status, {"Retry-After": str(throttle.retry_after)}
+
+
+def explain_and_cache(prompt: str) -> str:
+    """Ask Gemini for an explanation and keep it unless the call failed."""
+    text = call_gemini(prompt)
+    if text not in (GEMINI_NOT_CONFIGURED, GEMINI_UNAVAILABLE):
+        explanation_cache.put(prompt_key(prompt), text)
+    return text
+
+
+def compute_overall_progress_for_user(user_id: int):
+    return compute_cohort_progress([user_id])[user_id]
 
 
 # Routes: Landing
@@ -146,7 +300,6 @@ def index():
 # Registration
 @app.route("/register/student", methods=["GET", "POST"])
 def register_student():
-    db = get_db()
     if request.method == "POST":
         name = request.form.get("name", "").strip()
         email = request.form.get("email", "").strip()
@@ -155,13 +308,8 @@ def register_student():
         if not name or not email or not password:
             flash("All fields are required.", "error")
         else:
-            c = db.cursor()
             try:
-                c.execute("""
-                    INSERT INTO users (name, email, password, role)
-                    VALUES (?, ?, ?, 'student')
-                """, (name, email, password))
-                db.commit()
+                run_write(insert_user, name, email, password, "student")
                 flash("Student registered. Please login.", "success")
                 return redirect(url_for("login_student"))
             except Exception:
@@ -172,7 +320,6 @@ def register_student():
 
 @app.route("/register/mentor", methods=["GET", "POST"])
 def register_mentor():
-    db = get_db()
     if request.method == "POST":
         name = request.form.get("name", "").strip()
         email = request.form.get("email", "").strip()
@@ -181,13 +328,8 @@ def register_mentor():
         if not name or not email or not password:
             flash("All fields are required.", "error")
         else:
-            c = db.cursor()
             try:
-                c.execute("""
-                    INSERT INTO users (name, email, password, role)
-                    VALUES (?, ?, ?, 'mentor')
-                """, (name, email, password))
-                db.commit()
+                run_write(insert_user, name, email, password, "mentor")
                 flash("Mentor registered. Please login.", "success")
                 return redirect(url_for("login_mentor"))
             except Exception:
@@ -203,12 +345,7 @@ def login_student():
     if request.method == "POST":
         email = request.form.get("email", "").strip()
         password = request.form.get("password", "").strip()
-        c = db.cursor()
-        c.execute("""
-            SELECT * FROM users
-            WHERE email = ? AND password = ? AND role = 'student'
-        """, (email, password))
-        stu = c.fetchone()
+        stu = find_login(db, email, password, "student")
         if not stu:
             flash("Invalid student credentials or account not registered.", "error")
         else:
@@ -224,12 +361,7 @@ def login_mentor():
     if request.method == "POST":
         email = request.form.get("email", "").strip()
         password = request.form.get("password", "").strip()
-        c = db.cursor()
-        c.execute("""
-            SELECT * FROM users
-            WHERE email = ? AND password = ? AND role = 'mentor'
-        """, (email, password))
-        mentor = c.fetchone()
+        mentor = find_login(db, email, password, "mentor")
         if not mentor:
             flash("Invalid mentor credentials or account not registered.", "error")
         else:
@@ -241,6 +373,8 @@ def login_mentor():
 
 @app.route("/logout")
 def logout():
+    if "user_id" in session:
+        user_cache.invalidate(session["user_id"])
     session.clear()
     return redirect(url_for("index"))
 
@@ -250,7 +384,10 @@ def logout():
 @login_required(role="student")
 def student_dashboard():
     user = current_user()
-    return render_template("student_dashboard.html", user=user, course_name=COURSE_NAME)
+    bootstrap = student_bootstrap(user) if INLINE_STUDENT_BOOTSTRAP else None
+    return render_template(
+        "student_dashboard.html", user=user, course_name=COURSE_NAME, bootstrap=bootstrap
+    )
 
 
 @app.route("/mentor/dashboard")
@@ -261,12 +398,8 @@ def mentor_dashboard():
 
 
 # APIs: Progress & learning path
-@app.route("/api/student/progress")
-@login_required(role="student")
-def api_progress():
-    user = current_user()
-    prog = compute_overall_progress_for_user(user["id"])
-    data = {
+def student_progress(prog):
+    return {
         "overall_accuracy": prog["overall_accuracy"],
         "total_attempts": prog["total_attempts"],
         "time_spent_minutes": prog["total_attempts"] * 2,
@@ -274,30 +407,12 @@ def api_progress():
         "weaknesses": prog["weaknesses"],
         "topic_stats": prog["topic_stats"]
     }
-    return jsonify(data)
 
 
-@app.route("/api/student/learning-path")
-@login_required(role="student")
-def api_learning_path():
-    user = current_user()
-    db = get_db()
-    c = db.cursor()
-
-    c.execute("""
-        SELECT q.topic,
-               SUM(CASE WHEN qa.is_correct = 1 THEN 1 ELSE 0 END) AS correct,
-               COUNT(*) AS total
-        FROM quiz_attempts qa
-        JOIN questions q ON q.id = qa.question_id
-        WHERE qa.user_id = ? AND qa.source = 'bank'
-        GROUP BY q.topic
-    """, (user["id"],))
-    rows = c.fetchall()
-
+def learning_path(prog):
     path = []
-    for r in rows:
-        acc = int(r["correct"] * 100 / r["total"]) if r["total"] else 0
+    for topic, info in prog["topic_stats"].items():
+        acc = info["accuracy"]
         if acc >= 80:
             mastery = "strong"
             action = "Move to tougher problems and mixed-topic quizzes."
@@ -309,7 +424,7 @@ def api_learning_path():
             action = "Do a mix of revision and moderate problems."
 
         path.append({
-            "topic_name": r["topic"],
+            "topic_name": topic,
             "mastery": mastery,
             "action": action
         })
@@ -320,29 +435,46 @@ def api_learning_path():
             "mastery": "unknown",
             "action": "Start by taking your first smart quiz."
         }]
+    return path
 
-    return jsonify(path)
 
+def student_bootstrap(user):
+    """Every student dashboard section, built from one progress computation."""
+    prog = compute_overall_progress_for_user(user["id"])
+    return {
+        "progress": student_progress(prog),
+        "learning_path": learning_path(prog),
+        "lessons": catalog_cache.get(get_db(), "lessons", lesson_catalog, app.json.dumps).data,
+        "assignments": student_assignments(user["id"])[0],
+        "manual_quizzes": catalog_cache.get(get_db(), "manual_quizzes", manual_quiz_catalog, app.json.dumps).data
+    }
 
-# APIs: Quiz (smart + manual)
-@app.route("/api/student/manual-quizzes")
+
+@app.route("/api/student/bootstrap")
 @login_required(role="student")
-def api_student_manual_quizzes():
-    db = get_db()
-    c = db.cursor()
+def api_student_bootstrap():
+    return jsonify(student_bootstrap(current_user()))
+
+
+@app.route("/api/student/progress")
+@login_required(role="student")
+def api_progress():
+    user = current_user()
+    return jsonify(student_progress(compute_overall_progress_for_user(user["id"])))
+
+
+@app.route("/api/student/learning-path")
+@login_required(role="student")
+def api_learning_path():
+    user = current_user()
+    return jsonify(learning_path(compute_overall_progress_for_user(user["id"])))
+
+
+# APIs: Quiz (smart + manual)
+def manual_quiz_catalog():
     # Only quizzes that have at least one question
-    c.execute("""
-        SELECT mq.id, mq.title, mq.description, mq.created_at, u.name AS mentor_name,
-               COUNT(mqq.id) AS qcount
-        FROM mentor_quizzes mq
-        JOIN users u ON u.id = mq.created_by
-        JOIN mentor_quiz_questions mqq ON mqq.quiz_id = mq.id
-        GROUP BY mq.id
-        ORDER BY mq.created_at DESC
-    """)
-    rows = c.fetchall()
     res = []
-    for r in rows:
+    for r in list_quizzes(get_db()):
         res.append({
             "id": r["id"],
             "title": r["title"],
@@ -351,34 +483,56 @@ def api_student_manual_quizzes():
             "mentor_name": r["mentor_name"],
             "question_count": r["qcount"]
         })
-    return jsonify(res)
+    return res
+
+
+def cached_catalog(name, build):
+    """A shared catalog from catalog_cache, answered with a 304 when the
+    client's If-None-Match still matches."""
+    entry = catalog_cache.get(get_db(), name, build, app.json.dumps)
+    resp = app.response_class(entry.body, mimetype="application/json")
+    resp.set_etag(entry.etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.make_conditional(request)
+    if resp.status_code == 304:
+        catalog_cache.count("not_modified")
+    return resp
+
+
+@app.route("/api/student/manual-quizzes")
+@login_required(role="student")
+def api_student_manual_quizzes():
+    return cached_catalog("manual_quizzes", manual_quiz_catalog)
 
 
 @app.route("/api/student/quiz/generate", methods=["POST"])
 @login_required(role="student")
 def api_generate_quiz():
+    """Draw a quiz and open a session for it.
+
+    The answer key stays in the session; the response carries only the
+    session id and the questions.
+    """
+    user = current_user()
     db = get_db()
-    c = db.cursor()
     data = request.get_json() or {}
     mode = data.get("mode", "smart")
     quiz_id = data.get("quiz_id")
 
     if mode == "manual" and quiz_id:
-        c.execute("""
-            SELECT id, question, option_a, option_b, option_c, option_d, correct_option
-            FROM mentor_quiz_questions
-            WHERE quiz_id = ?
-        """, (quiz_id,))
-        rows = c.fetchall()
+        rows = quiz_questions(db, quiz_id)
+        quiz = quiz_sessions.create(user["id"], "manual", rows)
     else:
-        c.execute("""
-            SELECT id, topic, difficulty, question,
-                   option_a, option_b, option_c, option_d, correct_option
-            FROM questions
-            ORDER BY RANDOM()
-            LIMIT 5
-        """)
-        rows = c.fetchall()
+        # optional narrowing: {"topic": ..., "difficulty": ..., "stratify": true}
+        ids = question_index.sample_ids(
+            db,
+            SMART_QUIZ_SIZE,
+            topic=data.get("topic") or None,
+            difficulty=data.get("difficulty") or None,
+            stratify=bool(data.get("stratify"))
+        )
+        rows = question_index.fetch(db, ids)
+        quiz = quiz_sessions.create(user["id"], "bank", rows, question_index.version)
 
     questions = []
     for q in rows:
@@ -388,10 +542,54 @@ def api_generate_quiz():
             "option_a": q["option_a"],
             "option_b": q["option_b"],
             "option_c": q["option_c"],
-            "option_d": q["option_d"],
-            "correct_option": q["correct_option"]
+            "option_d": q["option_d"]
         })
-    return jsonify(questions)
+    return jsonify({"session_id": quiz.id, "questions": questions})
+
+
+QUIZ_SESSION_EXPIRED = "Quiz session expired. Generate a new quiz."
+
+
+def grade_answers(db, user_id, quiz, answers):
+    """Grade [(question_id, selected_option)] against the session's key.
+
+    Every answer that grades is recorded, with its quiz attempt, in one
+    group-committed write; returns one result dict per answer, in order.
+    """
+    version = question_index.current_version(db) if quiz.source == "bank" else None
+    key = quiz_sessions.answer_key(db, quiz, version)
+    drawn = set(quiz.question_ids)
+
+    results = []
+    graded = []
+    for question_id, selected_option in answers:
+        entry = key.get(question_id)
+        if question_id not in drawn:
+            results.append({"question_id": question_id, "error": "Question not in this quiz"})
+        elif entry is None:
+            results.append({"question_id": question_id, "error": "Question not found"})
+        else:
+            is_correct = 1 if selected_option == entry["correct_option"] else 0
+            graded.append((question_id, selected_option, is_correct))
+            results.append({
+                "question_id": question_id,
+                "is_correct": bool(is_correct),
+                "correct_option": entry["correct_option"]
+            })
+
+    recorded = set()
+    if graded:
+        recorded = quiz_sessions.record(quiz, user_id, graded, datetime.utcnow().isoformat())
+    for i, result in enumerate(results):
+        question_id = result["question_id"]
+        if "error" in result:
+            continue
+        if question_id in recorded:
+            # a question listed twice in one batch is recorded only once
+            recorded.discard(question_id)
+        else:
+            results[i] = {"question_id": question_id, "error": "Question already answered"}
+    return results
 
 
 @app.route("/api/student/quiz/submit", methods=["POST"])
@@ -400,84 +598,174 @@ def api_submit_quiz():
     user = current_user()
     db = get_db()
     data = request.get_json() or {}
-    question_id = data.get("question_id")
+    quiz = quiz_sessions.get(db, data.get("session_id"), user["id"])
+    if quiz is None:
+        return jsonify({"error": QUIZ_SESSION_EXPIRED}), 400
+    try:
+        question_id = int(data.get("question_id"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Question not found"}), 400
     selected_option = data.get("selected_option")
-    mode = data.get("mode", "smart")
-
-    c = db.cursor()
-    source = "manual" if mode == "manual" else "bank"
 
-    if source == "manual":
-        c.execute("SELECT * FROM mentor_quiz_questions WHERE id = ?", (question_id,))
+    result = grade_answers(db, user["id"], quiz, [(question_id, selected_option)])[0]
+    if "error" in result:
+        return jsonify({"error": result["error"]}), 400
+
+    result["recommendation"] = "Focus on the concept mentioned in the explanation."
+    q = quiz.key[question_id]
+    explanation, throttle = request_explanation(db, user["id"], q, selected_option)
+    if throttle is not None:
+        # the answer is graded either way; /quiz/explain can fetch it later
+        result["explanation_error"] = throttle.message
+        result["retry_after"] = throttle.retry_after
     else:
-        c.execute("SELECT * FROM questions WHERE id = ?", (question_id,))
-    q = c.fetchone()
-    if not q:
-        return jsonify({"error": "Question not found"}), 400
+        result.update(explanation)
+    return jsonify(result)
 
-    is_correct = 1 if selected_option == q["correct_option"] else 0
 
-    c.execute("""
-        INSERT INTO quiz_attempts (user_id, question_id, is_correct, source, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user["id"], question_id, is_correct, source, datetime.utcnow().isoformat()))
-    db.commit()
+def request_explanation(db, user_id, q, selected_option):
+    """The cached explanation, or a background job to produce one.
 
-    prompt = f"""
-    Question: {q['question']}
-    Student's chosen option: {selected_option}
-    Correct option: {q['correct_option']}
+    Returns (response data, None), or (None, Throttle) when a Gemini call
+    is needed and the rate limiter refuses it.
+    """
+    prompt = explanation_prompt(q["question"], selected_option, q["correct_option"])
+    cached = explanation_cache.get(db, prompt_key(prompt))
+    if cached is not None:
+        return {"explanation": cached}, None
+    # every job costs the student a token; only one that starts an
+    # upstream call of its own, rather than joining the one in flight for
+    # the prompt, takes a global token, decided under the queue's lock
+    throttle = ai_limiter.acquire(user_id, shared=False)
+    if throttle is not None:
+        return None, throttle
+    job_id, throttle = explanation_queue.submit(user_id, explain_and_cache, prompt,
+                                                on_new=ai_limiter.acquire)
+    if throttle is not None:
+        ai_limiter.refund(user_id)
+        return None, throttle
+    return {
+        "explanation_job_id": job_id,
+        "explanation_url": url_for("api_quiz_explanation", job_id=job_id)
+    }, None
 
-    Explain in 2-3 simple sentences why the student's answer is correct or incorrect,
-    and give one small hint + one short recommended topic title.
+
+@app.route("/api/student/quiz/submit-batch", methods=["POST"])
+@login_required(role="student")
+def api_submit_quiz_batch():
+    """Grade a whole quiz: {"session_id": ..., "answers": [{"question_id", "selected_option"}]}.
+
+    All attempts go in with one executemany in one write. No AI call is
+    made here; the client asks /api/student/quiz/explain for the answers
+    the student expands.
     """
-    explanation_text = call_gemini(prompt)
+    user = current_user()
+    db = get_db()
+    data = request.get_json() or {}
+    quiz = quiz_sessions.get(db, data.get("session_id"), user["id"])
+    if quiz is None:
+        return jsonify({"error": QUIZ_SESSION_EXPIRED}), 400
+    answers = data.get("answers")
+    if not isinstance(answers, list) or not answers or len(answers) > MAX_BATCH_ANSWERS:
+        return jsonify({"error": f"answers must be a list of 1-{MAX_BATCH_ANSWERS} items"}), 400
+    try:
+        answers = [(int(a["question_id"]), a.get("selected_option")) for a in answers]
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return jsonify({"error": "Each answer needs a question_id"}), 400
 
+    results = grade_answers(db, user["id"], quiz, answers)
     return jsonify({
-        "is_correct": bool(is_correct),
-        "correct_option": q["correct_option"],
-        "explanation": explanation_text,
-        "recommendation": "Focus on the concept mentioned in the explanation."
+        "results": results,
+        "correct": sum(1 for r in results if r.get("is_correct")),
+        "graded": sum(1 for r in results if "error" not in r)
     })
 
 
-# APIs: Assignments
-@app.route("/api/student/assignments")
+@app.route("/api/student/quiz/explain", methods=["POST"])
 @login_required(role="student")
-def api_student_assignments():
+def api_explain_answer():
+    """Explanation for one answered question, requested when the student expands it."""
     user = current_user()
     db = get_db()
-    c = db.cursor()
+    data = request.get_json() or {}
+    quiz = quiz_sessions.get(db, data.get("session_id"), user["id"])
+    if quiz is None:
+        return jsonify({"error": QUIZ_SESSION_EXPIRED}), 400
+    try:
+        question_id = int(data.get("question_id"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Question not found"}), 400
+    # explaining an unanswered question would give the key away
+    if question_id not in quiz.answered or question_id not in quiz.key:
+        return jsonify({"error": "Answer the question first"}), 400
+    q = quiz.key[question_id]
+    explanation, throttle = request_explanation(db, user["id"], q, quiz.answered[question_id])
+    if throttle is not None:
+        return throttled(throttle)
+    return jsonify(explanation)
 
-    c.execute("SELECT * FROM assignments")
-    assignments = c.fetchall()
-    res = []
 
-    for a in assignments:
-        c.execute("""
-            SELECT * FROM assignment_submissions
-            WHERE assignment_id = ? AND student_id = ?
-        """, (a["id"], user["id"]))
-        sub = c.fetchone()
+@app.route("/api/student/quiz/explanations/<job_id>")
+@login_required(role="student")
+def api_quiz_explanation(job_id):
+    user = current_user()
+    job = explanation_queue.get(get_db(), job_id, user["id"])
+    if not job:
+        return jsonify({"error": "Explanation not found"}), 404
+    return jsonify(job)
+
+
+# APIs: Assignments
+def student_assignments(user_id, status=None, limit=None, offset=0):
+    """Assignments with this student's submission, in one query.
+
+    status narrows to "open", "overdue" or "submitted"; limit/offset page
+    through the result. Returns (rows, total matching rows).
+    """
+    db = get_db()
+    rows = student_assignment_rows(db, user_id, status, limit, offset)
+
+    res = []
+    for r in rows:
+        sub = r["submission_id"] is not None
         res.append({
-            "id": a["id"],
-            "title": a["title"],
-            "description": a["description"],
-            "due_date": a["due_date"],
+            "id": r["id"],
+            "title": r["title"],
+            "description": r["description"],
+            "due_date": r["due_date"],
             "submission": {
-                "content": sub["content"] if sub else None,
-                "submitted_at": sub["submitted_at"] if sub else None,
-                "feedback": sub["feedback"] if sub else None,
-                "rating": sub["rating"] if sub else None
-            } if sub else {
-                "content": None,
-                "submitted_at": None,
-                "feedback": None,
-                "rating": None
+                "content": r["content"] if sub else None,
+                "submitted_at": r["submitted_at"] if sub else None,
+                "feedback": r["feedback"] if sub else None,
+                "rating": r["rating"] if sub else None
             }
         })
+    if rows:
+        total = rows[0]["total"]
+    else:
+        # a page past the end has no row to carry the count
+        total = student_assignment_count(db, user_id, status) if offset else 0
+    return res, total
 
-    return jsonify(res)
+
+@app.route("/api/student/assignments")
+@login_required(role="student")
+def api_student_assignments():
+    """?status=open|overdue|submitted filters; ?limit=&offset= paginate,
+    with the unpaginated count in X-Total-Count."""
+    user = current_user()
+    status = request.args.get("status") or None
+    if status and status not in ASSIGNMENT_STATUS_FILTERS:
+        return jsonify({"error": "Invalid status filter"}), 400
+    limit = request.args.get("limit", type=int)
+    offset = request.args.get("offset", 0, type=int)
+    if (limit is not None and limit < 0) or offset < 0:
+        return jsonify({"error": "Invalid pagination"}), 400
+
+    res, total = student_assignments(user["id"], status, limit, offset)
+    resp = jsonify(res)
+    resp.headers["X-Total-Count"] = str(total)
+    return resp
 
 
 @app.route("/api/student/assignments/submit", methods=["POST"])
@@ -489,31 +777,10 @@ def api_submit_assignment():
     assignment_id = data.get("assignment_id")
     content = data.get("content", "")
 
-    c = db.cursor()
-    c.execute("SELECT * FROM assignments WHERE id = ?", (assignment_id,))
-    a = c.fetchone()
-    if not a:
+    if not get_assignment(db, assignment_id):
         return jsonify({"error": "Assignment not found"}), 400
 
-    c.execute("""
-        SELECT id FROM assignment_submissions
-        WHERE assignment_id = ? AND student_id = ?
-    """, (assignment_id, user["id"]))
-    existing = c.fetchone()
-
-    if existing:
-        c.execute("""
-            UPDATE assignment_submissions
-            SET content = ?, submitted_at = ?
-            WHERE id = ?
-        """, (content, datetime.utcnow().isoformat(), existing["id"]))
-    else:
-        c.execute("""
-            INSERT INTO assignment_submissions (assignment_id, student_id, content, submitted_at)
-            VALUES (?, ?, ?, ?)
-        """, (assignment_id, user["id"], content, datetime.utcnow().isoformat()))
-    db.commit()
-
+    run_write(save_submission, assignment_id, user["id"], content)
     return jsonify({"status": "ok"})
 
 
@@ -521,56 +788,34 @@ def api_submit_assignment():
 @app.route("/api/mentor/assignments", methods=["GET", "POST"])
 @login_required(role="mentor")
 def api_mentor_assignments():
-    db = get_db()
-    c = db.cursor()
-
     if request.method == "POST":
         data = request.get_json() or {}
         title = data.get("title")
         description = data.get("description")
         due_date = data.get("due_date")
-        c.execute("""
-            INSERT INTO assignments (title, description, due_date)
-            VALUES (?, ?, ?)
-        """, (title, description, due_date))
-        db.commit()
+        run_write(insert_assignment, title, description, due_date)
         return jsonify({"status": "created"})
 
-    c.execute("SELECT * FROM assignments")
-    assignments = c.fetchall()
+    return cached_catalog("assignments", assignment_catalog)
+
+
+def assignment_catalog():
     res = []
-    for a in assignments:
+    for a in list_assignments(get_db()):
         res.append({
             "id": a["id"],
             "title": a["title"],
             "description": a["description"],
             "due_date": a["due_date"]
         })
-    return jsonify(res)
+    return res
 
 
 @app.route("/api/mentor/assignments/<int:assignment_id>/submissions")
 @login_required(role="mentor")
 def api_mentor_submissions(assignment_id):
-    db = get_db()
-    c = db.cursor()
-
-    c.execute("""
-        SELECT s.id AS submission_id,
-               s.student_id,
-               u.name AS student_name,
-               s.content,
-               s.submitted_at,
-               s.feedback,
-               s.rating
-        FROM assignment_submissions s
-        JOIN users u ON u.id = s.student_id
-        WHERE s.assignment_id = ?
-    """, (assignment_id,))
-    rows = c.fetchall()
-
     res = []
-    for r in rows:
+    for r in assignment_submissions(get_db(), assignment_id):
         res.append({
             "submission_id": f"{assignment_id}_{r['student_id']}",
             "student_id": r["student_id"],
@@ -586,7 +831,6 @@ def api_mentor_submissions(assignment_id):
 @app.route("/api/mentor/submissions/feedback", methods=["POST"])
 @login_required(role="mentor")
 def api_mentor_feedback():
-    db = get_db()
     data = request.get_json() or {}
     submission_id = data.get("submission_id")
     feedback = data.get("feedback")
@@ -599,22 +843,8 @@ def api_mentor_feedback():
     except Exception:
         return jsonify({"error": "Invalid submission id"}), 400
 
-    c = db.cursor()
-    c.execute("""
-        SELECT id FROM assignment_submissions
-        WHERE assignment_id = ? AND student_id = ?
-    """, (assignment_id, student_id))
-    sub = c.fetchone()
-    if not sub:
+    if not run_write(save_feedback, assignment_id, student_id, feedback, rating):
         return jsonify({"error": "Submission not found"}), 400
-
-    c.execute("""
-        UPDATE assignment_submissions
-        SET feedback = ?, rating = ?
-        WHERE id = ?
-    """, (feedback, rating, sub["id"]))
-    db.commit()
-
     return jsonify({"status": "updated"})
 
 
@@ -622,38 +852,13 @@ def api_mentor_feedback():
 @app.route("/api/mentor/students")
 @login_required(role="mentor")
 def api_mentor_students():
-    db = get_db()
-    c = db.cursor()
-    c.execute("SELECT id, name FROM users WHERE role = 'student'")
-    students = c.fetchall()
-    result = []
-    for s in students:
-        prog = compute_overall_progress_for_user(s["id"])
-        result.append({
-            "id": s["id"],
-            "name": s["name"],
-            "overall_accuracy": prog["overall_accuracy"],
-            "total_attempts": prog["total_attempts"],
-            "weaknesses": prog["weaknesses"]
-        })
-    return jsonify(result)
+    return jsonify(compute_student_overview())
 
 
 # Lessons / classes
-@app.route("/api/student/lessons")
-@login_required(role="student")
-def api_student_lessons():
-    db = get_db()
-    c = db.cursor()
-    c.execute("""
-        SELECT l.id, l.title, l.description, l.video_url, l.topic, l.created_at, u.name AS mentor_name
-        FROM lessons l
-        LEFT JOIN users u ON u.id = l.created_by
-        ORDER BY l.created_at DESC
-    """)
-    rows = c.fetchall()
+def lesson_catalog():
     res = []
-    for r in rows:
+    for r in list_lessons(get_db()):
         res.append({
             "id": r["id"],
             "title": r["title"],
@@ -663,14 +868,18 @@ def api_student_lessons():
             "created_at": r["created_at"],
             "mentor_name": r["mentor_name"] or "Mentor"
         })
-    return jsonify(res)
+    return res
+
+
+@app.route("/api/student/lessons")
+@login_required(role="student")
+def api_student_lessons():
+    return cached_catalog("lessons", lesson_catalog)
 
 
 @app.route("/api/mentor/lessons", methods=["GET", "POST"])
 @login_required(role="mentor")
 def api_mentor_lessons():
-    db = get_db()
-    c = db.cursor()
     user = current_user()
 
     if request.method == "POST":
@@ -680,22 +889,11 @@ def api_mentor_lessons():
         video_url = data.get("video_url", "").strip()
         topic = data.get("topic", "").strip()
 
-        c.execute("""
-            INSERT INTO lessons (title, description, video_url, topic, created_by, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (title, description, video_url, topic, user["id"], datetime.utcnow().isoformat()))
-        db.commit()
+        run_write(insert_lesson, title, description, video_url, topic, user["id"])
         return jsonify({"status": "created"})
 
-    c.execute("""
-        SELECT l.id, l.title, l.description, l.video_url, l.topic, l.created_at
-        FROM lessons l
-        WHERE l.created_by = ?
-        ORDER BY l.created_at DESC
-    """, (user["id"],))
-    rows = c.fetchall()
     res = []
-    for r in rows:
+    for r in lessons_by(get_db(), user["id"]):
         res.append({
             "id": r["id"],
             "title": r["title"],
@@ -711,30 +909,17 @@ def api_mentor_lessons():
 @app.route("/api/mentor/quizzes", methods=["GET", "POST"])
 @login_required(role="mentor")
 def api_mentor_quizzes():
-    db = get_db()
-    c = db.cursor()
     user = current_user()
 
     if request.method == "POST":
         data = request.get_json() or {}
         title = data.get("title", "").strip()
         description = data.get("description", "").strip()
-        c.execute("""
-            INSERT INTO mentor_quizzes (title, description, created_by, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (title, description, user["id"], datetime.utcnow().isoformat()))
-        db.commit()
+        run_write(insert_mentor_quiz, title, description, user["id"])
         return jsonify({"status": "created"})
 
-    c.execute("""
-        SELECT id, title, description, created_at
-        FROM mentor_quizzes
-        WHERE created_by = ?
-        ORDER BY created_at DESC
-    """, (user["id"],))
-    rows = c.fetchall()
     res = []
-    for r in rows:
+    for r in quizzes_by(get_db(), user["id"]):
         res.append({
             "id": r["id"],
             "title": r["title"],
@@ -747,9 +932,6 @@ def api_mentor_quizzes():
 @app.route("/api/mentor/quizzes/<int:quiz_id>/questions", methods=["GET", "POST"])
 @login_required(role="mentor")
 def api_mentor_quiz_questions(quiz_id):
-    db = get_db()
-    c = db.cursor()
-
     if request.method == "POST":
         data = request.get_json() or {}
         question = data.get("question", "").strip()
@@ -761,24 +943,14 @@ def api_mentor_quiz_questions(quiz_id):
         topic = data.get("topic", "").strip()
         difficulty = data.get("difficulty", "manual").strip()
 
-        c.execute("""
-            INSERT INTO mentor_quiz_questions (
-                quiz_id, question, option_a, option_b, option_c, option_d,
-                correct_option, topic, difficulty
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (quiz_id, question, option_a, option_b, option_c, option_d,
-              correct_option, topic, difficulty))
-        db.commit()
+        run_write(insert_mentor_quiz_question, (
+            quiz_id, question, option_a, option_b, option_c, option_d,
+            correct_option, topic, difficulty
+        ))
         return jsonify({"status": "created"})
 
-    c.execute("""
-        SELECT id, question, option_a, option_b, option_c, option_d, correct_option
-        FROM mentor_quiz_questions
-        WHERE quiz_id = ?
-    """, (quiz_id,))
-    rows = c.fetchall()
     res = []
-    for r in rows:
+    for r in quiz_questions(get_db(), quiz_id):
         res.append({
             "id": r["id"],
             "question": r["question"],
@@ -800,54 +972,48 @@ def api_student_message_mentor():
     data = request.get_json() or {}
     question_text = data.get("question_text", "").strip()
 
-    c = db.cursor()
-    c.execute("SELECT * FROM users WHERE role = 'mentor' ORDER BY id LIMIT 1")
-    mentor = c.fetchone()
+    mentor = first_mentor(db)
     if not mentor:
         return jsonify({"error": "No mentor registered yet."}), 400
 
-    c.execute("""
-        INSERT INTO mentor_messages (student_id, mentor_id, question_text, created_at)
-        VALUES (?, ?, ?, ?)
-    """, (user["id"], mentor["id"], question_text, datetime.utcnow().isoformat()))
-    db.commit()
-
+    run_write(insert_mentor_message, user["id"], mentor["id"], question_text)
     return jsonify({"status": "sent"})
 
 
 @app.route("/api/mentor/messages", methods=["GET", "POST"])
 @login_required(role="mentor")
 def api_mentor_messages():
-    db = get_db()
-    c = db.cursor()
-
+    """GET pages newest-first with ?cursor=&limit=, and filters with
+    ?scope=mine|all and ?status=answered|unanswered."""
     if request.method == "POST":
         data = request.get_json() or {}
         msg_id = data.get("message_id")
         answer_text = data.get("answer_text")
-        c.execute("""
-            UPDATE mentor_messages
-            SET answer_text = ?, answered_at = ?
-            WHERE id = ?
-        """, (answer_text, datetime.utcnow().isoformat(), msg_id))
-        db.commit()
+        run_write(answer_mentor_message, msg_id, answer_text)
         return jsonify({"status": "answered"})
 
-    c.execute("""
-        SELECT m.id,
-               u.name AS student_name,
-               m.question_text,
-               m.answer_text,
-               m.created_at,
-               m.answered_at
-        FROM mentor_messages m
-        JOIN users u ON u.id = m.student_id
-        ORDER BY m.created_at DESC
-    """)
-    rows = c.fetchall()
+    user = current_user()
+    scope = request.args.get("scope", "all")
+    status = request.args.get("status") or None
+    limit = min(max(request.args.get("limit", MESSAGES_PAGE_SIZE, type=int), 1), MESSAGES_MAX_PAGE_SIZE)
+    if scope not in ("all", "mine") or status not in (None, "answered", "unanswered"):
+        return jsonify({"error": "Invalid filter"}), 400
+
+    before = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+    mentor_id = user["id"] if scope == "mine" else None
+
+    db = get_db()
+    # keyset pagination: newest first, one extra row to know if there's more
+    rows = mentor_messages_page(db, limit + 1, mentor_id, status, before)
 
     res = []
-    for m in rows:
+    for m in rows[:limit]:
         res.append({
             "id": m["id"],
             "student_name": m["student_name"],
@@ -856,7 +1022,29 @@ def api_mentor_messages():
             "created_at": m["created_at"],
             "answered_at": m["answered_at"],
         })
-    return jsonify(res)
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    return jsonify({
+        "messages": res,
+        "next_cursor": next_cursor,
+        "unanswered_count": unanswered_count(db, mentor_id)
+    })
+
+
+def encode_cursor(created_at, message_id):
+    raw = json.dumps([created_at, message_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+    return str(created_at), int(message_id)
 
 
 # AI Mentor
@@ -866,24 +1054,83 @@ def api_student_ai_mentor():
     data = request.get_json() or {}
     user_message = data.get("message", "").strip()
     if not user_message:
-        return jsonify({"reply": "Type a question so I can actually help you."})
+        return jsonify({"reply": AI_MENTOR_EMPTY_MESSAGE})
+    throttle = ai_limiter.acquire(current_user()["id"])
+    if throttle is not None:
+        return throttled(throttle)
+
+    prompt = ai_mentor_prompt(user_message)
+    if data.get("stream"):
+        # hand the pooled connection back now rather than after the stream ends
+        close_db()
+        return Response(
+            stream_with_context(sse_text_events(stream_gemini(prompt))),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    reply = call_gemini(prompt)
+    return jsonify({"reply": reply})
 
-    prompt = f"""
+
+def ai_mentor_prompt(user_message: str) -> str:
+    return f"""
     You are a clear, concise AI mentor for a college-level CS student
     studying an Introduction to Python course.
     Explain in 3–5 short sentences, straight to the point. Avoid fluff.
 
     Student's doubt: {user_message}
     """
-    reply = call_gemini(prompt)
-    return jsonify({"reply": reply})
+
+
+def sse_text_events(chunks):
+    for chunk in chunks:
+        yield f"data: {json.dumps({'text': chunk})}\n\n"
+    yield "event: done\ndata: {}\n\n"
 
 
 # Misc
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of per-route and component metrics."""
+    values = []
+    for component, stats in (
+        ("db_pool", pool_stats()),
+        ("db_writer", writer_stats()),
+        ("user_cache", user_cache.stats()),
+        ("catalog_cache", catalog_cache.stats()),
+        ("explanations", explanation_queue.stats()),
+        ("explanation_cache", explanation_cache.stats()),
+        ("gemini", gemini_client.stats()),
+        ("question_index", question_index.stats()),
+        ("quiz_sessions", quiz_sessions.stats()),
+        ("ai_limiter", ai_limiter.stats()),
+    ):
+        values.extend(flatten_stats(component, stats))
+    values.append(("gemini_circuit_open", {}, int(gemini_client.breaker.state != "closed")))
+    histograms = [("gemini_latency_seconds", gemini_client.latency.snapshot())]
+    return app.response_class(
+        route_metrics.render(values, histograms),
+        mimetype="text/plain; version=0.0.4"
+    )
+
+
 @app.route("/health")
 def health():
-    return {"status": "ok", "course": COURSE_NAME}
+    return {
+        "status": "ok",
+        "course": COURSE_NAME,
+        "db_pool": pool_stats(),
+        "user_cache": user_cache.stats(),
+        "explanations": explanation_queue.stats(),
+        "explanation_cache": explanation_cache.stats(),
+        "gemini": gemini_client.stats(),
+        "db_writer": writer_stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "question_index": question_index.stats(),
+        "quiz_sessions": quiz_sessions.stats(),
+        "ai_limiter": ai_limiter.stats()
+    }
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,300 @@
+"""ASGI serving mode: `uvicorn asgi:application`.
+
+The AI mentor route runs as a coroutine: its Gemini call goes through
+AsyncGeminiClient, so a slow upstream reply parks a coroutine instead of
+a worker thread. Its database work (the session's user lookup) runs on a
+bounded thread pool, and every other route is the regular Flask app run
+on a second bounded pool, unchanged.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from itsdangerous import BadSignature
+from werkzeug.exceptions import BadRequest
+
+import app as wsgi
+from llm_client import AsyncGeminiClient, LLMError
+from metrics import route_metrics
+
+ASGI_DB_THREADS = int(os.getenv("SMARTPATH_ASGI_DB_THREADS", "8"))
+ASGI_WSGI_THREADS = int(os.getenv("SMARTPATH_ASGI_WSGI_THREADS", "16"))
+GEMINI_ASYNC_MAX_CONCURRENCY = int(os.getenv("GEMINI_ASYNC_MAX_CONCURRENCY", "256"))
+
+
+class SmartPathASGI:
+    """ASGI app serving coroutine routes natively and the rest through
+    the Flask WSGI app on a thread pool."""
+
+    def __init__(self, flask_app, gemini, db_threads=ASGI_DB_THREADS, wsgi_threads=ASGI_WSGI_THREADS):
+        self.flask_app = flask_app
+        self.gemini = gemini
+        self.db_executor = ThreadPoolExecutor(db_threads, thread_name_prefix="asgi-db")
+        self.wsgi_executor = ThreadPoolExecutor(wsgi_threads, thread_name_prefix="asgi-wsgi")
+        # (method, path) -> (endpoint name for metrics, coroutine handler)
+        self.routes = {
+            ("POST", "/api/student/ai-mentor"): ("api_student_ai_mentor", self.ai_mentor),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        route = self.routes.get((scope["method"], scope["path"]))
+        if route is None:
+            await self._wsgi(scope, receive, send)
+            return
+        endpoint, handler = route
+        tally = route_metrics.new_tally()
+        status = 500
+        try:
+            status = await handler(scope, receive, send, tally)
+        finally:
+            elapsed = time.perf_counter() - tally.pop("started")
+            route_metrics.record(endpoint, scope["method"], status, elapsed, tally)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.run_db(lambda: None)
+                    await self.gemini.start()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": repr(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.gemini.close()
+                self.db_executor.shutdown(wait=True)
+                self.wsgi_executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def run_db(self, fn, *args):
+        """fn(*args) inside an app context on the database thread pool."""
+        def call():
+            with self.flask_app.app_context():
+                return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, call)
+
+    def session(self, scope):
+        """The Flask session carried by the request's cookie, or {}."""
+        name = self.flask_app.config["SESSION_COOKIE_NAME"]
+        cookie = SimpleCookie()
+        for key, value in scope["headers"]:
+            if key == b"cookie":
+                cookie.load(value.decode("latin1"))
+        if name not in cookie:
+            return {}
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            return serializer.loads(cookie[name].value, max_age=max_age)
+        except BadSignature:
+            return {}
+
+    async def call_gemini(self, prompt, tally):
+        """Async call_gemini: the reply text, or the same fallback messages."""
+        if not wsgi.GEMINI_API_KEY:
+            return wsgi.GEMINI_NOT_CONFIGURED
+        start = time.perf_counter()
+        try:
+            return await self.gemini.generate(prompt)
+        except LLMError as e:
+            print("Gemini error:", e)
+            return wsgi.GEMINI_UNAVAILABLE
+        finally:
+            tally["gemini_calls"] += 1
+            tally["gemini_seconds"] += time.perf_counter() - start
+
+    async def stream_gemini(self, prompt, tally):
+        if not wsgi.GEMINI_API_KEY:
+            yield wsgi.GEMINI_NOT_CONFIGURED
+            return
+        sent_any = False
+        start = time.perf_counter()
+        try:
+            async for chunk in self.gemini.stream(prompt):
+                sent_any = True
+                yield chunk
+        except LLMError as e:
+            print("Gemini error:", e)
+            if not sent_any:
+                yield wsgi.GEMINI_UNAVAILABLE
+        finally:
+            tally["gemini_calls"] += 1
+            tally["gemini_seconds"] += time.perf_counter() - start
+
+    async def ai_mentor(self, scope, receive, send, tally):
+        body = await _read_body(receive)
+        user_id = self.session(scope).get("user_id")
+        user = await self.run_db(wsgi.load_user, user_id) if user_id is not None else None
+        if not user or user["role"] != "student":
+            return await _send(send, 302, b"", [(b"location", b"/")])
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            # the page Flask's request.get_json() answers with
+            return await _send(send, 400, BadRequest().get_body().encode("utf-8"),
+                               [(b"content-type", b"text/html; charset=utf-8")])
+        data = data if isinstance(data, dict) else {}
+        user_message = data.get("message", "").strip()
+        if not user_message:
+            return await self._json(send, scope, 200, {"reply": wsgi.AI_MENTOR_EMPTY_MESSAGE})
+        throttle = await self.run_db(wsgi.ai_limiter.acquire, user["id"])
+        if throttle is not None:
+            return await self._json(send, scope, throttle.status, throttle.body(), [
+                (b"retry-after", str(throttle.retry_after).encode("ascii"))
+            ])
+
+        prompt = wsgi.ai_mentor_prompt(user_message)
+        if data.get("stream"):
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": _cors(scope, [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ]),
+            })
+            async for chunk in self.stream_gemini(prompt, tally):
+                event = f"data: {json.dumps({'text': chunk})}\n\n"
+                await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b"event: done\ndata: {}\n\n"})
+            return 200
+        reply = await self.call_gemini(prompt, tally)
+        return await self._json(send, scope, 200, {"reply": reply})
+
+    async def _json(self, send, scope, status, data, headers=()):
+        body = (self.flask_app.json.dumps(data) + "\n").encode("utf-8")
+        headers = [(b"content-type", b"application/json"), *headers]
+        return await _send(send, status, body, _cors(scope, headers))
+
+    async def _wsgi(self, scope, receive, send):
+        body = await _read_body(receive)
+        loop = asyncio.get_running_loop()
+
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        await loop.run_in_executor(self.wsgi_executor, self._run_wsgi, scope, body, send_sync)
+
+    def _run_wsgi(self, scope, body, send_sync):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers
+            ]
+            return lambda data: None
+
+        def send_head():
+            send_sync({
+                "type": "http.response.start",
+                "status": response["status"],
+                "headers": response["headers"],
+            })
+
+        result = self.flask_app(_environ(scope, body), start_response)
+        try:
+            head_sent = False
+            # chunks go out as the app yields them, so streamed responses stream
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not head_sent:
+                    send_head()
+                    head_sent = True
+                send_sync({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not head_sent:
+                send_head()
+            send_sync({"type": "http.response.body", "body": b""})
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send(send, status, body, headers):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + [(b"content-length", str(len(body)).encode("ascii"))],
+    })
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+def _cors(scope, headers):
+    # same answer flask_cors gives the WSGI routes
+    if any(key == b"origin" for key, _ in scope["headers"]):
+        headers = headers + [(b"access-control-allow-origin", b"*")]
+    return headers
+
+
+def _environ(scope, body):
+    """PEP 3333 environ for an ASGI http scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for key, value in scope["headers"]:
+        key = key.decode("latin1")
+        value = value.decode("latin1")
+        if key == "content-length":
+            continue
+        if key == "content-type":
+            environ["CONTENT_TYPE"] = value
+            continue
+        name = "HTTP_" + key.upper().replace("-", "_")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def create_asgi_app():
+    """Bootstrap the database like create_app and return the ASGI app."""
+    return SmartPathASGI(
+        wsgi.create_app(),
+        AsyncGeminiClient(wsgi.gemini_client, max_concurrency=GEMINI_ASYNC_MAX_CONCURRENCY),
+    )
+
+
+application = create_asgi_app()
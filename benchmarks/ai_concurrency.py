@@ -0,0 +1,260 @@
+"""Concurrent AI mentor requests one process sustains, threaded vs ASGI.
+
+The Gemini API is replaced by the local stub with a slow reply, and a
+burst of logged-in students posts to /api/student/ai-mentor at once
+while one more client polls /api/student/progress. Two serving modes
+run the same app in their own subprocess against a fresh database:
+
+  threaded  the WSGI app on a server with a fixed pool of worker threads,
+            as under a threaded WSGI server; each AI request holds a
+            thread for the whole Gemini call
+  asgi      uvicorn asgi:application; AI requests wait as coroutines
+
+For each concurrency level it prints how many AI requests got a real
+reply within the client timeout, their p50/p95 latency, replies per
+second, and the p95 of the progress probe while the burst was running.
+
+Usage: python benchmarks/ai_concurrency.py [--levels 8,32,128,256]
+           [--latency 2.0] [--threads 16] [--timeout 20] [--modes threaded,asgi]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROBE_INTERVAL = 0.1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_threaded(port, threads):
+    """The Flask app on a werkzeug server whose requests run on a fixed
+    pool of threads; connections beyond that wait in the accept queue."""
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    from app import create_app
+
+    class OneShotHandler(WSGIRequestHandler):
+        # a connection per request, so a queued client isn't stuck behind
+        # another's idle keep-alive connection
+        protocol_version = "HTTP/1.0"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        multithread = True
+        request_queue_size = 1024
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.workers = ThreadPoolExecutor(threads, thread_name_prefix="wsgi")
+
+        def process_request(self, request, client_address):
+            self.workers.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+        def handle_error(self, request, client_address):
+            # clients that gave up waiting are counted by the driver
+            if not isinstance(sys.exc_info()[1], ConnectionError):
+                super().handle_error(request, client_address)
+
+    app = create_app()
+    PooledWSGIServer("127.0.0.1", port, app, handler=OneShotHandler).serve_forever()
+
+
+def serve_asgi(port):
+    import uvicorn
+    # clients log in one by one before the burst; keep their connections
+    # open until it starts
+    uvicorn.run("asgi:application", host="127.0.0.1", port=port, log_level="warning",
+                access_log=False, backlog=1024, timeout_keep_alive=120)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def login(httpx, base_url, i):
+    client = httpx.AsyncClient(base_url=base_url, timeout=30)
+    email = f"load{i}@bench"
+    form = {"name": f"Load {i}", "email": email, "password": "pw"}
+    await client.post("/register/student", data=form)
+    await client.post("/login/student", data={"email": email, "password": "pw"})
+    return client
+
+
+async def burst(base_url, level, timeout):
+    import httpx
+
+    from app import GEMINI_NOT_CONFIGURED, GEMINI_UNAVAILABLE
+    failures = {GEMINI_NOT_CONFIGURED, GEMINI_UNAVAILABLE}
+
+    clients = [await login(httpx, base_url, i) for i in range(level)]
+    probe = clients[0]
+    latencies = []
+    errors = 0
+    done = asyncio.Event()
+
+    async def ask(client, i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            # distinct questions, so each is its own upstream call rather
+            # than one coalesced call
+            resp = await client.post("/api/student/ai-mentor", json={"message": f"What is a list? ({i})"},
+                                     timeout=timeout)
+            ok = resp.status_code == 200 and resp.json().get("reply") not in failures
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+
+    async def poll():
+        probes = []
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                await probe.get("/api/student/progress", timeout=timeout)
+            except httpx.HTTPError:
+                pass
+            probes.append(time.perf_counter() - start)
+            await asyncio.sleep(PROBE_INTERVAL)
+        return probes
+
+    poller = asyncio.create_task(poll())
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(c, i) for i, c in enumerate(clients)))
+    wall = time.perf_counter() - start
+    done.set()
+    probes = sorted(await poller)
+    for c in clients:
+        await c.aclose()
+
+    latencies.sort()
+    return {
+        "concurrency": level,
+        "ok": len(latencies),
+        "failed": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "replies_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+        "probe_p95_ms": round(percentile(probes, 95) * 1000, 1),
+    }
+
+
+def wait_for(port, proc, deadline=30):
+    end = time.time() + deadline
+    while time.time() < end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run_mode(mode, args, stub_url):
+    port = free_port()
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="benchmark",
+        GEMINI_URL=stub_url,
+        # the serving model is what's measured, not the Gemini client limit
+        GEMINI_MAX_CONCURRENCY="4096",
+        GEMINI_ASYNC_MAX_CONCURRENCY="4096",
+        GEMINI_TIMEOUT=str(args.timeout),
+        SMARTPATH_AI_USER_PER_MINUTE="0",
+        SMARTPATH_AI_GLOBAL_PER_MINUTE="0",
+        SMARTPATH_DB_PATH=os.path.join(tempfile.mkdtemp(), "ai_concurrency.db"),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port),
+         "--threads", str(args.threads)],
+        cwd=ROOT, env=env,
+    )
+    try:
+        wait_for(port, proc)
+        base_url = f"http://127.0.0.1:{port}"
+        return [asyncio.run(burst(base_url, level, args.timeout)) for level in args.levels]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="8,32,128,256", help="comma-separated concurrent AI requests")
+    parser.add_argument("--latency", type=float, default=2.0, help="stub seconds per Gemini reply")
+    parser.add_argument("--threads", type=int, default=16, help="worker threads in threaded mode")
+    parser.add_argument("--timeout", type=float, default=20.0, help="client timeout per request")
+    parser.add_argument("--modes", default="threaded,asgi")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--serve", choices=["threaded", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        if args.serve == "threaded":
+            serve_threaded(args.port, args.threads)
+        else:
+            serve_asgi(args.port)
+        return
+
+    args.levels = [int(n) for n in args.levels.split(",")]
+    # the stub gets its own process so it doesn't compete with the driver
+    stub_port = free_port()
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "gemini_stub.py"),
+        "--port", str(stub_port), "--latency", str(args.latency),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(stub_port, stub)
+        stub_url = f"http://127.0.0.1:{stub_port}/generate"
+        results = {mode: run_mode(mode, args, stub_url) for mode in args.modes.split(",")}
+    finally:
+        stub.terminate()
+        stub.wait()
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Gemini stub latency {args.latency}s, client timeout {args.timeout}s, "
+          f"threaded mode {args.threads} threads")
+    for mode, rows in results.items():
+        print(f"\n{mode}")
+        print(f"{'concurrent':>10} {'ok':>6} {'failed':>7} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'replies/s':>10} {'probe p95 ms':>13}")
+        for r in rows:
+            print(f"{r['concurrency']:>10} {r['ok']:>6} {r['failed']:>7} {r['p50_ms']:>9.0f} "
+                  f"{r['p95_ms']:>9.0f} {r['replies_per_s']:>10.1f} {r['probe_p95_ms']:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
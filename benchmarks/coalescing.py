@@ -0,0 +1,276 @@
+"""Coalescing of identical Gemini prompts: upstream calls saved, and the
+error and timeout paths.
+
+Against the local Gemini stub with a slow reply:
+
+  client     N threads ask GeminiClient.generate for the same prompt at
+             once, with coalescing off and on; upstream calls and wall time
+  async      the same through AsyncGeminiClient
+  errors     the upstream answers 400: every caller gets an LLMError from
+             the one call, and the next caller makes a new call
+  timeouts   a wait shorter than the call: the callers that joined give
+             up with LLMError, the one that made the call still gets text
+  admission  N threads submit explanation jobs for one prompt whose calls
+             finish almost at once, so jobs keep landing as a call ends;
+             every upstream call must have been admitted by on_new, the
+             hook that takes the global rate limit token
+  class      N students submit the same wrong answer to a mentor's quiz
+             through /api/student/quiz/submit and poll their explanations;
+             explanation jobs, upstream calls and global rate limit tokens
+             spent
+
+Exits non-zero if a scenario doesn't behave as described.
+
+Usage: python benchmarks/coalescing.py [--callers 40] [--latency 1.0]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_concurrency import free_port  # noqa: E402
+from gemini_stub import serve  # noqa: E402
+from llm_client import AsyncGeminiClient, GeminiClient, LLMError  # noqa: E402
+
+PROMPT = "Question: What does range(5) generate? Student's chosen option: b"
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(condition, label):
+    if not condition:
+        raise CheckFailed(label)
+    print(f"ok   {label}")
+
+
+def upstream_calls(client):
+    stats = client.stats()
+    return stats["successes"] + stats["failures"]
+
+
+def at_once(n, fn):
+    """fn() on n threads released together; [(result or exception)]."""
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def client_scenario(url, callers, latency):
+    print(f"-- client: {callers} threads, same prompt, stub latency {latency}s")
+    for coalesce in (False, True):
+        client = GeminiClient(url, "benchmark", max_concurrency=callers, coalesce=coalesce)
+        start = time.perf_counter()
+        results = at_once(callers, lambda: client.generate(PROMPT))
+        elapsed = time.perf_counter() - start
+        texts = [r for r in results if isinstance(r, str)]
+        print(f"     coalesce={str(coalesce):5} upstream calls {upstream_calls(client):>3}, "
+              f"replies {len(texts)}/{callers}, saved {client.stats()['coalesced']}, "
+              f"{elapsed:.2f}s")
+        check(len(texts) == callers and len(set(texts)) == 1, f"coalesce={coalesce}: every caller replied")
+        if coalesce:
+            check(upstream_calls(client) == 1, "coalesce=True: one upstream call")
+
+
+def async_scenario(url, callers):
+    print(f"-- async: {callers} coroutines, same prompt")
+    client = AsyncGeminiClient(GeminiClient(url, "benchmark"), max_concurrency=callers)
+
+    async def burst():
+        await client.start()
+        try:
+            return await asyncio.gather(*[client.generate(PROMPT) for _ in range(callers)])
+        finally:
+            await client.close()
+
+    texts = asyncio.run(burst())
+    check(len(set(texts)) == 1 and upstream_calls(client.client) == 1,
+          f"async: {callers} replies from one upstream call")
+
+
+def error_scenario(callers):
+    port = free_port()
+    server = serve(port, latency=0.5, fail_rate=1.0, fail_status=400, background=True)
+    try:
+        print(f"-- errors: upstream answers 400, {callers} threads")
+        client = GeminiClient(f"http://127.0.0.1:{port}/generate", "benchmark",
+                              max_concurrency=callers, failure_threshold=1000)
+        results = at_once(callers, lambda: client.generate(PROMPT))
+        check(all(isinstance(r, LLMError) for r in results), "errors: every caller got an LLMError")
+        check(len({id(r) for r in results}) == callers, "errors: each caller raised its own exception")
+        check(upstream_calls(client) == 1, "errors: from one upstream call")
+        try:
+            client.generate(PROMPT)
+        except LLMError:
+            pass
+        check(upstream_calls(client) == 2, "errors: a failure isn't remembered; the next call goes upstream")
+    finally:
+        server.shutdown()
+
+
+def timeout_scenario(url, callers):
+    print(f"-- timeouts: joined callers wait 0.2s for a {1.0}s call")
+    client = GeminiClient(url, "benchmark", max_concurrency=callers)
+    client.call_deadline = 0.2
+    results = at_once(callers, lambda: client.generate(PROMPT))
+    texts = [r for r in results if isinstance(r, str)]
+    timeouts = [r for r in results if isinstance(r, LLMError)]
+    check(len(texts) == 1 and len(timeouts) == callers - 1,
+          "timeouts: the caller that made the call got text, the others LLMError")
+    check(client.stats()["coalesce_timeouts"] == callers - 1, "timeouts: counted")
+
+
+def admission_scenario(callers, rounds=50):
+    print(f"-- admission: {callers} threads x {rounds} jobs for one prompt, calls of about 1ms")
+    from explanations import ExplanationQueue
+
+    queue = ExplanationQueue(workers=4)
+    counts = {"calls": 0, "admitted": 0}
+    lock = threading.Lock()
+
+    def explain(prompt):
+        with lock:
+            counts["calls"] += 1
+        time.sleep(0.001)
+        return "text"
+
+    def admit():
+        # called under the queue lock; counts stand in for global tokens
+        counts["admitted"] += 1
+        return None
+
+    def submit_many():
+        for _ in range(rounds):
+            queue.submit(1, explain, PROMPT, on_new=admit)
+
+    at_once(callers, submit_many)
+    queue.close()
+    stats = queue.stats()
+    print(f"     jobs {stats['submitted']}, joined another {stats['coalesced']}, "
+          f"upstream calls {counts['calls']}, admitted {counts['admitted']}")
+    check(stats["coalesced"] > 0, "admission: jobs joined calls in flight")
+    check(counts["calls"] <= counts["admitted"], "admission: every upstream call was admitted")
+
+
+def class_scenario(url, students):
+    print(f"-- class: {students} students submit the same wrong answer")
+    os.environ.update(
+        GEMINI_API_KEY="benchmark",
+        GEMINI_URL=url,
+        SMARTPATH_DB_PATH=os.path.join(tempfile.mkdtemp(), "coalescing.db"),
+        # next to no refill, so the tokens left show how many were spent
+        SMARTPATH_AI_GLOBAL_BURST=str(students * 2),
+        SMARTPATH_AI_GLOBAL_PER_MINUTE="0.01",
+    )
+    from app import create_app, explanation_queue, gemini_client
+    from db import get_db, run_write
+
+    app = create_app()
+
+    def client_for(role, email):
+        client = app.test_client()
+        client.post(f"/register/{role}", data={"name": email, "email": email, "password": "pw"})
+        client.post(f"/login/{role}", data={"email": email, "password": "pw"})
+        return client
+
+    mentor = client_for("mentor", "mentor@class")
+    mentor.post("/api/mentor/quizzes", json={"title": "In class"})
+    quiz_id = mentor.get("/api/mentor/quizzes").get_json()[0]["id"]
+    mentor.post(f"/api/mentor/quizzes/{quiz_id}/questions", json={
+        "question": "What does range(5) generate?", "option_a": "0 to 4", "option_b": "1 to 5",
+        "option_c": "0 to 5", "option_d": "1 to 4", "correct_option": "a",
+    })
+    clients = [client_for("student", f"s{i}@class") for i in range(students)]
+    sessions = [
+        c.post("/api/student/quiz/generate", json={"mode": "manual", "quiz_id": quiz_id}).get_json()
+        for c in clients
+    ]
+    before = upstream_calls(gemini_client)
+
+    def submit(i):
+        session = sessions[i]
+        result = clients[i].post("/api/student/quiz/submit", json={
+            "session_id": session["session_id"],
+            "question_id": session["questions"][0]["id"],
+            "selected_option": "b",
+        }).get_json()
+        url = result.get("explanation_url")
+        while url:
+            job = clients[i].get(url).get_json()
+            if job["status"] != "pending":
+                return job.get("explanation")
+            time.sleep(0.05)
+        return result.get("explanation")
+
+    start = time.perf_counter()
+    counter = iter(range(students))
+    lock = threading.Lock()
+
+    def next_submit():
+        with lock:
+            i = next(counter)
+        return submit(i)
+
+    explanations = at_once(students, next_submit)
+    elapsed = time.perf_counter() - start
+    stats = explanation_queue.stats()
+    calls = upstream_calls(gemini_client) - before
+    print(f"     explanation jobs {stats['submitted']}, joined another {stats['coalesced']}, "
+          f"upstream calls {calls}, saved {students - calls}, {elapsed:.2f}s")
+    check(all(isinstance(e, str) for e in explanations) and len(set(explanations)) == 1,
+          "class: every student got the same explanation")
+    check(calls == 1, "class: one upstream call")
+    with app.app_context():
+        run_write(lambda conn: None)  # refunds are queued writes; let them land
+        row = get_db().execute("SELECT tokens FROM rate_buckets WHERE key = 'ai:global'").fetchone()
+    spent = students * 2 - row["tokens"]
+    print(f"     global rate limit tokens spent {spent:.0f}")
+    check(round(spent) == 1, "class: one global rate limit token spent")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--callers", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub seconds per Gemini reply")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = serve(port, latency=args.latency, background=True)
+    url = f"http://127.0.0.1:{port}/generate"
+    try:
+        client_scenario(url, args.callers, args.latency)
+        async_scenario(url, args.callers)
+        error_scenario(args.callers)
+        timeout_scenario(url, args.callers)
+        class_scenario(url, args.callers)
+        admission_scenario(args.callers)
+    except CheckFailed as e:
+        print(f"FAIL {e}")
+        sys.exit(1)
+    finally:
+        server.shutdown()
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Mentor students overview: per-student loop vs batched cohort query.
+
+Usage: python benchmarks/cohort_analytics.py [cohort sizes...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db as db_module  # noqa: E402
+from app import app  # noqa: E402
+from analytics import compute_student_overview  # noqa: E402
+from pool import get_pool  # noqa: E402
+
+ATTEMPTS_PER_STUDENT = 40
+
+
+def legacy_overview():
+    """The old /api/mentor/students implementation: 3 queries per student."""
+    c = db_module.get_db().cursor()
+    c.execute("SELECT id, name FROM users WHERE role = 'student'")
+    result = []
+    for s in c.fetchall():
+        c.execute("SELECT COUNT(*) FROM quiz_attempts WHERE user_id = ? AND source = 'bank'", (s["id"],))
+        total = c.fetchone()[0]
+        c.execute("""
+            SELECT COUNT(*) FROM quiz_attempts
+            WHERE user_id = ? AND is_correct = 1 AND source = 'bank'
+        """, (s["id"],))
+        correct = c.fetchone()[0]
+        c.execute("""
+            SELECT q.topic,
+                   SUM(CASE WHEN qa.is_correct = 1 THEN 1 ELSE 0 END) AS correct,
+                   COUNT(*) AS total
+            FROM quiz_attempts qa
+            JOIN questions q ON q.id = qa.question_id
+            WHERE qa.user_id = ? AND qa.source = 'bank'
+            GROUP BY q.topic
+        """, (s["id"],))
+        weaknesses = [r["topic"] for r in c.fetchall() if int(r["correct"] * 100 / r["total"]) <= 50]
+        result.append({
+            "id": s["id"],
+            "name": s["name"],
+            "overall_accuracy": int(correct * 100 / total) if total else 0,
+            "total_attempts": total,
+            "weaknesses": weaknesses
+        })
+    return result
+
+
+def seed(n_students):
+    db = db_module.get_db()
+    c = db.cursor()
+    c.execute("SELECT id FROM questions")
+    question_ids = [r["id"] for r in c.fetchall()]
+    rng = random.Random(n_students)
+    now = datetime.utcnow().isoformat()
+    for i in range(n_students):
+        c.execute("""
+            INSERT INTO users (name, email, password, role)
+            VALUES (?, ?, 'x', 'student')
+        """, (f"Student {i}", f"student{i}@bench.local"))
+        uid = c.lastrowid
+        c.executemany("""
+            INSERT INTO quiz_attempts (user_id, question_id, is_correct, source, created_at)
+            VALUES (?, ?, ?, 'bank', ?)
+        """, [(uid, rng.choice(question_ids), rng.random() < 0.6, now)
+              for _ in range(ATTEMPTS_PER_STUDENT)])
+    db.commit()
+
+
+def timed(fn, repeat=3):
+    best = None
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+
+def run(sizes):
+    print(f"{'students':>9} {'legacy ms':>10} {'batched ms':>11} {'speedup':>8}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_module.DB_NAME = os.path.join(tmp, "bench.db")
+            with app.app_context():
+                db_module.init_db()
+                seed(n)
+                legacy_s, legacy = timed(legacy_overview)
+                batched_s, batched = timed(compute_student_overview)
+                assert legacy == batched, "batched overview diverged from legacy output"
+                db_module.close_db()
+            get_pool(db_module.DB_NAME).close()
+        print(f"{n:>9} {legacy_s * 1000:>10.1f} {batched_s * 1000:>11.1f} {legacy_s / batched_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run([int(a) for a in sys.argv[1:]] or [100, 500, 2000])
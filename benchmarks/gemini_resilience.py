@@ -0,0 +1,235 @@
+"""Retries, circuit breaker and timeout budget of the Gemini client.
+
+Against the local Gemini stub, whose failure rate, status and latency are
+changed between steps:
+
+  retries   the upstream answers 429, then 503: every call makes
+            max_retries + 1 attempts, and the sleeps between them are
+            jittered and within the exponential backoff
+  rejected  the upstream answers 400: each call raises UpstreamRejected
+            after one attempt, and the circuit stays closed however many
+            fail
+  breaker   failure_threshold failures open the circuit and later calls
+            fail fast without reaching the upstream; after reset_timeout
+            one trial call goes through (half open), a failed trial
+            reopens it and a successful one closes it
+  budget    a stalled upstream holds a call for timeout seconds, not one
+            timeout per attempt, and retries of a slow failing upstream
+            stop when the budget runs out
+  async     the retries and the budget through AsyncGeminiClient
+
+Exits non-zero if a scenario doesn't behave as described.
+
+Usage: python benchmarks/gemini_resilience.py [--calls 8]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_concurrency import free_port  # noqa: E402
+from gemini_stub import serve  # noqa: E402
+from llm_client import (  # noqa: E402
+    AsyncGeminiClient, CircuitOpenError, GeminiClient, LLMError, UpstreamRejected
+)
+
+BACKOFF = 0.05
+# scheduling noise allowed on top of a sleep or a timeout
+SLACK = 0.15
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(condition, label):
+    if not condition:
+        raise CheckFailed(label)
+    print(f"ok   {label}")
+
+
+def attempt(fn):
+    """fn()'s result or the exception it raised, and the seconds it took."""
+    start = time.monotonic()
+    try:
+        result = fn()
+    except Exception as e:
+        result = e
+    return result, time.monotonic() - start
+
+
+def calls_with_arrivals(server, calls, fn):
+    """[(result, arrival times of the requests it made)] for fn(i), i < calls."""
+    results = []
+    for i in range(calls):
+        seen = len(server.arrivals)
+        result, _ = attempt(lambda: fn(i))
+        results.append((result, server.arrivals[seen:]))
+    return results
+
+
+def retries_scenario(server, url, calls, max_retries=3):
+    for status in (429, 503):
+        print(f"-- retries: upstream answers {status}, {calls} calls, max_retries {max_retries}")
+        server.fail_rate, server.fail_status = 1.0, status
+        client = GeminiClient(url, "benchmark", max_retries=max_retries, backoff=BACKOFF,
+                              failure_threshold=1000, coalesce=False)
+        results = calls_with_arrivals(server, calls, lambda i: client.generate(f"prompt {i}"))
+        check(all(type(r) is LLMError for r, _ in results), f"{status}: every call raised LLMError")
+        check(all(len(a) == max_retries + 1 for _, a in results),
+              f"{status}: every call made {max_retries + 1} attempts")
+        check(client.stats()["retries"] == calls * max_retries, f"{status}: retries counted")
+        gaps = [[b - a for a, b in zip(a, a[1:])] for _, a in results]
+        check(all(gap <= BACKOFF * 2 ** (n + 1) + SLACK
+                  for call in gaps for n, gap in enumerate(call)),
+              f"{status}: each sleep within backoff * 2 ** attempt")
+        first = [call[0] for call in gaps]
+        print(f"     first sleeps {min(first):.3f}s to {max(first):.3f}s")
+        check(max(first) - min(first) > BACKOFF / 5, f"{status}: sleeps are jittered")
+
+
+def rejected_scenario(server, url, threshold=3):
+    calls = threshold * 2
+    print(f"-- rejected: upstream answers 400, {calls} calls, failure_threshold {threshold}")
+    server.fail_rate, server.fail_status = 1.0, 400
+    client = GeminiClient(url, "benchmark", max_retries=3, backoff=BACKOFF,
+                          failure_threshold=threshold, coalesce=False)
+    results = calls_with_arrivals(server, calls, lambda i: client.generate(f"prompt {i}"))
+    check(all(isinstance(r, UpstreamRejected) for r, _ in results),
+          "rejected: every call raised UpstreamRejected")
+    check(all(len(a) == 1 for _, a in results) and client.stats()["retries"] == 0,
+          "rejected: not retried")
+    check(client.stats()["circuit_state"] == "closed" and client.stats()["failures"] == calls,
+          "rejected: counted as failures, circuit still closed")
+
+
+def breaker_scenario(server, url, threshold=3, reset_timeout=0.5):
+    print(f"-- breaker: failure_threshold {threshold}, reset_timeout {reset_timeout}s")
+    server.fail_rate, server.fail_status = 1.0, 503
+    client = GeminiClient(url, "benchmark", max_retries=0, failure_threshold=threshold,
+                          reset_timeout=reset_timeout, coalesce=False)
+    state = lambda: client.stats()["circuit_state"]  # noqa: E731
+    seen = len(server.arrivals)
+    for i in range(threshold):
+        attempt(lambda: client.generate(f"prompt {i}"))
+    check(state() == "open", f"breaker: open after {threshold} failures")
+    result, _ = attempt(lambda: client.generate("fast"))
+    check(isinstance(result, CircuitOpenError) and len(server.arrivals) == seen + threshold,
+          "breaker: open circuit fails fast without reaching the upstream")
+
+    # a slow trial, so the circuit can be looked at while it runs
+    time.sleep(reset_timeout)
+    server.latency = 0.3
+    trial = {}
+    thread = threading.Thread(target=lambda: trial.update(result=attempt(
+        lambda: client.generate("trial"))[0]))
+    thread.start()
+    while len(server.arrivals) == seen + threshold:
+        time.sleep(0.01)
+    check(state() == "half_open", "breaker: half open after reset_timeout")
+    result, _ = attempt(lambda: client.generate("second"))
+    check(isinstance(result, CircuitOpenError), "breaker: one trial call at a time")
+    thread.join()
+    check(type(trial["result"]) is LLMError and state() == "open", "breaker: failed trial reopens it")
+
+    time.sleep(reset_timeout)
+    server.fail_rate, server.latency = 0.0, 0.0
+    result, _ = attempt(lambda: client.generate("trial"))
+    check(isinstance(result, str) and state() == "closed", "breaker: successful trial closes it")
+    result, _ = attempt(lambda: client.generate("after"))
+    check(isinstance(result, str), "breaker: calls go through again")
+
+
+def budget_scenario(server, url, timeout=0.5):
+    print(f"-- budget: timeout {timeout}s")
+    server.fail_rate, server.fail_status, server.latency = 0.0, 503, timeout * 4
+    client = GeminiClient(url, "benchmark", timeout=timeout, max_retries=3, backoff=BACKOFF,
+                          failure_threshold=1000, coalesce=False)
+    seen = len(server.arrivals)
+    result, elapsed = attempt(lambda: client.generate("stalled"))
+    print(f"     stalled upstream: gave up after {elapsed:.2f}s")
+    check(isinstance(result, LLMError) and elapsed < timeout + SLACK,
+          "budget: a stalled upstream holds the call for timeout seconds")
+    check(len(server.arrivals) == seen + 1 and client.stats()["retries"] == 0,
+          "budget: a read timeout isn't retried")
+
+    server.fail_rate, server.latency = 1.0, timeout / 5
+    client = GeminiClient(url, "benchmark", timeout=timeout, max_retries=50, backoff=BACKOFF,
+                          failure_threshold=1000, coalesce=False)
+    seen = len(server.arrivals)
+    result, elapsed = attempt(lambda: client.generate("slow failures"))
+    attempts = len(server.arrivals) - seen
+    print(f"     slow 503s: {attempts} attempts in {elapsed:.2f}s")
+    check(type(result) is LLMError and elapsed < timeout + SLACK,
+          "budget: retries stop when the budget runs out")
+    check(1 < attempts < 51 and client.stats()["retries"] == attempts - 1,
+          "budget: retried until then")
+
+
+def async_scenario(server, url, max_retries=3, timeout=0.5):
+    print("-- async: retries and budget through AsyncGeminiClient")
+    server.fail_rate, server.fail_status, server.latency = 1.0, 503, 0.0
+    # the retries get the default budget, so it isn't what stops them
+    retrying = AsyncGeminiClient(GeminiClient(url, "benchmark", max_retries=max_retries,
+                                              backoff=BACKOFF, failure_threshold=1000,
+                                              coalesce=False))
+    stalling = AsyncGeminiClient(GeminiClient(url, "benchmark", timeout=timeout,
+                                              failure_threshold=1000, coalesce=False))
+
+    async def timed(client, prompt):
+        start = time.monotonic()
+        try:
+            result = await client.generate(prompt)
+        except Exception as e:
+            result = e
+        return result, time.monotonic() - start
+
+    async def run():
+        try:
+            seen = len(server.arrivals)
+            result, _ = await timed(retrying, "failing")
+            retried = (result, len(server.arrivals) - seen)
+            server.fail_rate, server.latency = 0.0, timeout * 4
+            seen = len(server.arrivals)
+            result, elapsed = await timed(stalling, "stalled")
+            return retried, (result, elapsed, len(server.arrivals) - seen)
+        finally:
+            await retrying.close()
+            await stalling.close()
+
+    (result, attempts), (stalled, elapsed, stalled_attempts) = asyncio.run(run())
+    check(type(result) is LLMError and attempts == max_retries + 1,
+          f"async: 503 retried, {max_retries + 1} attempts")
+    check(isinstance(stalled, LLMError) and elapsed < timeout + SLACK and stalled_attempts == 1,
+          "async: a stalled upstream holds the call for timeout seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=8, help="calls per retry scenario")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = serve(port, background=True)
+    url = f"http://127.0.0.1:{port}/generate"
+    try:
+        retries_scenario(server, url, args.calls)
+        rejected_scenario(server, url)
+        breaker_scenario(server, url)
+        budget_scenario(server, url)
+        async_scenario(server, url)
+    except CheckFailed as e:
+        print(f"FAIL {e}")
+        sys.exit(1)
+    finally:
+        server.shutdown()
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
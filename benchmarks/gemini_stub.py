@@ -0,0 +1,104 @@
+"""Local stand-in for the Gemini generateContent API.
+
+Point the app at it with GEMINI_URL=http://127.0.0.1:8765/generate and any
+GEMINI_API_KEY; streaming requests go to the same path with ?alt=sse.
+Latency and failure rate are configurable so retries, the circuit
+breaker and timeouts can be exercised without the real upstream; they are
+attributes of the server, so a check can change them while it runs, and
+the server keeps the arrival time of every request in arrivals.
+
+Usage: python benchmarks/gemini_stub.py [--port 8765] [--latency 0.5] [--fail-rate 0.1]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler():
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            server = self.server
+            server.arrivals.append(time.monotonic())
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(server.latency)
+            if random.random() < server.fail_rate:
+                status = server.fail_status
+                self._send(status, {"error": {"code": status, "message": "stub failure"}})
+                return
+            prompt = payload["contents"][0]["parts"][0]["text"]
+            text = f"Stub explanation for a {len(prompt)}-character prompt."
+            if "alt=sse" in self.path:
+                self._stream(text)
+            else:
+                self._send(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+        def _stream(self, text):
+            # streamGenerateContent?alt=sse: one SSE event per chunk, then close
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for word in text.split(" "):
+                chunk = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.server.latency / 10)
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+class StubServer(ThreadingHTTPServer):
+    # room for a few hundred callers connecting at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, fail_rate=0.0, fail_status=503):
+        super().__init__(address, make_handler())
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        # time.monotonic() of each request as it came in
+        self.arrivals = []
+
+    def handle_error(self, request, client_address):
+        # a caller that gave up on a slow reply has hung up; no traceback for that
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(port=8765, latency=0.0, fail_rate=0.0, fail_status=503, background=False):
+    server = StubServer(("127.0.0.1", port), latency, fail_rate, fail_status)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Gemini stub listening on http://127.0.0.1:{server.server_port}/generate")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+    serve(args.port, args.latency, args.fail_rate, args.fail_status)
@@ -0,0 +1,132 @@
+"""N+1 regression check: SQL statements per request must not grow with data.
+
+Each GET route is requested against a small dataset and again after the
+data has been multiplied; any route whose statement count grew is
+reported and the script exits non-zero.
+
+Usage: python benchmarks/query_counts.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# count the users lookup on every request rather than hiding it in the cache
+os.environ["SMARTPATH_USER_CACHE_TTL"] = "0"
+
+import db as db_module  # noqa: E402
+from app import app, create_app  # noqa: E402
+from flask import g  # noqa: E402
+
+STUDENT_ROUTES = [
+    "/api/student/progress",
+    "/api/student/learning-path",
+    "/api/student/assignments",
+    "/api/student/assignments?status=open&limit=10",
+    "/api/student/lessons",
+    "/api/student/manual-quizzes",
+    "/api/student/bootstrap",
+]
+MENTOR_ROUTES = [
+    "/api/mentor/students",
+    "/api/mentor/assignments",
+    "/api/mentor/assignments/1/submissions",
+    "/api/mentor/messages",
+    "/api/mentor/lessons",
+    "/api/mentor/quizzes",
+]
+
+
+@app.before_request
+def _start_counting():
+    g.sql_statements = []
+    db_module.get_db().set_trace_callback(g.sql_statements.append)
+
+
+@app.after_request
+def _stop_counting(response):
+    if "db" in g:
+        g.db.set_trace_callback(None)
+    response.headers["X-SQL-Count"] = str(len(g.get("sql_statements", [])))
+    return response
+
+
+def grow(scale, mentor_id, student_id):
+    """Add `scale` of everything the routes list."""
+    db = db_module.get_db()
+    c = db.cursor()
+    now = datetime.utcnow().isoformat()
+    for i in range(scale):
+        c.execute("INSERT INTO assignments (title, description, due_date) VALUES (?, 'd', '2099-01-01')",
+                  (f"Assignment {i}",))
+        c.execute("""
+            INSERT INTO assignment_submissions (assignment_id, student_id, content, submitted_at)
+            VALUES (?, ?, 'answer', ?)
+        """, (c.lastrowid, student_id, now))
+        c.execute("INSERT INTO users (name, email, password, role) VALUES (?, ?, 'x', 'student')",
+                  (f"Student {i}", f"s{scale}-{i}@bench.local"))
+        c.execute("""
+            INSERT INTO quiz_attempts (user_id, question_id, is_correct, source, created_at)
+            VALUES (?, ?, 1, 'bank', ?)
+        """, (c.lastrowid, i % 9 + 1, now))
+        c.execute("""
+            INSERT INTO quiz_attempts (user_id, question_id, is_correct, source, created_at)
+            VALUES (?, ?, 0, 'bank', ?)
+        """, (student_id, i % 9 + 1, now))
+        c.execute("""
+            INSERT INTO lessons (title, description, video_url, topic, created_by, created_at)
+            VALUES (?, 'd', '', 'Loops', ?, ?)
+        """, (f"Lesson {i}", mentor_id, now))
+        c.execute("INSERT INTO mentor_quizzes (title, description, created_by, created_at) VALUES (?, 'd', ?, ?)",
+                  (f"Quiz {i}", mentor_id, now))
+        c.execute("""
+            INSERT INTO mentor_quiz_questions (quiz_id, question, correct_option)
+            VALUES (?, 'q?', 'a')
+        """, (c.lastrowid,))
+        c.execute("""
+            INSERT INTO mentor_messages (student_id, mentor_id, question_text, created_at)
+            VALUES (?, ?, 'help', ?)
+        """, (student_id, mentor_id, now))
+    db.commit()
+
+
+def measure(student, mentor):
+    counts = {}
+    for client, routes in ((student, STUDENT_ROUTES), (mentor, MENTOR_ROUTES)):
+        for route in routes:
+            resp = client.get(route)
+            assert resp.status_code == 200, (route, resp.status_code)
+            counts[route] = int(resp.headers["X-SQL-Count"])
+    return counts
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_module.DB_NAME = os.path.join(tmp, "counts.db")
+        create_app()
+        student, mentor = app.test_client(), app.test_client()
+        mentor.post("/register/mentor", data={"name": "M", "email": "m@bench.local", "password": "p"})
+        student.post("/register/student", data={"name": "S", "email": "s@bench.local", "password": "p"})
+        mentor.post("/login/mentor", data={"email": "m@bench.local", "password": "p"})
+        student.post("/login/student", data={"email": "s@bench.local", "password": "p"})
+
+        with app.app_context():
+            grow(3, mentor_id=1, student_id=2)
+        small = measure(student, mentor)
+        with app.app_context():
+            grow(60, mentor_id=1, student_id=2)
+        large = measure(student, mentor)
+
+    failures = 0
+    print(f"{'route':<48} {'small':>5} {'large':>5}")
+    for route in small:
+        grew = large[route] > small[route]
+        failures += grew
+        print(f"{route:<48} {small[route]:>5} {large[route]:>5}{'  <-- grows with data' if grew else ''}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
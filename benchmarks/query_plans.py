@@ -0,0 +1,127 @@
+"""Check that the SQL behind each route is served by an index.
+
+Runs the repository functions and store methods each route calls against
+a freshly migrated database, records every statement they issue (the
+triggers' included) and exits non-zero if EXPLAIN QUERY PLAN shows any
+of them falling back to a full table scan, other than the scans listed
+as allowed for that route.
+
+Usage: python benchmarks/query_plans.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import repositories as repo  # noqa: E402
+from explanation_cache import ExplanationCache  # noqa: E402
+from migrations import migrate  # noqa: E402
+from pool import ConnectionPool  # noqa: E402
+from question_index import QuestionIndex  # noqa: E402
+
+NOW = time.time()
+RATE_BUCKETS = [("ai:global", 100, 10), ("ai:user:1", 10, 0.1)]
+# a student's list shows every assignment, so it reads the whole table in
+# id order; the table is a mentor-written catalog, not per-student data
+ALL_ASSIGNMENTS = {"SCAN a"}
+
+# the TTL part of the explanation cache sweep, which runs on one store in
+# EXPLAIN_CACHE_EVICT_EVERY, not per request
+CACHE_SWEEP = {"SCAN explanation_cache"}
+
+# (route, fn(db) running the route's statements, full scans allowed)
+ROUTE_CALLS = [
+    ("current_user", lambda db: repo.get_user(db, 1), set()),
+    ("login_student", lambda db: repo.find_login(db, "a", "b", "student"), set()),
+    ("api_progress / api_learning_path", lambda db: repo.user_topic_stats(db, [1]), set()),
+    ("api_generate_quiz (bank version)", lambda db: QuestionIndex().current_version(db), set()),
+    ("api_generate_quiz (smart)", lambda db: repo.bank_questions(db, [1, 2, 3]), set()),
+    ("api_generate_quiz (manual)", lambda db: repo.quiz_questions(db, 1), set()),
+    ("api_generate_quiz (session)", lambda db: repo.insert_quiz_session(
+        db, ("s1", 1, "bank", "[1]", "{}", 0, NOW), NOW - 3600), set()),
+    ("api_submit_quiz (session)", lambda db: repo.get_quiz_session(db, "s1"), set()),
+    ("api_submit_quiz (answers so far)", lambda db: repo.quiz_session_answers(db, "s1"), set()),
+    ("api_submit_quiz (record)", lambda db: repo.record_quiz_answers(
+        db, "s1", 1, "bank", [(1, "a", 1)], "2025-01-01"), set()),
+    ("api_submit_quiz (explanation cache)", lambda db: ExplanationCache().get(db, "k"), set()),
+    ("api_submit_quiz (rate limit)", lambda db: repo.take_rate_tokens(
+        db, RATE_BUCKETS, NOW), set()),
+    ("api_submit_quiz (rate limit refund)", lambda db: repo.return_rate_token(
+        db, "ai:global", 100), set()),
+    ("api_submit_quiz (explanation job)", lambda db: repo.insert_explanation_job(
+        db, "j1", 1, NOW, NOW - 3600), set()),
+    ("explanation worker", lambda db: repo.finish_explanation_job(
+        db, "j1", "done", "x", NOW), set()),
+    ("explanation worker (cache store)", lambda db: ExplanationCache()._store(
+        db, "k", "x", False), set()),
+    ("explanation worker (cache sweep)", lambda db: ExplanationCache()._store(
+        db, "k", "x", True), CACHE_SWEEP),
+    ("api_quiz_explanation", lambda db: repo.get_explanation_job(db, "j1"), set()),
+    ("catalogs", lambda db: repo.catalog_generation(db, "lessons"), set()),
+    ("api_student_assignments", lambda db: repo.student_assignment_rows(db, 1, limit=20),
+     ALL_ASSIGNMENTS),
+    ("api_student_assignments (empty page)", lambda db: repo.student_assignment_count(
+        db, 1, "open"), ALL_ASSIGNMENTS),
+    ("api_mentor_submissions", lambda db: repo.assignment_submissions(db, 1), set()),
+    ("api_mentor_students", repo.list_students, set()),
+    ("api_student_lessons", repo.list_lessons, set()),
+    ("api_mentor_lessons", lambda db: repo.lessons_by(db, 1), set()),
+    ("api_mentor_quizzes", lambda db: repo.quizzes_by(db, 1), set()),
+    ("api_student_message_mentor", repo.first_mentor, set()),
+    ("api_mentor_messages", lambda db: repo.mentor_messages_page(db, 51), set()),
+    ("api_mentor_messages (cursor)", lambda db: repo.mentor_messages_page(
+        db, 51, before=("2025-01-01", 10)), set()),
+    ("api_mentor_messages (mine)", lambda db: repo.mentor_messages_page(
+        db, 51, mentor_id=1, before=("2025-01-01", 10)), set()),
+    ("api_mentor_messages (unanswered)", lambda db: repo.mentor_messages_page(
+        db, 51, status="unanswered"), set()),
+    ("api_mentor_messages (mine, unanswered)", lambda db: repo.mentor_messages_page(
+        db, 51, mentor_id=1, status="unanswered"), set()),
+    ("api_mentor_messages (badge)", lambda db: repo.unanswered_count(db, 1), set()),
+]
+
+
+def traced(db, fn):
+    """The statements fn(db) runs, with their parameters bound."""
+    statements = []
+    db.set_trace_callback(statements.append)
+    try:
+        fn(db)
+    finally:
+        db.set_trace_callback(None)
+    # trigger bodies are reported as "-- TRIGGER name" lines
+    return [s for s in statements if not s.startswith("--")]
+
+
+def full_scans(db, sql, allowed):
+    plan = db.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+    details = [row["detail"] for row in plan]
+    bad = [d for d in details
+           if d.startswith("SCAN") and "USING" not in d and "VIRTUAL TABLE" not in d
+           # a materialized subquery or window is read back, not a table
+           and not d.startswith("SCAN (subquery") and d not in allowed]
+    return bad, details
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ConnectionPool(os.path.join(tmp, "plans.db")).connect()
+        migrate(db)
+        failures = 0
+        for route, fn, allowed in ROUTE_CALLS:
+            for sql in traced(db, fn):
+                bad, details = full_scans(db, sql, allowed)
+                if not details:
+                    continue
+                status = "FAIL" if bad else "ok"
+                print(f"{status:4} {route}: {'; '.join(details)}")
+                failures += bool(bad)
+            db.commit()
+        db.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
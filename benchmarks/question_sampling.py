@@ -0,0 +1,80 @@
+"""Smart quiz draw: ORDER BY RANDOM() vs the in-memory question index.
+
+Usage: python benchmarks/question_sampling.py [bank sizes...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db as db_module  # noqa: E402
+from app import SMART_QUIZ_SIZE, app  # noqa: E402
+from pool import get_pool  # noqa: E402
+from question_index import QuestionIndex  # noqa: E402
+
+TOPICS = ["Variables", "Loops", "Functions", "Conditions", "Lists", "OOP", "Files", "Errors"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+DRAWS = 200
+
+
+def seed(n_questions):
+    db = db_module.get_db()
+    rng = random.Random(n_questions)
+    db.executemany("""
+        INSERT INTO questions (
+            topic, difficulty, question,
+            option_a, option_b, option_c, option_d, correct_option
+        ) VALUES (?, ?, ?, 'A', 'B', 'C', 'D', ?)
+    """, [(rng.choice(TOPICS), rng.choice(DIFFICULTIES), f"Synthetic question {i}?", rng.choice("abcd"))
+          for i in range(n_questions)])
+    db.commit()
+
+
+def order_by_random():
+    c = db_module.get_db().cursor()
+    c.execute("""
+        SELECT id, topic, difficulty, question,
+               option_a, option_b, option_c, option_d, correct_option
+        FROM questions
+        ORDER BY RANDOM()
+        LIMIT ?
+    """, (SMART_QUIZ_SIZE,))
+    return c.fetchall()
+
+
+def per_draw_ms(fn):
+    start = time.perf_counter()
+    for _ in range(DRAWS):
+        fn()
+    return (time.perf_counter() - start) * 1000 / DRAWS
+
+
+def run(sizes):
+    print(f"{'bank':>8} {'RANDOM() ms':>12} {'index ms':>9} {'stratified ms':>14} {'index load ms':>14}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_module.DB_NAME = os.path.join(tmp, "bench.db")
+            with app.app_context():
+                db_module.init_db()
+                seed(n)
+                db = db_module.get_db()
+                index = QuestionIndex()
+                start = time.perf_counter()
+                index.refresh(db)
+                load_ms = (time.perf_counter() - start) * 1000
+
+                random_ms = per_draw_ms(order_by_random)
+                index_ms = per_draw_ms(lambda: index.fetch(db, index.sample_ids(db, SMART_QUIZ_SIZE)))
+                strat_ms = per_draw_ms(
+                    lambda: index.fetch(db, index.sample_ids(db, SMART_QUIZ_SIZE, stratify=True))
+                )
+                db_module.close_db()
+            get_pool(db_module.DB_NAME).close()
+        print(f"{n:>8} {random_ms:>12.3f} {index_ms:>9.3f} {strat_ms:>14.3f} {load_ms:>14.1f}")
+
+
+if __name__ == "__main__":
+    run([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000, 200000])
@@ -0,0 +1,176 @@
+"""AI rate limit check: the token buckets hold across worker processes.
+
+Runs the app with small buckets against a fresh database and the Gemini
+stub, under server.py with several workers and, when uvicorn is
+installed, under asgi:application. Then:
+
+  one student sends a burst of AI mentor requests; no more than the
+  user bucket allows (its burst plus what refilled meanwhile) get a
+  reply, whichever worker served them, and the rest get a 429 with
+  Retry-After
+
+  more students send requests until the global bucket runs dry; the
+  overflow gets a 503 with Retry-After
+
+  a throttled student's explain request is refused the same way, while
+  a grade still goes through
+
+Exits non-zero on the first difference.
+
+Usage: python benchmarks/rate_limit_check.py [--workers 4] [--modes server,asgi]
+"""
+import argparse
+import importlib.util
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_concurrency import free_port, wait_for  # noqa: E402
+
+USER_BURST = 3
+USER_PER_MINUTE = 6
+GLOBAL_BURST = 10
+GLOBAL_PER_MINUTE = 6
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(condition, label):
+    if not condition:
+        raise CheckFailed(label)
+    print(f"ok   {label}")
+
+
+def student(base_url, email):
+    http = requests.Session()
+    form = {"name": email, "email": email, "password": "pw"}
+    http.post(f"{base_url}/register/student", data=form)
+    http.post(f"{base_url}/login/student", data={"email": email, "password": "pw"})
+    return http
+
+
+def ask(http, base_url, n):
+    """Statuses of n AI mentor requests, each on its own connection."""
+    statuses = []
+    for i in range(n):
+        response = http.post(f"{base_url}/api/student/ai-mentor", json={"message": f"question {i}"},
+                             headers={"Connection": "close"})
+        if response.status_code != 200:
+            retry_after = response.headers.get("Retry-After", "")
+            if not retry_after.isdigit() or int(retry_after) < 1:
+                raise CheckFailed(f"{response.status_code} without a Retry-After")
+            if response.json().get("retry_after") != int(retry_after):
+                raise CheckFailed("retry_after in the body differs from the header")
+        statuses.append(response.status_code)
+    return statuses
+
+
+def allowed(burst, per_minute, elapsed):
+    # what a bucket can hand out over elapsed seconds, starting full
+    return int(burst + elapsed * per_minute / 60)
+
+
+def run_checks(base_url):
+    start = time.time()
+    first = student(base_url, "burst@check")
+    statuses = ask(first, base_url, 10)
+    elapsed = time.time() - start
+    check(set(statuses) <= {200, 429}, "one student: only replies and 429s")
+    check(USER_BURST <= statuses.count(200) <= allowed(USER_BURST, USER_PER_MINUTE, elapsed),
+          f"one student: {statuses.count(200)} of 10 answered, the user bucket's worth")
+
+    quiz = first.post(f"{base_url}/api/student/quiz/generate", json={}).json()
+    q = quiz["questions"][0]
+    graded = first.post(f"{base_url}/api/student/quiz/submit-batch", json={
+        "session_id": quiz["session_id"],
+        "answers": [{"question_id": q["id"], "selected_option": "a"}],
+    })
+    check(graded.status_code == 200, "throttled student: grading still works")
+    explain = first.post(f"{base_url}/api/student/quiz/explain", json={
+        "session_id": quiz["session_id"], "question_id": q["id"],
+    })
+    check(explain.status_code == 429 and "Retry-After" in explain.headers,
+          "throttled student: explain refused with 429")
+
+    others = [student(base_url, f"crowd{i}@check") for i in range(6)]
+    statuses = [s for http in others for s in ask(http, base_url, 2)]
+    elapsed = time.time() - start
+    replies = statuses.count(200) + 3
+    check(503 in statuses, "crowd: the global bucket runs dry and sheds with 503")
+    check(replies <= allowed(GLOBAL_BURST, GLOBAL_PER_MINUTE, elapsed),
+          f"crowd: {replies} replies in all, within the global bucket")
+
+    health = requests.get(f"{base_url}/health").json()["ai_limiter"]
+    check(health["throttled_user"] + health["throttled_global"] > 0,
+          "health: throttled requests are counted")
+    metrics = requests.get(f"{base_url}/metrics").text
+    check("smartpath_ai_limiter_throttled_global" in metrics, "metrics: throttle counters exported")
+
+
+def serve(mode, port, env, workers):
+    if mode == "server":
+        command = [sys.executable, os.path.join(ROOT, "server.py"), "--bind", f"127.0.0.1:{port}",
+                   "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "asgi:application", "--port", str(port),
+                   "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="server.py worker processes")
+    parser.add_argument("--modes", default="server,asgi")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "gemini_stub.py"), "--port", str(stub_port),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(stub_port, stub)
+        for mode in args.modes.split(","):
+            if mode == "asgi" and importlib.util.find_spec("uvicorn") is None:
+                print("skip asgi: uvicorn is not installed")
+                continue
+            print(f"-- {mode}")
+            port = free_port()
+            env = dict(
+                os.environ,
+                GEMINI_API_KEY="benchmark",
+                GEMINI_URL=f"http://127.0.0.1:{stub_port}/generate",
+                SMARTPATH_DB_PATH=os.path.join(tempfile.mkdtemp(), "rate_limit_check.db"),
+                SMARTPATH_AI_USER_BURST=str(USER_BURST),
+                SMARTPATH_AI_USER_PER_MINUTE=str(USER_PER_MINUTE),
+                SMARTPATH_AI_GLOBAL_BURST=str(GLOBAL_BURST),
+                SMARTPATH_AI_GLOBAL_PER_MINUTE=str(GLOBAL_PER_MINUTE),
+            )
+            server = serve(mode, port, env, args.workers)
+            try:
+                wait_for(port, server)
+                run_checks(f"http://127.0.0.1:{port}")
+            except CheckFailed as e:
+                print(f"FAIL {e}")
+                sys.exit(1)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(60)
+    finally:
+        stub.terminate()
+        stub.wait()
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
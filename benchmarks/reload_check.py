@@ -0,0 +1,237 @@
+"""Reload check for server.py: students keep taking quizzes through reloads.
+
+Starts the production server (server.py) with its workers on a fresh
+database and the Gemini stub with a slow reply, then has a few students
+generate quizzes, answer them one question at a time and poll for the
+explanations, while the master is sent HUP every few seconds. Quizzes
+generated by one generation of workers are graded and explained by the
+next.
+
+It exits non-zero if any request failed or got an unexpected status, if
+the quiz attempts in the database don't match the answers the students
+were told were graded, if an explanation job was left pending, or if
+the server didn't stop cleanly on TERM. It also prints the workers'
+memory as /proc reports it, to show how much of it is shared with the
+master.
+
+Usage: python benchmarks/reload_check.py [--workers 2] [--threads 8]
+           [--students 8] [--reloads 5] [--interval 3] [--latency 1.0]
+"""
+import argparse
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_concurrency import free_port, wait_for  # noqa: E402
+
+
+class Student(threading.Thread):
+    def __init__(self, base_url, i, stop):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.stop = stop
+        self.http = requests.Session()
+        self.email = f"reload{i}@check"
+        self.requests = 0
+        self.graded = 0
+        self.explained = 0
+        self.failures = []
+
+    def call(self, method, path, **kwargs):
+        self.requests += 1
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=30, **kwargs)
+        except requests.RequestException as e:
+            self.failures.append(f"{method} {path}: {e!r}")
+            return None
+        if response.status_code != 200:
+            self.failures.append(f"{method} {path}: {response.status_code} {response.text[:100]}")
+            return None
+        return response
+
+    def run(self):
+        form = {"name": self.email, "email": self.email, "password": "pw"}
+        self.call("POST", "/register/student", data=form)
+        self.call("POST", "/login/student", data={"email": self.email, "password": "pw"})
+        while not self.stop.is_set():
+            quiz = self.call("POST", "/api/student/quiz/generate", json={})
+            if quiz is None:
+                continue
+            quiz = quiz.json()
+            for q in quiz["questions"]:
+                # a pause per question, so reloads land in the middle of quizzes
+                time.sleep(random.uniform(0.05, 0.3))
+                answer = {
+                    "session_id": quiz["session_id"],
+                    "question_id": q["id"],
+                    "selected_option": random.choice("abcd"),
+                }
+                result = self.call("POST", "/api/student/quiz/submit", json=answer)
+                if result is None:
+                    continue
+                self.graded += 1
+                self.poll(result.json())
+
+    def poll(self, result):
+        url = result.get("explanation_url")
+        while url:
+            job = self.call("GET", url)
+            if job is None:
+                return
+            job = job.json()
+            if job["status"] != "pending":
+                if job["status"] != "done":
+                    self.failures.append(f"explanation job ended {job['status']}")
+                break
+            time.sleep(0.2)
+        self.explained += 1
+
+
+def children(pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the ppid is the second field after the parenthesised name
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def memory(pid):
+    """{field: kB} from smaps_rollup, or None where it isn't available."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return None
+    data = {}
+    for line in lines:
+        name, value = line.split(":", 1)
+        data[name] = int(value.split()[0])
+    return data
+
+
+def print_memory(master_pid):
+    for pid in children(master_pid):
+        m = memory(pid)
+        if m is None:
+            continue
+        shared = m["Shared_Clean"] + m["Shared_Dirty"]
+        print(f"  worker {pid}: rss {m['Rss'] / 1024:.1f} MB, shared {shared / 1024:.1f} MB, "
+              f"private {(m['Private_Clean'] + m['Private_Dirty']) / 1024:.1f} MB, "
+              f"pss {m['Pss'] / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--students", type=int, default=8)
+    parser.add_argument("--reloads", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=3.0, help="seconds between reloads")
+    parser.add_argument("--latency", type=float, default=1.0, help="stub seconds per Gemini reply")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "gemini_stub.py"),
+        "--port", str(stub_port), "--latency", str(args.latency),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    port = free_port()
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "reload_check.db")
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="benchmark",
+        GEMINI_URL=f"http://127.0.0.1:{stub_port}/generate",
+        SMARTPATH_DB_PATH=db_path,
+        # every answer should produce an explanation job, not a throttle
+        SMARTPATH_AI_USER_PER_MINUTE="0",
+        SMARTPATH_AI_GLOBAL_PER_MINUTE="0",
+    )
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "w") as log:
+        server = subprocess.Popen([
+            sys.executable, os.path.join(ROOT, "server.py"), "--bind", f"127.0.0.1:{port}",
+            "--workers", str(args.workers), "--threads", str(args.threads),
+        ], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    failures = []
+    try:
+        wait_for(stub_port, stub)
+        wait_for(port, server)
+        # the socket is open before the master has warmed up and forked
+        while len(children(server.pid)) < args.workers:
+            time.sleep(0.1)
+        print(f"{args.workers} workers x {args.threads} threads, {args.students} students, "
+              f"{args.reloads} reloads every {args.interval}s")
+        print("memory after start:")
+        print_memory(server.pid)
+
+        stop = threading.Event()
+        students = [Student(f"http://127.0.0.1:{port}", i, stop) for i in range(args.students)]
+        for s in students:
+            s.start()
+        for n in range(args.reloads):
+            time.sleep(args.interval)
+            server.send_signal(signal.SIGHUP)
+            print(f"reload {n + 1}: workers {children(server.pid)}")
+        time.sleep(args.interval)
+        print("memory under load:")
+        print_memory(server.pid)
+        stop.set()
+        for s in students:
+            s.join(60)
+            failures.extend(s.failures)
+
+        server.send_signal(signal.SIGTERM)
+        if server.wait(60) != 0:
+            failures.append(f"server exited with {server.returncode} on TERM")
+    finally:
+        for proc in (server, stub):
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+    conn = sqlite3.connect(db_path)
+    attempts = conn.execute("SELECT COUNT(*) FROM quiz_attempts").fetchone()[0]
+    pending = conn.execute(
+        "SELECT COUNT(*) FROM explanation_jobs WHERE status = 'pending'"
+    ).fetchone()[0]
+    conn.close()
+
+    graded = sum(s.graded for s in students)
+    print(f"requests {sum(s.requests for s in students)}, answers graded {graded}, "
+          f"explanations {sum(s.explained for s in students)}, quiz attempts stored {attempts}, "
+          f"explanation jobs left pending {pending}")
+    if attempts != graded:
+        failures.append(f"{graded} answers graded but {attempts} quiz attempts stored")
+    if pending:
+        failures.append(f"{pending} explanation jobs left pending")
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    if failures:
+        print(f"server log: {log_path}")
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Per-endpoint latency and throughput at increasing dataset sizes.
+
+For each scale (number of students) a fresh database is filled by the
+synthetic data generator, the Gemini API is replaced by the local stub,
+and every endpoint below is driven by concurrent logged-in users through
+the Flask test client or a real local HTTP server. p50/p95/p99 latency
+and requests per second are printed per endpoint and saved as JSON under
+benchmarks/results/, tagged with the git revision; the newest earlier
+result file is used as the baseline and p95 regressions are flagged.
+
+Each scale runs in its own subprocess so pools, caches and indexes start
+cold and can't leak between databases.
+
+Usage: python benchmarks/scale.py [--scales 100,1000,10000] [--requests 200]
+           [--concurrency 8] [--mode client|server] [--compare FILE]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+
+# quiz attempts and messages per student at every scale
+ATTEMPTS_PER_STUDENT = 100
+MESSAGES_PER_STUDENT = 2
+# p95 this much slower than the baseline is reported as a regression
+REGRESSION_RATIO = 1.2
+GEMINI_STUB_LATENCY = 0.02
+
+
+def quiz_answers(client):
+    quiz = client.post("/api/student/quiz/generate", json={})[1]
+    return {
+        "session_id": quiz["session_id"],
+        "answers": [
+            {"question_id": q["id"], "selected_option": random.choice("abcd")}
+            for q in quiz["questions"]
+        ],
+    }
+
+
+# (name, role, method, path, body or a callable preparing it untimed);
+# {assignment_id} in a path is the newest synthetic assignment
+ENDPOINTS = [
+    ("student bootstrap", "student", "GET", "/api/student/bootstrap", None),
+    ("student progress", "student", "GET", "/api/student/progress", None),
+    ("student learning path", "student", "GET", "/api/student/learning-path", None),
+    ("student assignments", "student", "GET", "/api/student/assignments?limit=20", None),
+    ("student lessons", "student", "GET", "/api/student/lessons", None),
+    ("student manual quizzes", "student", "GET", "/api/student/manual-quizzes", None),
+    ("quiz generate", "student", "POST", "/api/student/quiz/generate", {}),
+    ("quiz submit batch", "student", "POST", "/api/student/quiz/submit-batch", quiz_answers),
+    ("ai mentor", "student", "POST", "/api/student/ai-mentor", {"message": "What is a list?"}),
+    ("mentor students", "mentor", "GET", "/api/mentor/students", None),
+    ("mentor messages", "mentor", "GET", "/api/mentor/messages?limit=50", None),
+    ("mentor submissions", "mentor", "GET", "/api/mentor/assignments/{assignment_id}/submissions", None),
+]
+
+
+class TestClient:
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def get(self, path):
+        resp = self._client.get(path)
+        return resp.status_code, resp.get_json(silent=True)
+
+    def post(self, path, json=None, data=None):
+        resp = self._client.post(path, json=json, data=data)
+        return resp.status_code, resp.get_json(silent=True)
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+        self._base = base_url
+        self._session = requests.Session()
+
+    def get(self, path):
+        resp = self._session.get(self._base + path)
+        return resp.status_code, _json(resp)
+
+    def post(self, path, json=None, data=None):
+        resp = self._session.post(self._base + path, json=json, data=data, allow_redirects=False)
+        return resp.status_code, _json(resp)
+
+
+def _json(resp):
+    try:
+        return resp.json()
+    except ValueError:
+        return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def drive(make_client, logins, role, method, path, body, n_requests, concurrency):
+    """Send n_requests split over concurrency logged-in clients."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(count):
+        client = make_client()
+        email = random.choice(logins[role])
+        client.post(f"/login/{role}", data={"email": email, "password": "synthetic"})
+        mine = []
+        failed = 0
+        for _ in range(count):
+            payload = body(client) if callable(body) else body
+            start = time.perf_counter()
+            if method == "GET":
+                status, _ = client.get(path)
+            else:
+                status, _ = client.post(path, json=payload)
+            mine.append(time.perf_counter() - start)
+            failed += status >= 400
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    per_thread = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(n,)) for n in per_thread if n]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+def run_scale(students, n_requests, concurrency, mode):
+    """Runs in a fresh interpreter; returns the results for one scale."""
+    from gemini_stub import serve
+
+    stub = serve(port=0, latency=GEMINI_STUB_LATENCY, background=True)
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    os.environ["GEMINI_URL"] = f"http://127.0.0.1:{stub.server_port}/generate"
+    # latency is measured here, not the AI quotas
+    os.environ["SMARTPATH_AI_USER_PER_MINUTE"] = "0"
+    os.environ["SMARTPATH_AI_GLOBAL_PER_MINUTE"] = "0"
+
+    import db as db_module
+    tmp = tempfile.mkdtemp()
+    db_module.DB_NAME = os.path.join(tmp, "scale.db")
+
+    from app import create_app, generate_dataset
+    app = create_app()
+    with app.app_context():
+        conn = db_module.get_db()
+        start = time.perf_counter()
+        dataset = generate_dataset(
+            conn,
+            students=students,
+            mentors=max(students // 100, 1),
+            attempts=students * ATTEMPTS_PER_STUDENT,
+            messages=students * MESSAGES_PER_STUDENT,
+        )
+        load_seconds = time.perf_counter() - start
+        c = conn.cursor()
+        c.execute("SELECT MAX(id) AS id FROM assignments")
+        ids = {"assignment_id": c.fetchone()["id"]}
+        c.execute("SELECT email, role FROM users")
+        logins = {"student": [], "mentor": []}
+        for r in c.fetchall():
+            logins[r["role"]].append(r["email"])
+
+    if mode == "server":
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        def make_client():
+            return HttpClient(base_url)
+    else:
+        def make_client():
+            return TestClient(app)
+
+    endpoints = {}
+    for name, role, method, path, body in ENDPOINTS:
+        endpoints[name] = drive(
+            make_client, logins, role, method, path.format(**ids), body, n_requests, concurrency
+        )
+    return {"dataset": dataset, "load_seconds": round(load_seconds, 2), "endpoints": endpoints}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latest_result():
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, "scale-*.json")))
+    return files[-1] if files else None
+
+
+def report(results, baseline):
+    base_scales = (baseline or {}).get("scales", {})
+    for scale, data in results["scales"].items():
+        print(f"\n{scale} students (loaded in {data['load_seconds']}s)")
+        print(f"{'endpoint':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7} {'p95 vs base':>12}")
+        base_endpoints = base_scales.get(scale, {}).get("endpoints", {})
+        for name, r in data["endpoints"].items():
+            delta = ""
+            base = base_endpoints.get(name)
+            if base and base["p95_ms"]:
+                ratio = r["p95_ms"] / base["p95_ms"]
+                delta = f"{ratio:.2f}x" + (" SLOWER" if ratio > REGRESSION_RATIO else "")
+            print(f"{name:<24} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                  f"{r['rps']:>8.0f} {r['errors']:>7} {delta:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="100,1000,10000", help="comma-separated student counts")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=["client", "server"], default="client")
+    parser.add_argument("--compare", help="baseline result file (default: newest in benchmarks/results)")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--run-scale", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale:
+        result = run_scale(args.run_scale, args.requests, args.concurrency, args.mode)
+        print(json.dumps(result))
+        return
+
+    baseline_file = args.compare or latest_result()
+    baseline = None
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+
+    results = {
+        "revision": git_revision(),
+        "created_at": datetime.utcnow().isoformat(),
+        "mode": args.mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scales": {},
+    }
+    for scale in [int(s) for s in args.scales.split(",")]:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-scale", str(scale),
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+             "--mode", args.mode],
+            capture_output=True, text=True, check=True, cwd=ROOT,
+        ).stdout
+        results["scales"][str(scale)] = json.loads(out.strip().splitlines()[-1])
+
+    if baseline_file:
+        print(f"baseline: {os.path.relpath(baseline_file, ROOT)} ({baseline.get('revision')})")
+    report(results, baseline)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"scale-{stamp}-{results['revision']}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nsaved {os.path.relpath(path, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Storage backend conformance check: the same flows against SQLite or Postgres.
+
+Drives registration, quizzes, assignments, messages, lessons, mentor
+quizzes, the explanation cache and the projections through the app and
+the repository functions, and exits non-zero on the first backend
+difference from what the routes promise.
+
+With SMARTPATH_DATABASE_URL unset it runs on a throwaway SQLite file. With
+a postgresql:// URL it creates a scratch schema in that database, runs
+there and drops it afterwards, so it can point at a shared CI server.
+
+Usage: python benchmarks/storage_check.py
+       SMARTPATH_DATABASE_URL=postgresql://localhost/smartpath python benchmarks/storage_check.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.pop("GEMINI_API_KEY", None)
+os.environ["SMARTPATH_USER_CACHE_TTL"] = "0"
+
+import db as db_module  # noqa: E402
+import repositories as repo  # noqa: E402
+from analytics import rebuild_topic_stats, verify_topic_stats  # noqa: E402
+from explanation_cache import ExplanationCache  # noqa: E402
+from question_index import question_index  # noqa: E402
+from synthetic import generate_dataset  # noqa: E402
+
+CONCURRENT_SUBMITS = 8
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def check(condition, label):
+    if not condition:
+        raise CheckFailed(label)
+    print(f"ok   {label}")
+
+
+def client_for(app, role, name, email):
+    client = app.test_client()
+    client.post(f"/register/{role}", data={"name": name, "email": email, "password": "pw"})
+    client.post(f"/login/{role}", data={"email": email, "password": "pw"})
+    return client
+
+
+def check_users(app, mentor, student):
+    dup = app.test_client().post(
+        "/register/student", data={"name": "Again", "email": "s@check", "password": "pw"}
+    )
+    check(b"already exists" in dup.data, "users: duplicate email is refused")
+    with app.app_context():
+        db = db_module.get_db()
+        check(repo.find_login(db, "s@check", "pw", "student") is not None, "users: login lookup")
+        check(repo.find_login(db, "s@check", "pw", "mentor") is None, "users: login checks role")
+        check(repo.first_mentor(db)["email"] == "m@check", "users: first mentor")
+    check(student.get("/api/student/progress").status_code == 200, "users: student session works")
+    check(mentor.get("/api/mentor/students").status_code == 200, "users: mentor session works")
+
+
+def check_attempts(app, student):
+    quiz = student.post("/api/student/quiz/generate", json={}).get_json()
+    check(len(quiz["questions"]) == 5, "attempts: smart quiz draws 5 questions")
+    check(all("correct_option" not in q for q in quiz["questions"]), "attempts: key stays server-side")
+    for route in ("submit", "submit-batch", "explain"):
+        statuses = {student.post(f"/api/student/quiz/{route}", json={"session_id": bad}).status_code
+                    for bad in ({}, [])}
+        check(statuses == {400}, f"attempts: {route} refuses a session_id that isn't a string")
+    answers = [{"question_id": q["id"], "selected_option": "a"} for q in quiz["questions"]]
+    graded = student.post("/api/student/quiz/submit-batch", json={
+        "session_id": quiz["session_id"], "answers": answers
+    }).get_json()
+    check(graded["graded"] == 5, "attempts: batch submit grades every answer")
+    progress = student.get("/api/student/progress").get_json()
+    check(progress["total_attempts"] == 5, "attempts: topic stats trigger counts the attempts")
+    check(progress["overall_accuracy"] == graded["correct"] * 100 // 5, "attempts: accuracy")
+    with app.app_context():
+        db = db_module.get_db()
+        check(verify_topic_stats(db) == [], "attempts: projection matches raw attempts")
+        rebuild_topic_stats(db)
+        check(verify_topic_stats(db) == [], "attempts: projection rebuilds")
+        before = question_index.current_version(db)
+        db_module.run_write(lambda conn: conn.execute("""
+            INSERT INTO questions (topic, difficulty, question, option_a, option_b,
+                                   option_c, option_d, correct_option)
+            VALUES ('Loops', 'easy', 'Check?', 'a', 'b', 'c', 'd', 'a')
+        """))
+        check(question_index.current_version(db) > before, "attempts: bank edits bump the version")
+
+        answered = quiz["questions"][0]
+        topic = db.execute("SELECT topic FROM questions WHERE id = ?", (answered["id"],)).fetchone()["topic"]
+        db_module.run_write(lambda conn: conn.execute(
+            "UPDATE questions SET topic = 'Moved' WHERE id = ?", (answered["id"],)))
+        check(verify_topic_stats(db) == [], "attempts: projection follows a topic edit")
+        check("Moved" in student.get("/api/student/progress").get_json()["topic_stats"],
+              "attempts: progress shows the new topic")
+        db_module.run_write(lambda conn: conn.execute(
+            "DELETE FROM questions WHERE id = ?", (answered["id"],)))
+        check(verify_topic_stats(db) == [], "attempts: projection follows a deleted question")
+        progress = student.get("/api/student/progress").get_json()
+        check(progress["total_attempts"] == 5 and "Moved" not in progress["topic_stats"],
+              "attempts: attempts on a deleted question still count, under no topic")
+        db_module.run_write(lambda conn: conn.execute("""
+            INSERT INTO questions (id, topic, difficulty, question, option_a, option_b,
+                                   option_c, option_d, correct_option)
+            VALUES (?, ?, 'easy', 'Restored?', 'a', 'b', 'c', 'd', 'a')
+        """, (answered["id"], topic)))
+        check(verify_topic_stats(db) == [], "attempts: a restored question takes its attempts back")
+        rows = repo.bank_questions(db, [1, 2, 3])
+        check(sorted(r["id"] for r in rows) == [1, 2, 3], "attempts: id list lookup")
+
+
+def check_assignments(app, mentor, student, student_id):
+    listed = student.get("/api/student/assignments")
+    check(listed.headers["X-Total-Count"] == "3" and len(listed.get_json()) == 3,
+          "assignments: seeded list, no limit")
+    page = student.get("/api/student/assignments?limit=2&offset=2")
+    check(len(page.get_json()) == 1 and page.headers["X-Total-Count"] == "3",
+          "assignments: limit/offset keep the full count")
+
+    threads = [
+        threading.Thread(target=student.post, args=("/api/student/assignments/submit",),
+                         kwargs={"json": {"assignment_id": 1, "content": f"try {i}"}})
+        for i in range(CONCURRENT_SUBMITS)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with app.app_context():
+        rows = repo.assignment_submissions(db_module.get_db(), 1)
+    check(len(rows) == 1, "assignments: concurrent resubmits leave one submission")
+    submitted = student.get("/api/student/assignments?status=submitted").get_json()
+    check([a["id"] for a in submitted] == [1], "assignments: submitted filter")
+    check(student.post("/api/student/assignments/submit",
+                       json={"assignment_id": 999, "content": "x"}).status_code == 400,
+          "assignments: unknown assignment")
+
+    resp = mentor.post("/api/mentor/submissions/feedback",
+                       json={"submission_id": f"1_{student_id}", "feedback": "Good", "rating": 4})
+    check(resp.status_code == 200, "assignments: feedback saved")
+    resp = mentor.post("/api/mentor/submissions/feedback",
+                       json={"submission_id": f"2_{student_id}", "feedback": "x", "rating": 1})
+    check(resp.status_code == 400, "assignments: feedback needs a submission")
+    subs = mentor.get("/api/mentor/assignments/1/submissions").get_json()
+    check(subs[0]["rating"] == 4 and subs[0]["feedback"] == "Good", "assignments: submissions list")
+
+    mentor.post("/api/mentor/assignments", json={"title": "New", "description": "d", "due_date": "2000-01-01"})
+    catalog = mentor.get("/api/mentor/assignments").get_json()
+    check(catalog[-1]["title"] == "New", "assignments: created assignment is listed")
+    overdue = student.get("/api/student/assignments?status=overdue").get_json()
+    check("New" in [a["title"] for a in overdue] and 1 not in [a["id"] for a in overdue],
+          "assignments: overdue filter")
+
+
+def check_messages(app, mentor, student, mentor_id):
+    for i in range(5):
+        student.post("/api/student/mentor/message", json={"question_text": f"Question {i}"})
+    first = mentor.get("/api/mentor/messages?limit=2").get_json()
+    check(len(first["messages"]) == 2 and first["next_cursor"], "messages: first page")
+    check(first["unanswered_count"] == 5, "messages: inbox counts trigger")
+    seen = [m["id"] for m in first["messages"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = mentor.get(f"/api/mentor/messages?limit=2&cursor={cursor}").get_json()
+        seen += [m["id"] for m in page["messages"]]
+        cursor = page["next_cursor"]
+    check(len(seen) == 5 and len(set(seen)) == 5, "messages: keyset pages cover every message once")
+
+    mentor.post("/api/mentor/messages", json={"message_id": seen[0], "answer_text": "Answer"})
+    mine = mentor.get("/api/mentor/messages?scope=mine&status=unanswered").get_json()
+    check(len(mine["messages"]) == 4 and mine["unanswered_count"] == 4,
+          "messages: answering updates filters and count")
+    with app.app_context():
+        db = db_module.get_db()
+        check(repo.unanswered_count(db, mentor_id) == 4 and repo.unanswered_count(db) == 4,
+              "messages: unanswered count per mentor and overall")
+
+
+def check_lessons_and_quizzes(mentor, student):
+    mentor.post("/api/mentor/lessons", json={"title": "Loops 101", "topic": "Loops"})
+    lessons = student.get("/api/student/lessons").get_json()
+    check([lesson["title"] for lesson in lessons] == ["Loops 101"], "lessons: catalog")
+    check(mentor.get("/api/mentor/lessons").get_json()[0]["title"] == "Loops 101", "lessons: mine")
+
+    mentor.post("/api/mentor/quizzes", json={"title": "Checkpoint"})
+    check(student.get("/api/student/manual-quizzes").get_json() == [],
+          "quizzes: empty quizzes are hidden")
+    quiz_id = mentor.get("/api/mentor/quizzes").get_json()[0]["id"]
+    for option in "ab":
+        mentor.post(f"/api/mentor/quizzes/{quiz_id}/questions", json={
+            "question": f"Pick {option}", "option_a": "A", "option_b": "B",
+            "option_c": "C", "option_d": "D", "correct_option": option,
+        })
+    catalog = student.get("/api/student/manual-quizzes").get_json()
+    check(catalog[0]["question_count"] == 2, "quizzes: catalog counts questions")
+    quiz = student.post("/api/student/quiz/generate", json={"mode": "manual", "quiz_id": quiz_id}).get_json()
+    graded = student.post("/api/student/quiz/submit-batch", json={
+        "session_id": quiz["session_id"],
+        "answers": [{"question_id": q["id"], "selected_option": "a"} for q in quiz["questions"]],
+    }).get_json()
+    check(graded["graded"] == 2 and graded["correct"] == 1, "quizzes: manual quiz grades")
+
+
+def check_explanation_cache(app):
+    cache = ExplanationCache(max_entries=3, evict_every=3)
+    with app.app_context():
+        db = db_module.get_db()
+        c = db.cursor()
+        for i in range(5):
+            cache.put(f"key-{i}", f"text {i}")
+        c.execute("SELECT COUNT(*) AS n FROM explanation_cache")
+        check(c.fetchone()["n"] > 3, "explanation cache: no sweep between evict_every stores")
+        cache.put("key-4", "replaced")
+        check(cache.get(db, "key-4") == "replaced", "explanation cache: upsert")
+        c.execute("SELECT COUNT(*) AS n FROM explanation_cache")
+        check(c.fetchone()["n"] == 3, "explanation cache: evicts down to max_entries")
+
+
+def check_synthetic(app):
+    with app.app_context():
+        db = db_module.get_db()
+        counts = generate_dataset(db, students=20, mentors=2, questions=10, attempts=500,
+                                  assignments=3, messages=30)
+        check(counts["quiz_attempts"] == 500, "synthetic: bulk load")
+        check(verify_topic_stats(db) == [], "synthetic: projection consistent after bulk load")
+
+
+def run():
+    # imported here so the backend chosen in main() is the one bootstrapped
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        check(db_module.init_db() == [], "migrations: second run applies nothing")
+
+    mentor = client_for(app, "mentor", "Mentor", "m@check")
+    student = client_for(app, "student", "Student", "s@check")
+    with app.app_context():
+        db = db_module.get_db()
+        mentor_id = repo.find_login(db, "m@check", "pw", "mentor")["id"]
+        student_id = repo.find_login(db, "s@check", "pw", "student")["id"]
+
+    check_users(app, mentor, student)
+    check_attempts(app, student)
+    check_assignments(app, mentor, student, student_id)
+    check_messages(app, mentor, student, mentor_id)
+    check_lessons_and_quizzes(mentor, student)
+    check_explanation_cache(app)
+    check_synthetic(app)
+
+
+def main():
+    url = os.getenv("SMARTPATH_DATABASE_URL", "")
+    schema = None
+    if db_module.is_postgres_url(url):
+        import psycopg
+
+        schema = f"storage_check_{uuid.uuid4().hex[:8]}"
+        with psycopg.connect(url, autocommit=True) as conn:
+            conn.execute(f"CREATE SCHEMA {schema}")
+        sep = "&" if "?" in url else "?"
+        db_module.DATABASE_URL = f"{url}{sep}options=-csearch_path%3D{schema}"
+        print(f"backend: postgres (schema {schema})")
+    else:
+        tmp = tempfile.mkdtemp()
+        db_module.DB_NAME = os.path.join(tmp, "storage_check.db")
+        print(f"backend: sqlite ({db_module.DB_NAME})")
+
+    try:
+        run()
+    except CheckFailed as e:
+        print(f"FAIL {e}")
+        return 1
+    finally:
+        if schema:
+            from postgres import get_backend
+            get_backend(db_module.DATABASE_URL)[0].close()
+            with psycopg.connect(url, autocommit=True) as conn:
+                conn.execute(f"DROP SCHEMA {schema} CASCADE")
+    print("all checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
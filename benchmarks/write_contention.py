@@ -0,0 +1,86 @@
+"""Concurrent quiz submits: commit-per-request vs the group-committing writer.
+
+Usage: python benchmarks/write_contention.py [thread counts...]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db as db_module  # noqa: E402
+from app import app  # noqa: E402
+from pool import get_pool  # noqa: E402
+from repositories import insert_quiz_attempts  # noqa: E402
+from writer import get_writer  # noqa: E402
+
+WRITES_PER_THREAD = 200
+
+
+def attempt_rows(uid):
+    return [(uid, 1, 1, "bank", datetime.utcnow().isoformat())]
+
+
+def direct_writer(uid):
+    """The old route shape: check a connection out, insert, commit."""
+    pool = get_pool(db_module.DB_NAME)
+    for _ in range(WRITES_PER_THREAD):
+        conn = pool.acquire()
+        try:
+            insert_quiz_attempts(conn, attempt_rows(uid))
+            conn.commit()
+        finally:
+            pool.release(conn)
+
+
+def queued_writer(uid):
+    for _ in range(WRITES_PER_THREAD):
+        db_module.run_write(insert_quiz_attempts, attempt_rows(uid))
+
+
+def timed_threads(fn, n_threads):
+    threads = [threading.Thread(target=fn, args=(uid,)) for uid in range(1, n_threads + 1)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def count_attempts():
+    c = db_module.get_db().cursor()
+    c.execute("SELECT COUNT(*) FROM quiz_attempts")
+    return c.fetchone()[0]
+
+
+def run(thread_counts):
+    print(f"{'threads':>8} {'direct w/s':>11} {'busy retries':>13} {'writer w/s':>11} {'avg batch':>10}")
+    for n in thread_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_module.DB_NAME = os.path.join(tmp, "bench.db")
+            with app.app_context():
+                db_module.init_db()
+                db_module.close_db()
+                pool = get_pool(db_module.DB_NAME)
+
+                direct_s = timed_threads(direct_writer, n)
+                busy_retries = pool.stats()["busy_retries"]
+                queued_s = timed_threads(queued_writer, n)
+                stats = db_module.writer_stats()
+
+                expected = 2 * n * WRITES_PER_THREAD
+                assert count_attempts() == expected, "lost writes"
+                db_module.close_db()
+            get_writer(db_module.DB_NAME).close()
+            pool.close()
+        total = n * WRITES_PER_THREAD
+        print(f"{n:>8} {total / direct_s:>11.0f} {busy_retries:>13} "
+              f"{total / queued_s:>11.0f} {stats.get('batch_size_avg', 0):>10.1f}")
+
+
+if __name__ == "__main__":
+    run([int(a) for a in sys.argv[1:]] or [1, 8, 32])
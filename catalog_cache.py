@@ -0,0 +1,71 @@
+import hashlib
+import threading
+
+from repositories import catalog_generation
+
+
+class CatalogEntry:
+    def __init__(self, generation, data, body):
+        self.generation = generation
+        self.data = data
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+
+class CatalogCache:
+    """In-process cache of shared, read-mostly catalog responses.
+
+    Each catalog has a generation number in catalog_generations that
+    triggers bump on every change to its tables, whichever process made
+    it; an entry built at an older generation is rebuilt on its next
+    read, so a hit costs one single-row read. Entries keep both the data
+    and the serialized body, so the ETag is a hash of exactly what was
+    sent.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "not_modified": 0}
+
+    def get(self, db, name, build, serialize):
+        """The entry for name, calling build() and serialize(data) on a miss."""
+        generation = catalog_generation(db, name)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.generation == generation:
+                self._stats["hits"] += 1
+                return entry
+            if entry is not None:
+                self._stats["invalidations"] += 1
+            self._stats["misses"] += 1
+
+        data = build()
+        body = serialize(data)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        entry = CatalogEntry(generation, data, body)
+        with self._lock:
+            # another request may have cached a newer generation meanwhile
+            if self._generations.get(name, -1) <= generation:
+                self._entries[name] = entry
+                self._generations[name] = generation
+        return entry
+
+    def count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["entries"] = len(self._entries)
+            data["bytes"] = sum(len(e.body) for e in self._entries.values())
+            data["generations"] = dict(self._generations)
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else 0.0
+        return data
+
+
+catalog_cache = CatalogCache()
@@ -1,147 +1,108 @@
-import sqlite3
+from contextlib import contextmanager
 from flask import g
 import os
+import time
 
-DB_NAME = os.path.join(os.path.dirname(__file__), "smartpath.db")
+from metrics import observe_sql
+from migrations import migrate
+from pool import close_pools, get_pool
+from writer import close_writers, get_writer
+
+DB_NAME = os.getenv("SMARTPATH_DB_PATH", os.path.join(os.path.dirname(__file__), "smartpath.db"))
+# postgresql://... selects the Postgres backend; unset keeps SQLite at DB_NAME
+DATABASE_URL = os.getenv("SMARTPATH_DATABASE_URL", "")
+
+
+def is_postgres_url(url):
+    return url.startswith(("postgres://", "postgresql://"))
+
+
+def _pool():
+    if is_postgres_url(DATABASE_URL):
+        from postgres import get_backend
+        return get_backend(DATABASE_URL)[0]
+    return get_pool(DB_NAME)
+
+
+def _writer():
+    if is_postgres_url(DATABASE_URL):
+        from postgres import get_backend
+        return get_backend(DATABASE_URL)[1]
+    return get_writer(DB_NAME)
 
 
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(DB_NAME)
-        g.db.row_factory = sqlite3.Row
+        g.db = _pool().acquire()
+        g.db.observer = observe_sql
     return g.db
 
 
 def close_db(e=None):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        db.observer = None
+        db.pool.release(db)
+
+
+@contextmanager
+def pooled_connection():
+    """A pooled connection for code running outside a request (workers, CLI)."""
+    pool = _pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def close_all():
+    """Commit queued writes and close every connection, leaving nothing
+    running behind: called before forking workers, whose inherited
+    connections and writer thread would otherwise be unusable, and when a
+    worker exits. The next get_db() or write opens them again."""
+    close_writers()
+    close_pools()
+    if is_postgres_url(DATABASE_URL):
+        from postgres import close_backends
+        close_backends()
+
+
+def pool_stats():
+    return _pool().stats()
+
+
+def run_write(fn, *args):
+    """Run fn(conn, *args) as a write and return its result once committed.
+
+    On SQLite it runs on the group-committing writer thread; on Postgres
+    in its own transaction on a pooled connection.
+    """
+    start = time.perf_counter()
+    try:
+        return _writer().write(fn, *args)
+    finally:
+        observe_sql(time.perf_counter() - start)
+
+
+def submit_write(fn, *args):
+    """Queue fn(conn, *args) as a write without waiting; returns a Future."""
+    return _writer().submit(fn, *args)
+
+
+def writer_stats():
+    return _writer().stats()
 
 
 def init_db():
+    """Migrate the schema and seed starter data; returns applied versions."""
     db = get_db()
+    applied = migrate(db)
     c = db.cursor()
 
-    # USERS
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        role TEXT NOT NULL CHECK(role IN ('student','mentor'))
-    )
-    """)
-
-    # QUESTIONS (smart/bank questions)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        topic TEXT NOT NULL,
-        difficulty TEXT NOT NULL,
-        question TEXT NOT NULL,
-        option_a TEXT,
-        option_b TEXT,
-        option_c TEXT,
-        option_d TEXT,
-        correct_option TEXT NOT NULL
-    )
-    """)
-
-    # QUIZ ATTEMPTS (track source: bank/manual)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS quiz_attempts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        question_id INTEGER NOT NULL,
-        is_correct INTEGER NOT NULL,
-        source TEXT NOT NULL DEFAULT 'bank',
-        created_at TEXT NOT NULL,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-
-    # ASSIGNMENTS
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS assignments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        description TEXT,
-        due_date TEXT
-    )
-    """)
-
-    # ASSIGNMENT SUBMISSIONS
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS assignment_submissions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        assignment_id INTEGER NOT NULL,
-        student_id INTEGER NOT NULL,
-        content TEXT,
-        submitted_at TEXT,
-        feedback TEXT,
-        rating INTEGER,
-        FOREIGN KEY(assignment_id) REFERENCES assignments(id),
-        FOREIGN KEY(student_id) REFERENCES users(id)
-    )
-    """)
-
-    # MENTOR MESSAGES
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS mentor_messages (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        student_id INTEGER NOT NULL,
-        mentor_id INTEGER NOT NULL,
-        question_text TEXT NOT NULL,
-        answer_text TEXT,
-        created_at TEXT NOT NULL,
-        answered_at TEXT,
-        FOREIGN KEY(student_id) REFERENCES users(id),
-        FOREIGN KEY(mentor_id) REFERENCES users(id)
-    )
-    """)
-
-    # LESSONS / CLASSES (video-based)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS lessons (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        description TEXT,
-        video_url TEXT,
-        topic TEXT,
-        created_by INTEGER,
-        created_at TEXT,
-        FOREIGN KEY(created_by) REFERENCES users(id)
-    )
-    """)
-
-    # MANUAL QUIZZES (mentor-created)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS mentor_quizzes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        description TEXT,
-        created_by INTEGER,
-        created_at TEXT,
-        FOREIGN KEY(created_by) REFERENCES users(id)
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS mentor_quiz_questions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        quiz_id INTEGER NOT NULL,
-        question TEXT NOT NULL,
-        option_a TEXT,
-        option_b TEXT,
-        option_c TEXT,
-        option_d TEXT,
-        correct_option TEXT NOT NULL,
-        topic TEXT,
-        difficulty TEXT,
-        FOREIGN KEY(quiz_id) REFERENCES mentor_quizzes(id)
-    )
-    """)
+    # count + insert in one write transaction so concurrent bootstraps
+    # can't both see an empty table and seed it twice
+    db.begin_exclusive()
 
     # Seed questions if empty
     c.execute("SELECT COUNT(*) AS cnt FROM questions")
@@ -228,3 +189,4 @@ def init_db():
         ])
 
     db.commit()
+    return applied
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+
+from db import run_write, submit_write
+
+EXPLAIN_CACHE_TTL_DAYS = float(os.getenv("SMARTPATH_EXPLAIN_CACHE_TTL_DAYS", "30"))
+EXPLAIN_CACHE_MAX_ENTRIES = int(os.getenv("SMARTPATH_EXPLAIN_CACHE_MAX_ENTRIES", "20000"))
+# last_used_at is only rewritten on a hit when older than this, so hot keys
+# don't turn every cached read into a write
+TOUCH_INTERVAL = timedelta(hours=1)
+# the TTL and size sweep runs on one store in this many, so the table can
+# run this far past max_entries between sweeps
+EXPLAIN_CACHE_EVICT_EVERY = int(os.getenv("SMARTPATH_EXPLAIN_CACHE_EVICT_EVERY", "100"))
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache:
+    """Persistent explanation store keyed by a hash of the rendered prompt.
+
+    Rows live in the explanation_cache table. Entries older than the TTL
+    are treated as misses. Every evict_every stores, expired rows are
+    deleted and, if the table has grown past max_entries, the least
+    recently used ones with them; the other stores are a single upsert.
+    """
+
+    def __init__(self, ttl_days=EXPLAIN_CACHE_TTL_DAYS, max_entries=EXPLAIN_CACHE_MAX_ENTRIES,
+                 evict_every=EXPLAIN_CACHE_EVICT_EVERY):
+        self.ttl = timedelta(days=ttl_days)
+        self.max_entries = max_entries
+        self.evict_every = max(evict_every, 1)
+        self._lock = threading.Lock()
+        self._since_evict = 0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "sweeps": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def get(self, db, key):
+        c = db.cursor()
+        c.execute("""
+            SELECT explanation, created_at, last_used_at
+            FROM explanation_cache
+            WHERE key = ?
+        """, (key,))
+        row = c.fetchone()
+        now = datetime.utcnow()
+        if not row or row["created_at"] < (now - self.ttl).isoformat():
+            self._count("misses")
+            return None
+        self._count("hits")
+        if row["last_used_at"] < (now - TOUCH_INTERVAL).isoformat():
+            # nothing waits on the touch, so don't hold the request for it
+            submit_write(_touch, key, now.isoformat())
+        return row["explanation"]
+
+    def put(self, key, explanation):
+        with self._lock:
+            self._since_evict += 1
+            sweep = self._since_evict >= self.evict_every
+            if sweep:
+                self._since_evict = 0
+        evicted = run_write(self._store, key, explanation, sweep)
+        with self._lock:
+            self._stats["stores"] += 1
+            self._stats["sweeps"] += sweep
+            self._stats["evictions"] += evicted
+
+    def _store(self, conn, key, explanation, sweep):
+        now = datetime.utcnow().isoformat()
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO explanation_cache (key, explanation, created_at, last_used_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE
+            SET explanation = excluded.explanation,
+                created_at = excluded.created_at,
+                last_used_at = excluded.last_used_at
+        """, (key, explanation, now, now))
+        return self._evict(c) if sweep else 0
+
+    def _evict(self, c):
+        cutoff = (datetime.utcnow() - self.ttl).isoformat()
+        c.execute("DELETE FROM explanation_cache WHERE created_at < ?", (cutoff,))
+        evicted = c.rowcount
+        c.execute("SELECT COUNT(*) AS n FROM explanation_cache")
+        excess = c.fetchone()["n"] - self.max_entries
+        if excess <= 0:
+            return evicted
+        c.execute("""
+            DELETE FROM explanation_cache
+            WHERE key IN (
+                SELECT key FROM explanation_cache
+                ORDER BY last_used_at
+                LIMIT ?
+            )
+        """, (excess,))
+        return evicted + c.rowcount
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else 0.0
+        return data
+
+
+def _touch(conn, key, used_at):
+    conn.execute("""
+        UPDATE explanation_cache
+        SET last_used_at = ?
+        WHERE key = ?
+    """, (used_at, key))
+
+
+explanation_cache = ExplanationCache()
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from db import run_write, submit_write
+from repositories import (
+    delete_explanation_job, finish_explanation_job, get_explanation_job, insert_explanation_job
+)
+
+EXPLAIN_WORKERS = int(os.getenv("SMARTPATH_EXPLAIN_WORKERS", "4"))
+# a job not finished this long after it was queued is reported as timed out
+EXPLAIN_TIMEOUT = float(os.getenv("SMARTPATH_EXPLAIN_TIMEOUT", "30"))
+# finished jobs are kept this long for the browser to poll them
+JOB_RETENTION = float(os.getenv("SMARTPATH_EXPLAIN_RETENTION", "600"))
+MAX_JOBS = int(os.getenv("SMARTPATH_EXPLAIN_MAX_JOBS", "10000"))
+
+
+class ExplanationJob:
+    def __init__(self, user_id):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = "pending"
+        self.explanation = None
+        # wall clock, since other processes read it back
+        self.queued_at = time.time()
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        job.id = row["id"]
+        job.user_id = row["user_id"]
+        job.status = row["status"]
+        job.explanation = row["explanation"]
+        job.queued_at = row["queued_at"]
+        job.finished_at = row["finished_at"]
+        return job
+
+    def to_dict(self):
+        data = {"job_id": self.id, "status": self.status}
+        if self.explanation is not None:
+            data["explanation"] = self.explanation
+        return data
+
+
+class ExplanationQueue:
+    """Background worker pool producing AI explanations for graded answers.
+
+    The submit handler returns the job id straight away and the browser
+    polls for the result. Jobs run in the process that queued them, which
+    keeps them in memory; each is also stored in explanation_jobs, so a
+    poll that lands on another worker process still finds it.
+
+    A job for a prompt that is already queued or running here joins that
+    one instead of queueing a call of its own, and finishes with its
+    result, so a class submitting the same wrong answer takes one worker
+    and one upstream call.
+    """
+
+    def __init__(self, workers=EXPLAIN_WORKERS, timeout=EXPLAIN_TIMEOUT):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="explain")
+        self._jobs = {}
+        # (fn, prompt) -> jobs waiting on the one call queued for it
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "queued": 0,
+            "running": 0,
+            "coalesced": 0,
+        }
+
+    def submit(self, user_id, fn, prompt, on_new=None):
+        """Queue fn(prompt) for user_id; returns (job id, None).
+
+        A job that would start a call of its own, rather than join one,
+        first asks on_new(). That runs under the queue lock, so no other
+        job for the prompt can start or miss a call meanwhile. If it
+        returns anything but None, no job is queued and the result is
+        (None, what it returned).
+        """
+        job = ExplanationJob(user_id)
+        run_write(insert_explanation_job, job.id, user_id, job.queued_at,
+                  job.queued_at - self.timeout - JOB_RETENTION)
+        flight = (fn, prompt)
+        with self._lock:
+            self._prune()
+            if flight in self._flights:
+                self._flights[flight].append(job)
+                self._jobs[job.id] = job
+                self._stats["submitted"] += 1
+                self._stats["coalesced"] += 1
+                return job.id, None
+            refusal = on_new() if on_new is not None else None
+            if refusal is None:
+                self._flights[flight] = [job]
+                self._jobs[job.id] = job
+                self._stats["submitted"] += 1
+                self._stats["queued"] += 1
+        if refusal is not None:
+            submit_write(delete_explanation_job, job.id)
+            return None, refusal
+        self._executor.submit(self._run, fn, prompt)
+        return job.id, None
+
+    def get(self, db, job_id, user_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                if job.user_id != user_id:
+                    return None
+                if job.status == "pending" and time.time() - job.queued_at > self.timeout:
+                    self._finish(job, "timeout", None)
+                return job.to_dict()
+
+        # queued by another worker process
+        row = get_explanation_job(db, job_id)
+        if row is None or row["user_id"] != user_id:
+            return None
+        job = ExplanationJob.from_row(row)
+        if job.status == "pending" and time.time() - job.queued_at > self.timeout:
+            # its own process records the timeout when it next looks
+            job.status = "timeout"
+        return job.to_dict()
+
+    def _run(self, fn, prompt):
+        flight = (fn, prompt)
+        with self._lock:
+            self._stats["queued"] -= 1
+            jobs = self._flights[flight]
+            now = time.time()
+            for job in jobs:
+                if job.status == "pending" and now - job.queued_at > self.timeout:
+                    self._finish(job, "timeout", None)
+            if not any(job.status == "pending" for job in jobs):
+                # they all sat in the queue too long; don't spend an upstream call
+                del self._flights[flight]
+                return
+            self._stats["running"] += 1
+        try:
+            text = fn(prompt)
+            status = "done"
+        except Exception as e:
+            print("Explanation job error:", e)
+            text = "Error contacting AI service."
+            status = "error"
+        with self._lock:
+            self._stats["running"] -= 1
+            # jobs that joined while it ran get the same answer
+            for job in self._flights.pop(flight):
+                if job.status == "pending":
+                    self._finish(job, status, text)
+
+    def _finish(self, job, status, text):
+        # caller holds self._lock
+        job.status = status
+        job.explanation = text
+        job.finished_at = time.time()
+        key = {"done": "completed", "error": "errors", "timeout": "timeouts"}[status]
+        self._stats[key] += 1
+        self._latencies.append(job.finished_at - job.queued_at)
+        submit_write(finish_explanation_job, job.id, status, text, job.finished_at)
+
+    def _prune(self):
+        # caller holds self._lock; the database rows are pruned by submit()
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > JOB_RETENTION
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        while len(self._jobs) >= MAX_JOBS:
+            self._jobs.pop(next(iter(self._jobs)))
+
+    def close(self):
+        """Finish every queued job and stop the workers."""
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["tracked_jobs"] = len(self._jobs)
+            latencies = sorted(self._latencies)
+        data["queue_depth"] = data.pop("queued")
+        if latencies:
+            data["latency_p50_seconds"] = round(latencies[len(latencies) // 2], 4)
+            data["latency_p95_seconds"] = round(latencies[int(len(latencies) * 0.95)], 4)
+            data["latency_max_seconds"] = round(latencies[-1], 4)
+        return data
+
+
+explanation_queue = ExplanationQueue()
@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+
+USER_CACHE_TTL = float(os.getenv("SMARTPATH_USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("SMARTPATH_USER_CACHE_SIZE", "4096"))
+
+
+class IdentityCache:
+    """Small in-process TTL cache of users rows keyed by user id.
+
+    Sits behind the per-request copy on flask.g, so a hit here saves the
+    one users query a request would otherwise make. ttl <= 0 disables it.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {"db_lookups": 0, "cache_hits": 0, "request_hits": 0}
+
+    def get(self, user_id):
+        if self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, row = entry
+            if expires_at < now:
+                del self._entries[user_id]
+                return None
+            self._stats["cache_hits"] += 1
+            return row
+
+    def put(self, user_id, row):
+        if self.ttl <= 0 or row is None:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                # dicts keep insertion order, so this drops the oldest entry
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (time.monotonic() + self.ttl, row)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = len(self._entries)
+            data["ttl_seconds"] = self.ttl
+        return data
+
+
+user_cache = IdentityCache()
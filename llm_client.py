@@ -0,0 +1,560 @@
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# longest we'll sleep between attempts, whatever Retry-After asks for
+MAX_RETRY_DELAY = 5.0
+# connections per httpx.AsyncClient in AsyncGeminiClient; httpx's pool does
+# work quadratic in its connections on every request, so many small pools
+# beat one big one
+ASYNC_POOL_SIZE = 16
+
+
+class LLMError(Exception):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class UpstreamRejected(LLMError):
+    """Gemini answered with a 4xx it won't take back on retry (bad prompt,
+    bad key); the upstream is up, so this doesn't count toward the breaker."""
+
+
+class LatencyHistogram:
+    """Cumulative latency buckets in seconds, Prometheus style."""
+
+    BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._sum += seconds
+            for i, upper in enumerate(self.buckets):
+                if seconds <= upper:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for upper, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative.append((upper, running))
+        return {"buckets": cumulative, "count": running, "sum": total}
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after
+    reset_timeout and closes again if it succeeds."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_running = False
+
+    def release_trial(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class Flight:
+    """One upstream call that callers asking for the same prompt share."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.text = None
+        self.error = None
+
+    def result(self):
+        if self.error is not None:
+            raise _shared_error(self.error) from self.error
+        return self.text
+
+
+def _shared_error(error):
+    # each caller that shared a failed call gets its own exception, of the
+    # same kind, rather than all raising the leader's one object
+    if isinstance(error, LLMError):
+        return type(error)(*error.args)
+    return LLMError(f"shared Gemini call failed: {error!r}")
+
+
+class GeminiClient:
+    """Shared, pooled HTTP client for the Gemini generateContent API.
+
+    One requests.Session keeps connections alive across calls. Concurrency
+    is bounded by a semaphore, retryable failures (429/5xx, connection
+    errors) are retried with jittered exponential backoff, and a circuit
+    breaker fails calls fast while the upstream keeps failing. All the
+    attempts of a call share one timeout budget, and a read timeout isn't
+    retried, so a stalled upstream holds a caller for timeout seconds.
+
+    Identical prompts asked for while one is in flight are coalesced: the
+    later callers wait for that call and get its text or its error, so a
+    class submitting the same wrong answer costs one upstream call. They
+    stop waiting after the longest the call could take (call_deadline).
+    Nothing is kept once the call returns; caching is the caller's job.
+    """
+
+    def __init__(self, url, api_key, stream_url=None, timeout=20.0, connect_timeout=5.0,
+                 max_concurrency=8, acquire_timeout=5.0, max_retries=2,
+                 backoff=0.5, failure_threshold=5, reset_timeout=30.0, coalesce=True):
+        self.url = url
+        self.stream_url = stream_url or _stream_url(url)
+        self.api_key = api_key
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.coalesce = coalesce
+        # a slot, then the one budget all attempts share, and a little grace
+        self.call_deadline = acquire_timeout + timeout + 1.0
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyHistogram()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        # prompt -> Flight of the call in progress for it
+        self._flights = {}
+        self._stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "short_circuited": 0,
+            "saturated": 0,
+            "streams": 0,
+            "coalesced": 0,
+            "coalesce_timeouts": 0,
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _failed(self, error):
+        if isinstance(error, UpstreamRejected):
+            # frees a half-open trial without reopening the circuit
+            self.breaker.release_trial()
+        else:
+            self.breaker.record_failure()
+        self._count("failures")
+
+    def generate(self, prompt):
+        """Return the model's text for prompt, or raise LLMError."""
+        self._count("calls")
+        if not self.coalesce:
+            return self._generate(prompt)
+        with self._lock:
+            flight = self._flights.get(prompt)
+            leader = flight is None
+            if leader:
+                flight = self._flights[prompt] = Flight()
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            if not flight.done.wait(self.call_deadline):
+                self._count("coalesce_timeouts")
+                raise LLMError("timed out waiting for an identical Gemini call")
+            return flight.result()
+        try:
+            flight.text = self._generate(prompt)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # later callers start a call of their own
+            with self._lock:
+                del self._flights[prompt]
+            flight.done.set()
+        return flight.text
+
+    def _generate(self, prompt):
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("Gemini circuit is open")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            # not the upstream's fault, so don't count it against the breaker
+            self.breaker.release_trial()
+            self._count("saturated")
+            raise LLMError("too many concurrent Gemini calls")
+        start = time.perf_counter()
+        try:
+            data = self._post_with_retries(
+                self.url,
+                {"contents": [{"parts": [{"text": prompt}]}]},
+            )
+            text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+        except Exception as e:
+            self._failed(e)
+            if isinstance(e, LLMError):
+                raise
+            raise LLMError(f"unexpected Gemini response: {e!r}") from e
+        finally:
+            self._slots.release()
+            self.latency.observe(time.perf_counter() - start)
+        self.breaker.record_success()
+        self._count("successes")
+        return text
+
+    def stream(self, prompt):
+        """Yield the model's text in chunks as streamGenerateContent sends them.
+
+        Retries only happen before the first byte; once text has been
+        yielded a failure is raised to the consumer as LLMError.
+        """
+        self._count("calls")
+        self._count("streams")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("Gemini circuit is open")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self.breaker.release_trial()
+            self._count("saturated")
+            raise LLMError("too many concurrent Gemini calls")
+        start = time.perf_counter()
+        failed = False
+        try:
+            resp = self._post_with_retries(
+                self.stream_url,
+                {"contents": [{"parts": [{"text": prompt}]}]},
+                stream=True,
+            )
+            with resp:
+                for line in resp.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[len("data:"):])
+                    for part in chunk["candidates"][0]["content"].get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            failed = True
+            self._failed(e)
+            if isinstance(e, LLMError):
+                raise
+            raise LLMError(f"Gemini stream failed: {e!r}") from e
+        finally:
+            self._slots.release()
+            self.latency.observe(time.perf_counter() - start)
+            if not failed:
+                self.breaker.record_success()
+                self._count("successes")
+
+    def _post_with_retries(self, url, payload, stream=False):
+        headers = {
+            "Content-Type": "application/json",
+            "X-goog-api-key": self.api_key
+        }
+        # one budget for every attempt and the sleeps between them, so a
+        # slow upstream holds the caller for timeout seconds in all
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            delay = None
+            remaining = max(deadline - time.monotonic(), 0.001)
+            try:
+                resp = self._session.post(
+                    url, headers=headers, json=payload, stream=stream,
+                    timeout=(min(self.connect_timeout, remaining), remaining),
+                )
+            except requests.ReadTimeout as e:
+                # it took the request and stalled; another attempt would too
+                raise LLMError(f"Gemini request timed out: {e}") from e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = LLMError(f"Gemini request failed: {e}")
+                error.__cause__ = e
+            else:
+                if resp.status_code < 400:
+                    return resp if stream else resp.json()
+                resp.close()
+                if resp.status_code not in RETRY_STATUSES:
+                    raise UpstreamRejected(f"Gemini returned HTTP {resp.status_code}")
+                error = LLMError(f"Gemini returned HTTP {resp.status_code}")
+                delay = _retry_after(resp)
+            attempt += 1
+            if delay is None:
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+            delay = min(delay, MAX_RETRY_DELAY)
+            if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                raise error
+            self._count("retries")
+            time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["in_flight"] = len(self._flights)
+        data["circuit_state"] = self.breaker.state
+        data["latency_seconds"] = self.latency.snapshot()
+        return data
+
+
+class AsyncGeminiClient:
+    """Coroutine counterpart of GeminiClient for the ASGI serving mode.
+
+    Calls go through httpx.AsyncClients on the serving event loop with
+    the sync client's timeouts, retry and backoff settings, and share its
+    circuit breaker, latency histogram and counters, so /health and
+    /metrics report both together. A call waiting on Gemini holds a
+    coroutine rather than a thread, so max_concurrency can sit far above
+    the sync client's. Identical prompts are coalesced as in the sync
+    client, among the coroutines on this loop.
+    """
+
+    def __init__(self, client, max_concurrency=64):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._pools = []
+        self._next_pool = None
+        self._slots = None
+        # prompt -> Task of the call in progress for it
+        self._flights = {}
+
+    async def start(self):
+        """Open the HTTP clients on the running loop; idempotent."""
+        import httpx
+
+        if not self._pools:
+            count = -(-self.max_concurrency // ASYNC_POOL_SIZE)
+            # one TLS context for all of them; building one takes milliseconds
+            tls = httpx.create_ssl_context()
+            self._pools = [
+                httpx.AsyncClient(
+                    verify=tls,
+                    timeout=httpx.Timeout(self.client.timeout, connect=self.client.connect_timeout),
+                    limits=httpx.Limits(
+                        max_connections=ASYNC_POOL_SIZE,
+                        max_keepalive_connections=ASYNC_POOL_SIZE,
+                    ),
+                )
+                for _ in range(count)
+            ]
+            self._next_pool = itertools.cycle(self._pools)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        pools, self._pools = self._pools, []
+        for http in pools:
+            await http.aclose()
+
+    async def _acquire(self):
+        client = self.client
+        if not client.breaker.allow():
+            client._count("short_circuited")
+            raise CircuitOpenError("Gemini circuit is open")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), client.acquire_timeout)
+        except asyncio.TimeoutError:
+            client.breaker.release_trial()
+            client._count("saturated")
+            raise LLMError("too many concurrent Gemini calls") from None
+
+    async def generate(self, prompt):
+        """Return the model's text for prompt, or raise LLMError."""
+        client = self.client
+        await self.start()
+        client._count("calls")
+        if not client.coalesce:
+            return await self._generate(prompt)
+        task = self._flights.get(prompt)
+        if task is None:
+            # a task of its own, so the caller that started it going away
+            # doesn't cancel it for the others
+            task = self._flights[prompt] = asyncio.ensure_future(self._generate(prompt))
+            task.add_done_callback(lambda task: self._landed(prompt, task))
+        else:
+            client._count("coalesced")
+        done, _ = await asyncio.wait({task}, timeout=client.call_deadline)
+        if not done:
+            client._count("coalesce_timeouts")
+            raise LLMError("timed out waiting for an identical Gemini call")
+        error = task.exception()
+        if error is not None:
+            raise _shared_error(error) from error
+        return task.result()
+
+    def _landed(self, prompt, task):
+        if self._flights.get(prompt) is task:
+            del self._flights[prompt]
+        if not task.cancelled():
+            # marks the error seen even if every caller stopped waiting
+            task.exception()
+
+    async def _generate(self, prompt):
+        client = self.client
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            data = await self._post_with_retries(
+                client.url,
+                {"contents": [{"parts": [{"text": prompt}]}]},
+            )
+            text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+        except Exception as e:
+            client._failed(e)
+            if isinstance(e, LLMError):
+                raise
+            raise LLMError(f"unexpected Gemini response: {e!r}") from e
+        finally:
+            self._slots.release()
+            client.latency.observe(time.perf_counter() - start)
+        client.breaker.record_success()
+        client._count("successes")
+        return text
+
+    async def stream(self, prompt):
+        """Async-iterate the model's text in chunks; same failure rules as
+        GeminiClient.stream."""
+        client = self.client
+        await self.start()
+        client._count("calls")
+        client._count("streams")
+        await self._acquire()
+        start = time.perf_counter()
+        failed = False
+        try:
+            resp = await self._post_with_retries(
+                client.stream_url,
+                {"contents": [{"parts": [{"text": prompt}]}]},
+                stream=True,
+            )
+            try:
+                async for line in resp.aiter_lines():
+                    if not line or not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[len("data:"):])
+                    for part in chunk["candidates"][0]["content"].get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+            finally:
+                await resp.aclose()
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            failed = True
+            client._failed(e)
+            if isinstance(e, LLMError):
+                raise
+            raise LLMError(f"Gemini stream failed: {e!r}") from e
+        finally:
+            self._slots.release()
+            client.latency.observe(time.perf_counter() - start)
+            if not failed:
+                client.breaker.record_success()
+                client._count("successes")
+
+    async def _post_with_retries(self, url, payload, stream=False):
+        import httpx
+
+        client = self.client
+        headers = {
+            "Content-Type": "application/json",
+            "X-goog-api-key": client.api_key
+        }
+        # the same single budget as GeminiClient._post_with_retries
+        deadline = time.monotonic() + client.timeout
+        attempt = 0
+        while True:
+            delay = None
+            remaining = max(deadline - time.monotonic(), 0.001)
+            try:
+                http = next(self._next_pool)
+                request = http.build_request(
+                    "POST", url, headers=headers, json=payload,
+                    timeout=httpx.Timeout(remaining, connect=min(client.connect_timeout, remaining)),
+                )
+                resp = await http.send(request, stream=stream)
+            except httpx.ReadTimeout as e:
+                raise LLMError(f"Gemini request timed out: {e!r}") from e
+            except httpx.TransportError as e:
+                error = LLMError(f"Gemini request failed: {e!r}")
+                error.__cause__ = e
+            else:
+                if resp.status_code < 400:
+                    return resp if stream else resp.json()
+                await resp.aclose()
+                if resp.status_code not in RETRY_STATUSES:
+                    raise UpstreamRejected(f"Gemini returned HTTP {resp.status_code}")
+                error = LLMError(f"Gemini returned HTTP {resp.status_code}")
+                delay = _retry_after(resp)
+            attempt += 1
+            if delay is None:
+                delay = random.uniform(0, client.backoff * (2 ** attempt))
+            delay = min(delay, MAX_RETRY_DELAY)
+            if attempt > client.max_retries or time.monotonic() + delay >= deadline:
+                raise error
+            client._count("retries")
+            await asyncio.sleep(delay)
+
+
+def _stream_url(url):
+    base = url.split("?", 1)[0]
+    if base.endswith(":generateContent"):
+        base = base[:-len(":generateContent")] + ":streamGenerateContent"
+    return base + "?alt=sse"
+
+
+def _retry_after(resp):
+    value = resp.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+from llm_client import LatencyHistogram
+
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteMetrics:
+    """Per-endpoint request counters, latency histograms and the SQLite and
+    Gemini time spent inside each request.
+
+    The per-request tallies live on flask.g; after_request folds them into
+    the totals under one lock, so recording costs a few dict updates.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._latency = {}
+        self._totals = {}
+
+    def new_tally(self):
+        return {
+            "started": time.perf_counter(),
+            "sql_statements": 0,
+            "sql_seconds": 0.0,
+            "gemini_calls": 0,
+            "gemini_seconds": 0.0,
+        }
+
+    def start_request(self):
+        g.metrics = self.new_tally()
+
+    def finish_request(self, response):
+        tally = g.pop("metrics", None)
+        if tally is None:
+            return response
+        elapsed = time.perf_counter() - tally.pop("started")
+        # unmatched URLs share one label so random paths can't blow up cardinality
+        endpoint = request.endpoint or "unmatched"
+        self.record(endpoint, request.method, response.status_code, elapsed, tally)
+        return response
+
+    def record(self, endpoint, method, status, elapsed, tally):
+        """Fold one finished request into the totals."""
+        key = (endpoint, method, str(status))
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            totals = self._totals.setdefault(endpoint, dict.fromkeys(tally, 0))
+            for name, value in tally.items():
+                totals[name] += value
+            histogram = self._latency.get(endpoint)
+            if histogram is None:
+                histogram = self._latency[endpoint] = LatencyHistogram(REQUEST_BUCKETS)
+        histogram.observe(elapsed)
+
+    def add(self, endpoint, **values):
+        """Add to an endpoint's totals outside a tally, for work a streamed
+        response does after finish_request has folded its tally in."""
+        with self._lock:
+            totals = self._totals.get(endpoint)
+            if totals is None:
+                fields = [name for name in self.new_tally() if name != "started"]
+                totals = self._totals[endpoint] = dict.fromkeys(fields, 0)
+            for name, value in values.items():
+                totals[name] += value
+
+    def render(self, values=(), histograms=()):
+        """The metrics in Prometheus text exposition format.
+
+        values is an iterable of (name, labels, value) and histograms of
+        (name, LatencyHistogram snapshot) for process-wide numbers reported
+        by other components.
+
+        Every series carries a pid label. Under server.py each worker
+        process keeps and reports its own numbers, so a scrape sees
+        whichever worker answered; the label keeps their series apart,
+        and sum without (pid) gives the server's totals.
+        """
+        pid = f'pid="{os.getpid()}"'
+        with self._lock:
+            requests = dict(self._requests)
+            totals = {endpoint: dict(t) for endpoint, t in self._totals.items()}
+            latency = dict(self._latency)
+
+        lines = [
+            "# HELP smartpath_http_requests_total Requests by endpoint, method and status.",
+            "# TYPE smartpath_http_requests_total counter",
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(
+                f'smartpath_http_requests_total{{{pid},endpoint="{endpoint}",method="{method}",'
+                f'status="{status}"}} {count}'
+            )
+
+        lines += [
+            "# HELP smartpath_http_request_duration_seconds Request latency by endpoint.",
+            "# TYPE smartpath_http_request_duration_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(latency.items()):
+            lines += _histogram_lines(
+                "smartpath_http_request_duration_seconds", f'{pid},endpoint="{endpoint}"',
+                histogram.snapshot()
+            )
+
+        for name, help_text in (
+            ("sql_statements", "SQL statements executed while serving requests."),
+            ("sql_seconds", "Seconds spent executing statements, fetching rows and committing "
+                            "while serving requests."),
+            ("gemini_calls", "Gemini calls made while serving requests."),
+            ("gemini_seconds", "Seconds spent in Gemini calls while serving requests."),
+        ):
+            metric = f"smartpath_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for endpoint, t in sorted(totals.items()):
+                value = t[name]
+                value = f"{value:.6f}" if isinstance(value, float) else value
+                lines.append(f'{metric}{{{pid},endpoint="{endpoint}"}} {value}')
+
+        # component stats mix counters and gauges, so they go out untyped
+        seen = set()
+        for name, labels, value in values:
+            metric = f"smartpath_{name}"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} untyped")
+                seen.add(metric)
+            label_text = "".join(f',{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{metric}{{{pid}{label_text}}} {value}")
+
+        for name, snap in histograms:
+            metric = f"smartpath_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            lines += _histogram_lines(metric, pid, snap)
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(metric, labels, snap):
+    sep = "," if labels else ""
+    lines = []
+    for upper, count in snap["buckets"]:
+        le = "+Inf" if upper == float("inf") else repr(upper)
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{le}"}} {count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {snap['sum']:.6f}")
+    lines.append(f"{metric}_count{suffix} {snap['count']}")
+    return lines
+
+
+def observe_sql(seconds, statements=1):
+    """Charge database time to the current request, if there is one."""
+    if has_request_context() and "metrics" in g:
+        g.metrics["sql_statements"] += statements
+        g.metrics["sql_seconds"] += seconds
+
+
+def observe_gemini(seconds):
+    """Charge a Gemini call to the current request, if there is one.
+
+    A call made while a streamed response is sent comes after the
+    request's tally was recorded, so it goes straight to the totals.
+    """
+    if not has_request_context():
+        return
+    if "metrics" in g:
+        g.metrics["gemini_calls"] += 1
+        g.metrics["gemini_seconds"] += seconds
+    else:
+        route_metrics.add(request.endpoint or "unmatched", gemini_calls=1, gemini_seconds=seconds)
+
+
+def flatten_stats(component, stats):
+    """(name, labels, value) for the numeric leaves of a stats dict."""
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        yield f"{component}_{key}", {}, value
+
+
+route_metrics = RouteMetrics()
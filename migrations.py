@@ -0,0 +1,838 @@
+from datetime import datetime
+
+# Each migration is (version, name, [statements]). Versions only ever grow;
+# to change the schema append a new entry rather than editing an old one.
+
+# (catalog_cache name, table its catalog is built from), for migration 7
+_CATALOG_TABLES = [
+    ("lessons", "lessons"),
+    ("manual_quizzes", "mentor_quizzes"),
+    ("manual_quizzes", "mentor_quiz_questions"),
+    ("assignments", "assignments"),
+]
+
+# user_topic_stats rows from raw attempts, for migration 9; attempts on a
+# deleted question count under topic ''
+_TOPIC_STATS_FROM_ATTEMPTS = """
+    SELECT qa.user_id,
+           COALESCE(q.topic, ''),
+           SUM(CASE WHEN qa.is_correct = 1 THEN 1 ELSE 0 END),
+           COUNT(*)
+    FROM quiz_attempts qa
+    LEFT JOIN questions q ON q.id = qa.question_id
+    WHERE qa.source = 'bank'
+    GROUP BY qa.user_id, COALESCE(q.topic, '')
+"""
+
+
+def _move_topic_stats(question_id, from_topic, to_topic):
+    """Statements moving one question's bank attempts between topics in
+    user_topic_stats, for the migration 9 question triggers."""
+    attempts = f"quiz_attempts WHERE question_id = {question_id} AND source = 'bank'"
+    return f"""
+            INSERT INTO user_topic_stats (user_id, topic, correct, total)
+            SELECT user_id, {to_topic}, SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END), COUNT(*)
+            FROM {attempts}
+            GROUP BY user_id
+            ON CONFLICT (user_id, topic) DO UPDATE
+            SET correct = user_topic_stats.correct + excluded.correct,
+                total = user_topic_stats.total + excluded.total;
+            UPDATE user_topic_stats
+            SET correct = correct - (
+                    SELECT COALESCE(SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END), 0)
+                    FROM {attempts} AND user_id = user_topic_stats.user_id),
+                total = total - (
+                    SELECT COUNT(*) FROM {attempts} AND user_id = user_topic_stats.user_id)
+            WHERE topic = {from_topic} AND user_id IN (SELECT user_id FROM {attempts});
+            DELETE FROM user_topic_stats
+            WHERE topic = {from_topic} AND total <= 0
+              AND user_id IN (SELECT user_id FROM {attempts});"""
+
+
+MIGRATIONS = [
+    (1, "initial schema", [
+        # USERS
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('student','mentor'))
+        )
+        """,
+        # QUESTIONS (smart/bank questions)
+        """
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            question TEXT NOT NULL,
+            option_a TEXT,
+            option_b TEXT,
+            option_c TEXT,
+            option_d TEXT,
+            correct_option TEXT NOT NULL
+        )
+        """,
+        # QUIZ ATTEMPTS (track source: bank/manual)
+        """
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            is_correct INTEGER NOT NULL,
+            source TEXT NOT NULL DEFAULT 'bank',
+            created_at TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        # ASSIGNMENTS
+        """
+        CREATE TABLE IF NOT EXISTS assignments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            due_date TEXT
+        )
+        """,
+        # ASSIGNMENT SUBMISSIONS
+        """
+        CREATE TABLE IF NOT EXISTS assignment_submissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            assignment_id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            content TEXT,
+            submitted_at TEXT,
+            feedback TEXT,
+            rating INTEGER,
+            FOREIGN KEY(assignment_id) REFERENCES assignments(id),
+            FOREIGN KEY(student_id) REFERENCES users(id)
+        )
+        """,
+        # MENTOR MESSAGES
+        """
+        CREATE TABLE IF NOT EXISTS mentor_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            mentor_id INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            answer_text TEXT,
+            created_at TEXT NOT NULL,
+            answered_at TEXT,
+            FOREIGN KEY(student_id) REFERENCES users(id),
+            FOREIGN KEY(mentor_id) REFERENCES users(id)
+        )
+        """,
+        # LESSONS / CLASSES (video-based)
+        """
+        CREATE TABLE IF NOT EXISTS lessons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            video_url TEXT,
+            topic TEXT,
+            created_by INTEGER,
+            created_at TEXT,
+            FOREIGN KEY(created_by) REFERENCES users(id)
+        )
+        """,
+        # MANUAL QUIZZES (mentor-created)
+        """
+        CREATE TABLE IF NOT EXISTS mentor_quizzes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            created_by INTEGER,
+            created_at TEXT,
+            FOREIGN KEY(created_by) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS mentor_quiz_questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            option_a TEXT,
+            option_b TEXT,
+            option_c TEXT,
+            option_d TEXT,
+            correct_option TEXT NOT NULL,
+            topic TEXT,
+            difficulty TEXT,
+            FOREIGN KEY(quiz_id) REFERENCES mentor_quizzes(id)
+        )
+        """,
+    ]),
+    (2, "indexes for hot lookups", [
+        # progress/analytics: covers the filter and both aggregated columns
+        """
+        CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_source
+        ON quiz_attempts(user_id, source, question_id, is_correct)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_quiz_attempts_question
+        ON quiz_attempts(question_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_assignment_submissions_assignment_student
+        ON assignment_submissions(assignment_id, student_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_mentor_messages_created
+        ON mentor_messages(created_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_lessons_created_by
+        ON lessons(created_by, created_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_lessons_created
+        ON lessons(created_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_mentor_quizzes_created_by
+        ON mentor_quizzes(created_by, created_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_mentor_quiz_questions_quiz
+        ON mentor_quiz_questions(quiz_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_users_role
+        ON users(role, id)
+        """,
+    ]),
+    (3, "explanation cache", [
+        """
+        CREATE TABLE IF NOT EXISTS explanation_cache (
+            key TEXT PRIMARY KEY,
+            explanation TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            last_used_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_explanation_cache_last_used
+        ON explanation_cache(last_used_at)
+        """,
+    ]),
+    (4, "question bank version", [
+        # bumped by triggers on every bank edit so in-process indexes of the
+        # questions table can tell they're stale with a single-row read
+        """
+        CREATE TABLE IF NOT EXISTS question_bank_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO question_bank_version (id, version) VALUES (1, 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_questions_insert_version
+        AFTER INSERT ON questions
+        BEGIN
+            UPDATE question_bank_version SET version = version + 1 WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_questions_update_version
+        AFTER UPDATE ON questions
+        BEGIN
+            UPDATE question_bank_version SET version = version + 1 WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_questions_delete_version
+        AFTER DELETE ON questions
+        BEGIN
+            UPDATE question_bank_version SET version = version + 1 WHERE id = 1;
+        END
+        """,
+    ]),
+    (5, "user topic stats projection", [
+        # per-user, per-topic totals of bank attempts; kept in step with
+        # quiz_attempts by the trigger below, inside the inserting transaction
+        """
+        CREATE TABLE IF NOT EXISTS user_topic_stats (
+            user_id INTEGER NOT NULL,
+            topic TEXT NOT NULL,
+            correct INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, topic)
+        )
+        """,
+        """
+        INSERT OR REPLACE INTO user_topic_stats (user_id, topic, correct, total)
+        SELECT qa.user_id,
+               q.topic,
+               SUM(CASE WHEN qa.is_correct = 1 THEN 1 ELSE 0 END),
+               COUNT(*)
+        FROM quiz_attempts qa
+        JOIN questions q ON q.id = qa.question_id
+        WHERE qa.source = 'bank'
+        GROUP BY qa.user_id, q.topic
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_quiz_attempts_topic_stats
+        AFTER INSERT ON quiz_attempts
+        WHEN NEW.source = 'bank'
+        BEGIN
+            INSERT INTO user_topic_stats (user_id, topic, correct, total)
+            SELECT NEW.user_id, q.topic, CASE WHEN NEW.is_correct = 1 THEN 1 ELSE 0 END, 1
+            FROM questions q
+            WHERE q.id = NEW.question_id
+            ON CONFLICT (user_id, topic) DO UPDATE
+            SET correct = correct + excluded.correct,
+                total = total + 1;
+        END
+        """,
+    ]),
+    (6, "mentor inbox pagination and counts", [
+        # keyset pages on (created_at, id), per mentor and for unanswered only
+        """
+        CREATE INDEX IF NOT EXISTS idx_mentor_messages_mentor_created
+        ON mentor_messages(mentor_id, created_at, id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_mentor_messages_unanswered
+        ON mentor_messages(created_at, id)
+        WHERE answered_at IS NULL
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_mentor_messages_mentor_unanswered
+        ON mentor_messages(mentor_id, created_at, id)
+        WHERE answered_at IS NULL
+        """,
+        # unanswered messages per mentor, kept by triggers for the inbox badge
+        """
+        CREATE TABLE IF NOT EXISTS mentor_inbox_counts (
+            mentor_id INTEGER PRIMARY KEY,
+            unanswered INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT OR REPLACE INTO mentor_inbox_counts (mentor_id, unanswered)
+        SELECT mentor_id, SUM(CASE WHEN answered_at IS NULL THEN 1 ELSE 0 END)
+        FROM mentor_messages
+        GROUP BY mentor_id
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_mentor_messages_insert_count
+        AFTER INSERT ON mentor_messages
+        WHEN NEW.answered_at IS NULL
+        BEGIN
+            INSERT INTO mentor_inbox_counts (mentor_id, unanswered)
+            VALUES (NEW.mentor_id, 1)
+            ON CONFLICT (mentor_id) DO UPDATE SET unanswered = unanswered + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_mentor_messages_answer_count
+        AFTER UPDATE OF answered_at ON mentor_messages
+        WHEN OLD.answered_at IS NULL AND NEW.answered_at IS NOT NULL
+        BEGIN
+            UPDATE mentor_inbox_counts SET unanswered = unanswered - 1
+            WHERE mentor_id = NEW.mentor_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_mentor_messages_delete_count
+        AFTER DELETE ON mentor_messages
+        WHEN OLD.answered_at IS NULL
+        BEGIN
+            UPDATE mentor_inbox_counts SET unanswered = unanswered - 1
+            WHERE mentor_id = OLD.mentor_id;
+        END
+        """,
+    ]),
+    (7, "state shared by worker processes", [
+        # quiz sessions live here rather than in one process's memory, so
+        # any worker can grade a quiz another drew, including workers
+        # started by a reload after it was drawn
+        """
+        CREATE TABLE IF NOT EXISTS quiz_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            question_ids TEXT NOT NULL,
+            answer_key TEXT NOT NULL,
+            version INTEGER,
+            created_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_quiz_sessions_created
+        ON quiz_sessions(created_at)
+        """,
+        # the primary key is what stops a question being graded twice
+        """
+        CREATE TABLE IF NOT EXISTS quiz_session_answers (
+            session_id TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            selected_option TEXT,
+            PRIMARY KEY (session_id, question_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS explanation_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            explanation TEXT,
+            queued_at REAL NOT NULL,
+            finished_at REAL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_explanation_jobs_queued
+        ON explanation_jobs(queued_at)
+        """,
+        # bumped by triggers whenever a cached catalog's tables change, so
+        # each worker's catalog_cache sees edits made through the others
+        """
+        CREATE TABLE IF NOT EXISTS catalog_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO catalog_generations (name, generation)
+        VALUES ('lessons', 0), ('manual_quizzes', 0), ('assignments', 0)
+        """,
+        *[
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_catalog
+            AFTER {op} ON {table}
+            BEGIN
+                UPDATE catalog_generations SET generation = generation + 1
+                WHERE name = '{name}';
+            END
+            """
+            for name, table in _CATALOG_TABLES
+            for op in ("INSERT", "UPDATE", "DELETE")
+        ],
+    ]),
+    (8, "AI rate limit buckets", [
+        # token buckets shared by every worker; see rate_limit.py
+        """
+        CREATE TABLE IF NOT EXISTS rate_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+    ]),
+    (9, "topic stats follow question edits", [
+        # attempts whose question is gone count under topic '' rather than
+        # dropping out of the totals, as the cohort query did before the
+        # projection; the question triggers move counts between topics
+        "DROP TRIGGER IF EXISTS trg_quiz_attempts_topic_stats",
+        "DELETE FROM user_topic_stats",
+        "INSERT INTO user_topic_stats (user_id, topic, correct, total)" + _TOPIC_STATS_FROM_ATTEMPTS,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_quiz_attempts_topic_stats
+        AFTER INSERT ON quiz_attempts
+        WHEN NEW.source = 'bank'
+        BEGIN
+            INSERT INTO user_topic_stats (user_id, topic, correct, total)
+            VALUES (NEW.user_id,
+                    COALESCE((SELECT topic FROM questions WHERE id = NEW.question_id), ''),
+                    CASE WHEN NEW.is_correct = 1 THEN 1 ELSE 0 END, 1)
+            ON CONFLICT (user_id, topic) DO UPDATE
+            SET correct = correct + excluded.correct,
+                total = total + 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_questions_topic_stats_update
+        AFTER UPDATE OF topic ON questions
+        WHEN OLD.topic IS NOT NEW.topic
+        BEGIN
+        {_move_topic_stats("OLD.id", "OLD.topic", "NEW.topic")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_questions_topic_stats_delete
+        AFTER DELETE ON questions
+        BEGIN
+        {_move_topic_stats("OLD.id", "OLD.topic", "''")}
+        END
+        """,
+        # a question restored under its old id takes back its attempts
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_questions_topic_stats_insert
+        AFTER INSERT ON questions
+        WHEN EXISTS (SELECT 1 FROM quiz_attempts WHERE question_id = NEW.id AND source = 'bank')
+        BEGIN
+        {_move_topic_stats("NEW.id", "''", "NEW.topic")}
+        END
+        """,
+    ]),
+]
+
+
+# The same versions for the Postgres backend. Statements differ only where
+# the dialects do: SERIAL ids, ON CONFLICT for upserts and plpgsql trigger
+# functions. Keep both lists in step when adding a migration.
+POSTGRES_MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('student','mentor'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS questions (
+            id SERIAL PRIMARY KEY,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            question TEXT NOT NULL,
+            option_a TEXT,
+            option_b TEXT,
+            option_c TEXT,
+            option_d TEXT,
+            correct_option TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id BIGSERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            question_id INTEGER NOT NULL,
+            is_correct INTEGER NOT NULL,
+            source TEXT NOT NULL DEFAULT 'bank',
+            created_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS assignments (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            due_date TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS assignment_submissions (
+            id SERIAL PRIMARY KEY,
+            assignment_id INTEGER NOT NULL REFERENCES assignments(id),
+            student_id INTEGER NOT NULL REFERENCES users(id),
+            content TEXT,
+            submitted_at TEXT,
+            feedback TEXT,
+            rating INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS mentor_messages (
+            id SERIAL PRIMARY KEY,
+            student_id INTEGER NOT NULL REFERENCES users(id),
+            mentor_id INTEGER NOT NULL REFERENCES users(id),
+            question_text TEXT NOT NULL,
+            answer_text TEXT,
+            created_at TEXT NOT NULL,
+            answered_at TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS lessons (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            video_url TEXT,
+            topic TEXT,
+            created_by INTEGER REFERENCES users(id),
+            created_at TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS mentor_quizzes (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            created_by INTEGER REFERENCES users(id),
+            created_at TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS mentor_quiz_questions (
+            id SERIAL PRIMARY KEY,
+            quiz_id INTEGER NOT NULL REFERENCES mentor_quizzes(id),
+            question TEXT NOT NULL,
+            option_a TEXT,
+            option_b TEXT,
+            option_c TEXT,
+            option_d TEXT,
+            correct_option TEXT NOT NULL,
+            topic TEXT,
+            difficulty TEXT
+        )
+        """,
+    ]),
+    # index statements are valid in both dialects
+    (2, "indexes for hot lookups", MIGRATIONS[1][2]),
+    (3, "explanation cache", MIGRATIONS[2][2]),
+    (4, "question bank version", [
+        """
+        CREATE TABLE IF NOT EXISTS question_bank_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """,
+        "INSERT INTO question_bank_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING",
+        """
+        CREATE OR REPLACE FUNCTION bump_question_bank_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE question_bank_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        # once per statement: a bulk load bumps the version once, not per row
+        """
+        CREATE TRIGGER trg_questions_version
+        AFTER INSERT OR UPDATE OR DELETE ON questions
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_question_bank_version()
+        """,
+    ]),
+    (5, "user topic stats projection", [
+        """
+        CREATE TABLE IF NOT EXISTS user_topic_stats (
+            user_id INTEGER NOT NULL,
+            topic TEXT NOT NULL,
+            correct INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, topic)
+        )
+        """,
+        """
+        INSERT INTO user_topic_stats (user_id, topic, correct, total)
+        SELECT qa.user_id,
+               q.topic,
+               SUM(CASE WHEN qa.is_correct = 1 THEN 1 ELSE 0 END),
+               COUNT(*)
+        FROM quiz_attempts qa
+        JOIN questions q ON q.id = qa.question_id
+        WHERE qa.source = 'bank'
+        GROUP BY qa.user_id, q.topic
+        """,
+        """
+        CREATE OR REPLACE FUNCTION add_user_topic_stats() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO user_topic_stats (user_id, topic, correct, total)
+            SELECT NEW.user_id, q.topic, CASE WHEN NEW.is_correct = 1 THEN 1 ELSE 0 END, 1
+            FROM questions q
+            WHERE q.id = NEW.question_id
+            ON CONFLICT (user_id, topic) DO UPDATE
+            SET correct = user_topic_stats.correct + EXCLUDED.correct,
+                total = user_topic_stats.total + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER trg_quiz_attempts_topic_stats
+        AFTER INSERT ON quiz_attempts
+        FOR EACH ROW WHEN (NEW.source = 'bank')
+        EXECUTE FUNCTION add_user_topic_stats()
+        """,
+    ]),
+    (6, "mentor inbox pagination and counts", [
+        *MIGRATIONS[5][2][:3],
+        """
+        CREATE TABLE IF NOT EXISTS mentor_inbox_counts (
+            mentor_id INTEGER PRIMARY KEY,
+            unanswered INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT INTO mentor_inbox_counts (mentor_id, unanswered)
+        SELECT mentor_id, SUM(CASE WHEN answered_at IS NULL THEN 1 ELSE 0 END)
+        FROM mentor_messages
+        GROUP BY mentor_id
+        """,
+        """
+        CREATE OR REPLACE FUNCTION count_mentor_inbox() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO mentor_inbox_counts (mentor_id, unanswered)
+                VALUES (NEW.mentor_id, 1)
+                ON CONFLICT (mentor_id) DO UPDATE
+                SET unanswered = mentor_inbox_counts.unanswered + 1;
+            ELSIF TG_OP = 'UPDATE' THEN
+                UPDATE mentor_inbox_counts SET unanswered = unanswered - 1
+                WHERE mentor_id = NEW.mentor_id;
+            ELSE
+                UPDATE mentor_inbox_counts SET unanswered = unanswered - 1
+                WHERE mentor_id = OLD.mentor_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER trg_mentor_messages_insert_count
+        AFTER INSERT ON mentor_messages
+        FOR EACH ROW WHEN (NEW.answered_at IS NULL)
+        EXECUTE FUNCTION count_mentor_inbox()
+        """,
+        """
+        CREATE TRIGGER trg_mentor_messages_answer_count
+        AFTER UPDATE OF answered_at ON mentor_messages
+        FOR EACH ROW WHEN (OLD.answered_at IS NULL AND NEW.answered_at IS NOT NULL)
+        EXECUTE FUNCTION count_mentor_inbox()
+        """,
+        """
+        CREATE TRIGGER trg_mentor_messages_delete_count
+        AFTER DELETE ON mentor_messages
+        FOR EACH ROW WHEN (OLD.answered_at IS NULL)
+        EXECUTE FUNCTION count_mentor_inbox()
+        """,
+    ]),
+    (7, "state shared by worker processes", [
+        *[
+            statement.replace("REAL", "DOUBLE PRECISION")
+            for statement in MIGRATIONS[6][2][:6]
+        ],
+        """
+        INSERT INTO catalog_generations (name, generation)
+        VALUES ('lessons', 0), ('manual_quizzes', 0), ('assignments', 0)
+        ON CONFLICT DO NOTHING
+        """,
+        """
+        CREATE OR REPLACE FUNCTION bump_catalog_generation() RETURNS trigger AS $$
+        BEGIN
+            UPDATE catalog_generations SET generation = generation + 1
+            WHERE name = TG_ARGV[0];
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        *[
+            f"""
+            CREATE TRIGGER trg_{table}_catalog
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_generation('{name}')
+            """
+            for name, table in _CATALOG_TABLES
+        ],
+    ]),
+    (8, "AI rate limit buckets", [
+        statement.replace("REAL", "DOUBLE PRECISION") for statement in MIGRATIONS[7][2]
+    ]),
+    (9, "topic stats follow question edits", [
+        "DELETE FROM user_topic_stats",
+        "INSERT INTO user_topic_stats (user_id, topic, correct, total)" + _TOPIC_STATS_FROM_ATTEMPTS,
+        """
+        CREATE OR REPLACE FUNCTION add_user_topic_stats() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO user_topic_stats (user_id, topic, correct, total)
+            VALUES (NEW.user_id,
+                    COALESCE((SELECT topic FROM questions WHERE id = NEW.question_id), ''),
+                    CASE WHEN NEW.is_correct = 1 THEN 1 ELSE 0 END, 1)
+            ON CONFLICT (user_id, topic) DO UPDATE
+            SET correct = user_topic_stats.correct + EXCLUDED.correct,
+                total = user_topic_stats.total + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION move_user_topic_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+            {_move_topic_stats("OLD.id", "OLD.topic", "NEW.topic")}
+            ELSIF TG_OP = 'DELETE' THEN
+            {_move_topic_stats("OLD.id", "OLD.topic", "''")}
+            ELSIF EXISTS (SELECT 1 FROM quiz_attempts WHERE question_id = NEW.id AND source = 'bank') THEN
+            {_move_topic_stats("NEW.id", "''", "NEW.topic")}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER trg_questions_topic_stats_update
+        AFTER UPDATE OF topic ON questions
+        FOR EACH ROW WHEN (OLD.topic IS DISTINCT FROM NEW.topic)
+        EXECUTE FUNCTION move_user_topic_stats()
+        """,
+        """
+        CREATE TRIGGER trg_questions_topic_stats_change
+        AFTER INSERT OR DELETE ON questions
+        FOR EACH ROW EXECUTE FUNCTION move_user_topic_stats()
+        """,
+    ]),
+]
+
+
+def _dialect(db):
+    # migrate() also gets plain sqlite3 connections (benchmarks/query_plans.py)
+    return getattr(db, "dialect", "sqlite")
+
+
+def schema_version(db):
+    c = db.cursor()
+    if _dialect(db) == "postgres":
+        c.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS present")
+        present = c.fetchone()["present"]
+    else:
+        c.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name = 'schema_migrations'
+        """)
+        present = c.fetchone() is not None
+    if not present:
+        return 0
+    c.execute("SELECT MAX(version) AS v FROM schema_migrations")
+    return c.fetchone()["v"] or 0
+
+
+def migrate(db):
+    """Apply every migration newer than the recorded schema version.
+
+    Each step runs in its own exclusive transaction (BEGIN IMMEDIATE on
+    SQLite, an advisory lock on Postgres), so concurrent processes
+    serialize here and a failed step leaves no partial schema.
+    Returns the list of versions applied.
+    """
+    postgres = _dialect(db) == "postgres"
+    c = db.cursor()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+
+    applied = []
+    for version, name, statements in POSTGRES_MIGRATIONS if postgres else MIGRATIONS:
+        if version <= schema_version(db):
+            continue
+        if postgres:
+            db.begin_exclusive()
+        else:
+            c.execute("BEGIN IMMEDIATE")
+        try:
+            # another process may have got here first
+            c.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,))
+            if c.fetchone():
+                db.rollback()
+                continue
+            for sql in statements:
+                c.execute(sql)
+            c.execute("""
+                INSERT INTO schema_migrations (version, name, applied_at)
+                VALUES (?, ?, ?)
+            """, (version, name, datetime.utcnow().isoformat()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append(version)
+    return applied
@@ -0,0 +1,249 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+POOL_SIZE = int(os.getenv("SMARTPATH_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("SMARTPATH_DB_POOL_TIMEOUT", "30"))
+BUSY_TIMEOUT_MS = int(os.getenv("SMARTPATH_DB_BUSY_TIMEOUT_MS", "5000"))
+BUSY_RETRIES = int(os.getenv("SMARTPATH_DB_BUSY_RETRIES", "3"))
+MMAP_SIZE = int(os.getenv("SMARTPATH_DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+# negative cache_size is in KiB rather than pages
+CACHE_SIZE = int(os.getenv("SMARTPATH_DB_CACHE_SIZE", "-16000"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _is_busy(e):
+    msg = str(e)
+    return "database is locked" in msg or "database is busy" in msg
+
+
+class PooledCursor(sqlite3.Cursor):
+    """Cursor that retries statements which fail with SQLITE_BUSY.
+
+    busy_timeout already makes SQLite wait for the lock; this is the
+    backstop once that wait runs out. Fetches are timed too: SQLite only
+    steps a query as far as its first row on execute, so the rest of a
+    SELECT's work happens while its rows are fetched.
+    """
+
+    def execute(self, sql, parameters=()):
+        return self.connection._retry(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.connection._retry(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self.connection._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self.connection._fetch(super().fetchmany)
+        return self.connection._fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self.connection._fetch(super().fetchall)
+
+    def __next__(self):
+        return self.connection._fetch(super().__next__)
+
+
+class PooledConnection(sqlite3.Connection):
+    dialect = "sqlite"
+    # LIMIT value that means no limit
+    unlimited = -1
+    pool = None
+    # called with the seconds each statement, commit or fetch took and the
+    # statements that counts as (0 for a fetch), when set
+    observer = None
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return self._retry(super().commit)
+
+    def begin_exclusive(self):
+        """Start a write transaction, taking the database lock up front."""
+        self.execute("BEGIN IMMEDIATE")
+
+    def in_ids(self, column):
+        """SQL testing column against the list bound by id_list()."""
+        return f"{column} IN (SELECT value FROM json_each(?))"
+
+    @staticmethod
+    def id_list(ids):
+        return json.dumps(list(ids))
+
+    def _retry(self, fn, *args):
+        observer = self.observer
+        if observer is None:
+            return self._run(fn, *args)
+        start = time.perf_counter()
+        try:
+            return self._run(fn, *args)
+        finally:
+            observer(time.perf_counter() - start)
+
+    def _fetch(self, fn, *args):
+        observer = self.observer
+        if observer is None:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            observer(time.perf_counter() - start, 0)
+
+    def _run(self, fn, *args):
+        attempt = 0
+        while True:
+            try:
+                return fn(*args)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or attempt >= BUSY_RETRIES:
+                    raise
+                attempt += 1
+                if self.pool is not None:
+                    self.pool._count("busy_retries")
+                time.sleep(0.01 * attempt)
+
+
+class ConnectionPool:
+    """Bounded pool of warm SQLite connections in WAL mode.
+
+    Pragmas are applied once when a connection is opened; after that a
+    checkout is just a pop from the idle list.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "connections_opened": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "busy_retries": 0,
+        }
+
+    def connect(self):
+        """A new connection with the pool's pragmas, not tracked by the pool."""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=PooledConnection,
+        )
+        conn.pool = self
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size={CACHE_SIZE}")
+        return conn
+
+    def _count(self, key, amount=1):
+        with self._cond:
+            self._stats[key] += amount
+
+    def acquire(self):
+        with self._cond:
+            self._stats["checkouts"] += 1
+            if not self._idle and self._opened >= self.size:
+                self._stats["waits"] += 1
+                start = time.perf_counter()
+                deadline = start + self.timeout
+                while not self._idle and self._opened >= self.size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no SQLite connection free after {self.timeout}s "
+                            f"(pool size {self.size})"
+                        )
+                    self._cond.wait(remaining)
+                self._stats["wait_seconds"] += time.perf_counter() - start
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+            self._stats["connections_opened"] += 1
+
+        try:
+            return self.connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data["wait_seconds"] = round(data["wait_seconds"], 6)
+            data["size"] = self.size
+            data["open"] = self._opened
+            data["idle"] = len(self._idle)
+            data["in_use"] = self._opened - len(self._idle)
+        return data
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+def close_pools():
+    """Close every pool's idle connections and forget the pools; the next
+    get_pool() opens a fresh one."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
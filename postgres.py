@@ -0,0 +1,334 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+
+PG_POOL_MIN = int(os.getenv("SMARTPATH_PG_POOL_MIN", "1"))
+PG_POOL_SIZE = int(os.getenv("SMARTPATH_PG_POOL_SIZE", "10"))
+PG_POOL_TIMEOUT = float(os.getenv("SMARTPATH_PG_POOL_TIMEOUT", "30"))
+# a write transaction that loses a serialization race is rerun this many times
+PG_WRITE_RETRIES = int(os.getenv("SMARTPATH_PG_WRITE_RETRIES", "5"))
+# fixed key for pg_advisory_xact_lock, taken by begin_exclusive()
+EXCLUSIVE_LOCK_KEY = 0x534D5054
+
+# quoted literals are copied through untouched; ? and :name become psycopg
+# placeholders and a bare % is escaped
+_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|\?|(?<!:):([A-Za-z_]\w*)|%")
+
+
+@lru_cache(maxsize=512)
+def translate(sql):
+    """SQLite-style SQL (? and :name parameters) in psycopg's format."""
+    def replace(match):
+        token = match.group(0)
+        if token == "?":
+            return "%s"
+        if token == "%":
+            return "%%"
+        if match.group(1):
+            return f"%({match.group(1)})s"
+        return token
+    return _PLACEHOLDER.sub(replace, sql)
+
+
+class Row(tuple):
+    """A result row readable by column name or position, like sqlite3.Row."""
+
+    def __new__(cls, names, values):
+        row = super().__new__(cls, values)
+        row._names = names
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return super().__getitem__(self._names[key])
+        return super().__getitem__(key)
+
+    def keys(self):
+        return list(self._names)
+
+
+def _row_factory(cursor):
+    names = {d.name: i for i, d in enumerate(cursor.description or ())}
+    return lambda values: Row(names, values)
+
+
+class PgCursor:
+    """DB-API cursor over psycopg taking the SQLite-style SQL the app writes."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def execute(self, sql, parameters=()):
+        if parameters:
+            self.connection._timed(self._cursor.execute, translate(sql), parameters)
+        else:
+            # no parameters: DDL and plpgsql bodies go through verbatim
+            self.connection._timed(self._cursor.execute, sql)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection._timed(self._cursor.executemany, translate(sql), list(seq_of_parameters))
+        return self
+
+    # psycopg has the whole result by the time execute returns, so the
+    # fetches aren't timed
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class PgConnection:
+    """A checked-out psycopg connection with the interface the app expects
+    from a pooled SQLite connection.
+
+    Connections run in autocommit mode; a transaction is opened explicitly
+    with begin() or begin_exclusive() and ended with commit() or
+    rollback(), which is how the SQLite code paths already work.
+    """
+
+    dialect = "postgres"
+    # LIMIT value that means no limit
+    unlimited = None
+
+    def __init__(self, raw, pool=None):
+        self.raw = raw
+        self.pool = pool
+        # called with the seconds each statement or commit took, when set
+        self.observer = None
+
+    def cursor(self):
+        return PgCursor(self)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    @property
+    def in_transaction(self):
+        from psycopg.pq import TransactionStatus
+        return self.raw.info.transaction_status != TransactionStatus.IDLE
+
+    def begin(self, isolation=None):
+        self.execute(f"BEGIN ISOLATION LEVEL {isolation}" if isolation else "BEGIN")
+
+    def begin_exclusive(self):
+        """Start a transaction that no other begin_exclusive() runs alongside;
+        the Postgres counterpart of SQLite's BEGIN IMMEDIATE."""
+        self.begin()
+        self.execute("SELECT pg_advisory_xact_lock(?)", (EXCLUSIVE_LOCK_KEY,))
+
+    def commit(self):
+        if self.in_transaction:
+            self._timed(self.raw.execute, "COMMIT")
+
+    def rollback(self):
+        if self.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def in_ids(self, column):
+        """SQL testing column against the list bound by id_list()."""
+        return f"{column} = ANY(?)"
+
+    @staticmethod
+    def id_list(ids):
+        return list(ids)
+
+    def close(self):
+        self.raw.close()
+
+    def _timed(self, fn, *args):
+        observer = self.observer
+        if observer is None:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            observer(time.perf_counter() - start)
+
+
+class PgPool:
+    """Bounded psycopg_pool.ConnectionPool handing out PgConnections.
+
+    The pool keeps between min_size and size server connections open and
+    makes acquire() wait up to timeout for one to come free.
+    """
+
+    def __init__(self, url, size=PG_POOL_SIZE, timeout=PG_POOL_TIMEOUT, min_size=PG_POOL_MIN):
+        from psycopg_pool import ConnectionPool
+
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self._pool = ConnectionPool(
+            url,
+            min_size=min(min_size, size),
+            max_size=size,
+            timeout=timeout,
+            kwargs={"autocommit": True, "row_factory": _row_factory},
+            name="smartpath",
+            open=True,
+        )
+
+    def connect(self):
+        """A new connection, not tracked by the pool."""
+        import psycopg
+        return PgConnection(psycopg.connect(self.url, autocommit=True, row_factory=_row_factory))
+
+    def acquire(self):
+        from psycopg_pool import PoolTimeout as PgPoolTimeout
+        from pool import PoolTimeout
+
+        try:
+            return PgConnection(self._pool.getconn(), self)
+        except PgPoolTimeout as e:
+            raise PoolTimeout(
+                f"no Postgres connection free after {self.timeout}s (pool size {self.size})"
+            ) from e
+
+    def release(self, conn):
+        import psycopg
+
+        try:
+            conn.rollback()
+        except psycopg.Error:
+            pass
+        # the pool itself discards connections left broken
+        self._pool.putconn(conn.raw)
+
+    def close(self):
+        self._pool.close()
+
+    def stats(self):
+        raw = self._pool.get_stats()
+        open_ = raw.get("pool_size", 0)
+        idle = raw.get("pool_available", 0)
+        return {
+            "checkouts": raw.get("requests_num", 0),
+            "connections_opened": raw.get("connections_num", 0),
+            "waits": raw.get("requests_queued", 0),
+            "wait_seconds": round(raw.get("requests_wait_ms", 0) / 1000, 6),
+            "timeouts": raw.get("requests_errors", 0),
+            "size": self.size,
+            "open": open_,
+            "idle": idle,
+            "in_use": open_ - idle,
+        }
+
+
+class PgWriter:
+    """Runs write functions for the Postgres backend.
+
+    There is no single writer to funnel through: every write is its own
+    SERIALIZABLE transaction on a pooled connection, rerun when Postgres
+    reports a serialization failure, so check-then-insert writes such as
+    a resubmitted assignment stay as safe as on the SQLite writer thread.
+    Write functions are called as fn(conn, *args), same as DbWriter.
+    """
+
+    def __init__(self, pool, retries=PG_WRITE_RETRIES):
+        self.pool = pool
+        self.retries = retries
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pg-writer")
+        self._lock = threading.Lock()
+        self._stats = {"writes": 0, "errors": 0, "serialization_retries": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def write(self, fn, *args):
+        from psycopg.errors import SerializationFailure
+
+        conn = self.pool.acquire()
+        try:
+            attempt = 0
+            while True:
+                conn.begin("SERIALIZABLE")
+                try:
+                    result = fn(conn, *args)
+                    conn.commit()
+                except SerializationFailure:
+                    conn.rollback()
+                    if attempt >= self.retries:
+                        self._count("errors")
+                        raise
+                    attempt += 1
+                    self._count("serialization_retries")
+                    time.sleep(0.005 * attempt)
+                    continue
+                except Exception:
+                    conn.rollback()
+                    self._count("errors")
+                    raise
+                self._count("writes")
+                return result
+        finally:
+            self.pool.release(conn)
+
+    def submit(self, fn, *args):
+        """Run fn(conn, *args) off the calling thread; returns a Future."""
+        try:
+            return self._background.submit(self.write, fn, *args)
+        except RuntimeError as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def close(self):
+        self._background.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(url):
+    """The (PgPool, PgWriter) pair for url, created on first use."""
+    backend = _backends.get(url)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(url)
+            if backend is None:
+                pool = PgPool(url)
+                backend = _backends[url] = (pool, PgWriter(pool))
+    return backend
+
+
+def close_backends():
+    """Finish queued writes, close every pool and forget them."""
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for pool, writer in backends:
+        writer.close()
+        pool.close()
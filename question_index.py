@@ -0,0 +1,128 @@
+import bisect
+import itertools
+import random
+import threading
+
+from repositories import bank_questions
+
+
+class QuestionIndex:
+    """In-memory index of bank question ids for O(k) random sampling.
+
+    Holds (id, topic, difficulty) for every row in questions and reloads
+    only when question_bank_version moves, so a quiz draw costs one
+    single-row version read plus a primary-key fetch of the k drawn rows.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids = []
+        self._strata = {}
+        self._stats = {"loads": 0, "samples": 0}
+
+    def current_version(self, db):
+        c = db.cursor()
+        c.execute("SELECT version FROM question_bank_version WHERE id = 1")
+        row = c.fetchone()
+        return row["version"] if row else 0
+
+    @property
+    def version(self):
+        """question_bank_version the index was last loaded at."""
+        return self._version
+
+    def refresh(self, db):
+        version = self.current_version(db)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            c = db.cursor()
+            c.execute("SELECT id, topic, difficulty FROM questions")
+            ids = []
+            strata = {}
+            for r in c.fetchall():
+                ids.append(r["id"])
+                strata.setdefault((r["topic"], r["difficulty"]), []).append(r["id"])
+            self._ids = ids
+            self._strata = strata
+            self._version = version
+            self._stats["loads"] += 1
+
+    def sample_ids(self, db, k, topic=None, difficulty=None, stratify=False):
+        """Draw up to k distinct question ids.
+
+        topic/difficulty restrict the draw to matching questions. With
+        stratify=True the draw is spread as evenly as possible across
+        topics instead of following the bank's topic mix.
+        """
+        self.refresh(db)
+        with self._lock:
+            ids, strata = self._ids, self._strata
+            self._stats["samples"] += 1
+
+        if topic is None and difficulty is None and not stratify:
+            return _sample_from([ids], k)
+
+        by_topic = {}
+        for (t, d), stratum in strata.items():
+            if (topic is None or t == topic) and (difficulty is None or d == difficulty):
+                by_topic.setdefault(t, []).append(stratum)
+
+        if not stratify:
+            return _sample_from([s for lists in by_topic.values() for s in lists], k)
+
+        # hand out k slots round-robin over topics in random order, skipping
+        # topics that have run out of questions
+        topics = list(by_topic)
+        random.shuffle(topics)
+        sizes = {t: sum(len(s) for s in by_topic[t]) for t in topics}
+        quotas = dict.fromkeys(topics, 0)
+        assigned = 0
+        while assigned < k and topics:
+            for t in list(topics):
+                if assigned >= k:
+                    break
+                if quotas[t] >= sizes[t]:
+                    topics.remove(t)
+                    continue
+                quotas[t] += 1
+                assigned += 1
+
+        picked = []
+        for t, quota in quotas.items():
+            picked.extend(_sample_from(by_topic[t], quota))
+        random.shuffle(picked)
+        return picked
+
+    def fetch(self, db, ids):
+        """Question rows for ids, in the order given."""
+        if not ids:
+            return []
+        rows = {r["id"]: r for r in bank_questions(db, ids)}
+        return [rows[qid] for qid in ids if qid in rows]
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["version"] = self._version
+            data["size"] = len(self._ids)
+        return data
+
+
+def _sample_from(lists, k):
+    """k distinct items drawn uniformly from the concatenation of lists,
+    without building it: O(k log len(lists))."""
+    offsets = list(itertools.accumulate(len(lst) for lst in lists))
+    total = offsets[-1] if offsets else 0
+    picked = []
+    for i in random.sample(range(total), min(k, total)):
+        j = bisect.bisect_right(offsets, i)
+        start = offsets[j - 1] if j else 0
+        picked.append(lists[j][i - start])
+    return picked
+
+
+question_index = QuestionIndex()
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from db import run_write
+from repositories import (
+    bank_questions, get_quiz_session, insert_quiz_session, quiz_session_answers,
+    record_quiz_answers
+)
+
+# unanswered quizzes are dropped this long after they were generated
+QUIZ_SESSION_TTL = float(os.getenv("SMARTPATH_QUIZ_SESSION_TTL", "7200"))
+QUIZ_SESSION_MAX = int(os.getenv("SMARTPATH_QUIZ_SESSION_MAX", "10000"))
+
+
+class QuizSession:
+    def __init__(self, user_id, source, rows, version):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.source = source
+        self.question_ids = [r["id"] for r in rows]
+        # answer key: {question_id: {"question": ..., "correct_option": ...}}
+        self.key = {
+            r["id"]: {"question": r["question"], "correct_option": r["correct_option"]}
+            for r in rows
+        }
+        self.version = version
+        self.answered = {}
+        # wall clock, since other processes read it back
+        self.created_at = time.time()
+
+    @classmethod
+    def from_row(cls, row):
+        session = cls.__new__(cls)
+        session.id = row["id"]
+        session.user_id = row["user_id"]
+        session.source = row["source"]
+        session.question_ids = json.loads(row["question_ids"])
+        session.key = {int(qid): entry for qid, entry in json.loads(row["answer_key"]).items()}
+        session.version = row["version"]
+        session.answered = {}
+        session.created_at = row["created_at"]
+        return session
+
+
+class QuizSessionStore:
+    """Generated quizzes and their answer keys.
+
+    The browser only gets the session id and the questions; grading is a
+    lookup in the session's key. Sessions are stored in the database so
+    any worker process can grade them, and each process keeps the ones it
+    has seen in memory (at most max_sessions), so a request reads only the
+    answers recorded so far. Answers are recorded in the write that adds
+    the quiz attempts, which is what stops two workers grading the same
+    question twice.
+
+    Bank sessions remember the question_bank_version they were drawn at
+    and reload their key if the bank has been edited since. Sessions
+    expire after ttl.
+    """
+
+    def __init__(self, ttl=QUIZ_SESSION_TTL, max_sessions=QUIZ_SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "created": 0, "graded": 0, "expired": 0, "evicted": 0, "key_reloads": 0, "loads": 0
+        }
+
+    def create(self, user_id, source, rows, version=None):
+        session = QuizSession(user_id, source, rows, version)
+        run_write(insert_quiz_session, (
+            session.id, user_id, source, json.dumps(session.question_ids),
+            json.dumps(session.key), version, session.created_at
+        ), session.created_at - self.ttl)
+        with self._lock:
+            self._prune()
+            self._sessions[session.id] = session
+            self._stats["created"] += 1
+        return session
+
+    def get(self, db, session_id, user_id):
+        """The session with the answers recorded so far, or None."""
+        # ids come straight from request JSON; an object or list isn't hashable
+        if not isinstance(session_id, str):
+            return None
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            row = get_quiz_session(db, session_id)
+            if row is None:
+                return None
+            session = QuizSession.from_row(row)
+            with self._lock:
+                self._prune()
+                session = self._sessions.setdefault(session_id, session)
+                self._stats["loads"] += 1
+        if session.user_id != user_id:
+            return None
+        if time.time() - session.created_at > self.ttl:
+            with self._lock:
+                if self._sessions.pop(session_id, None) is not None:
+                    self._stats["expired"] += 1
+            return None
+        session.answered = {
+            r["question_id"]: r["selected_option"] for r in quiz_session_answers(db, session_id)
+        }
+        return session
+
+    def answer_key(self, db, session, version=None):
+        """The session's key, reloaded first if the bank moved past its version."""
+        if session.source != "bank" or version is None or version == session.version:
+            return session.key
+        key = {
+            r["id"]: {"question": r["question"], "correct_option": r["correct_option"]}
+            for r in bank_questions(db, session.question_ids)
+        }
+        with self._lock:
+            session.key = key
+            session.version = version
+            self._stats["key_reloads"] += 1
+        return key
+
+    def record(self, session, user_id, answers, created_at):
+        """Record [(question_id, selected_option, is_correct)] and their quiz
+        attempts in one write; returns the set of question ids recorded,
+        leaving out those already answered."""
+        recorded = set(run_write(
+            record_quiz_answers, session.id, user_id, session.source, answers, created_at
+        ))
+        with self._lock:
+            self._stats["graded"] += len(recorded)
+        return recorded
+
+    def _prune(self):
+        # caller holds self._lock; the database rows are pruned by create()
+        now = time.time()
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if now - session.created_at > self.ttl
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+        self._stats["expired"] += len(expired)
+        while len(self._sessions) >= self.max_sessions:
+            # dicts keep insertion order, so this drops the oldest session
+            self._sessions.pop(next(iter(self._sessions)))
+            self._stats["evicted"] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["active"] = len(self._sessions)
+            data["ttl_seconds"] = self.ttl
+        return data
+
+
+quiz_sessions = QuizSessionStore()
@@ -0,0 +1,119 @@
+import math
+import os
+import threading
+import time
+
+from db import run_write, submit_write
+from repositories import return_rate_token, take_rate_tokens
+
+# each student's calls: a burst of this many, then this many a minute
+AI_USER_BURST = float(os.getenv("SMARTPATH_AI_USER_BURST", "10"))
+AI_USER_PER_MINUTE = float(os.getenv("SMARTPATH_AI_USER_PER_MINUTE", "6"))
+# everyone's together, sized to the Gemini quota; 0 turns a bucket off
+AI_GLOBAL_BURST = float(os.getenv("SMARTPATH_AI_GLOBAL_BURST", "100"))
+AI_GLOBAL_PER_MINUTE = float(os.getenv("SMARTPATH_AI_GLOBAL_PER_MINUTE", "600"))
+
+GLOBAL_KEY = "ai:global"
+AI_THROTTLED_USER = "You're asking the AI mentor too often. Try again in a moment."
+AI_THROTTLED_GLOBAL = "The AI mentor is busy right now. Try again in a moment."
+
+
+class Throttle:
+    """Why a call was refused: 429 for the student's own bucket, 503 for
+    the shared one, with the whole seconds to wait for Retry-After."""
+
+    def __init__(self, scope, wait):
+        self.scope = scope
+        self.status = 429 if scope == "user" else 503
+        self.message = AI_THROTTLED_USER if scope == "user" else AI_THROTTLED_GLOBAL
+        self.retry_after = max(1, math.ceil(wait))
+
+    def body(self):
+        return {"error": self.message, "retry_after": self.retry_after}
+
+
+class RateLimiter:
+    """Token buckets in front of the Gemini-backed endpoints.
+
+    Every call takes a token from the student's bucket and from the global
+    one, or from neither. The buckets are rows in rate_buckets, updated in
+    one write transaction, so all worker processes draw from the same
+    ones. A refused call also remembers locally when its bucket refills:
+    tokens only come back with time, so until then this process refuses
+    that bucket without a database round trip.
+    """
+
+    def __init__(self, user_burst=AI_USER_BURST, user_per_minute=AI_USER_PER_MINUTE,
+                 global_burst=AI_GLOBAL_BURST, global_per_minute=AI_GLOBAL_PER_MINUTE,
+                 max_blocked=10000):
+        self.user_bucket = (user_burst, user_per_minute / 60)
+        self.global_bucket = (global_burst, global_per_minute / 60)
+        self.max_blocked = max_blocked
+        # bucket key -> wall clock time it holds a token again
+        self._blocked = {}
+        self._lock = threading.Lock()
+        self._stats = {"admitted": 0, "throttled_user": 0, "throttled_global": 0, "local_refusals": 0,
+                       "refunded": 0}
+
+    def acquire(self, user_id=None, shared=True):
+        """None if the call may go ahead, else a Throttle.
+
+        Without a user_id only the global token is taken; shared=False
+        takes only the student's, for a request that may ride on an
+        upstream call already paid for.
+        """
+        buckets = []
+        if shared and self.global_bucket[1] > 0:
+            buckets.append((GLOBAL_KEY, *self.global_bucket))
+        if user_id is not None and self.user_bucket[1] > 0:
+            buckets.append((f"ai:user:{user_id}", *self.user_bucket))
+        if not buckets:
+            return None
+
+        now = time.time()
+        with self._lock:
+            for key, _, _ in buckets:
+                until = self._blocked.get(key)
+                if until is not None and until > now:
+                    self._stats["local_refusals"] += 1
+                    return self._refuse(key, until - now)
+
+        refused = run_write(take_rate_tokens, buckets, now)
+        with self._lock:
+            if refused is None:
+                self._stats["admitted"] += 1
+                return None
+            key, wait = refused
+            if len(self._blocked) >= self.max_blocked:
+                self._blocked = {k: t for k, t in self._blocked.items() if t > now}
+            if len(self._blocked) < self.max_blocked:
+                self._blocked[key] = now + wait
+            return self._refuse(key, wait)
+
+    def refund(self, user_id):
+        """Give back the student's token for a request that was refused
+        further on, so it doesn't count against them."""
+        if self.user_bucket[1] <= 0:
+            return
+        key = f"ai:user:{user_id}"
+        submit_write(return_rate_token, key, self.user_bucket[0])
+        with self._lock:
+            self._blocked.pop(key, None)
+            self._stats["refunded"] += 1
+
+    def _refuse(self, key, wait):
+        # caller holds self._lock
+        scope = "global" if key == GLOBAL_KEY else "user"
+        self._stats[f"throttled_{scope}"] += 1
+        return Throttle(scope, wait)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["blocked_buckets"] = len(self._blocked)
+        data["user_burst"], data["user_per_minute"] = self.user_bucket[0], self.user_bucket[1] * 60
+        data["global_burst"], data["global_per_minute"] = self.global_bucket[0], self.global_bucket[1] * 60
+        return data
+
+
+ai_limiter = RateLimiter()
@@ -0,0 +1,480 @@
+"""SQL for each entity, shared by the SQLite and Postgres backends.
+
+Readers take the request's connection (db); writers take the write
+connection (conn) and are run through db.run_write. Statements stay within
+what both dialects accept; where they differ the connection supplies the
+piece (in_ids, id_list, unlimited).
+"""
+from datetime import datetime
+
+
+# Users
+def get_user(db, user_id):
+    c = db.cursor()
+    c.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    return c.fetchone()
+
+
+def find_login(db, email, password, role):
+    c = db.cursor()
+    c.execute("""
+        SELECT * FROM users
+        WHERE email = ? AND password = ? AND role = ?
+    """, (email, password, role))
+    return c.fetchone()
+
+
+def first_mentor(db):
+    c = db.cursor()
+    c.execute("SELECT * FROM users WHERE role = 'mentor' ORDER BY id LIMIT 1")
+    return c.fetchone()
+
+
+def list_students(db):
+    c = db.cursor()
+    c.execute("SELECT id, name FROM users WHERE role = 'student'")
+    return c.fetchall()
+
+
+def insert_user(conn, name, email, password, role):
+    conn.execute("""
+        INSERT INTO users (name, email, password, role)
+        VALUES (?, ?, ?, ?)
+    """, (name, email, password, role))
+
+
+# Quiz attempts and the question bank
+def bank_questions(db, ids):
+    """Bank question rows for ids, in no particular order."""
+    c = db.cursor()
+    c.execute(f"""
+        SELECT id, topic, difficulty, question,
+               option_a, option_b, option_c, option_d, correct_option
+        FROM questions
+        WHERE {db.in_ids("id")}
+    """, (db.id_list(ids),))
+    return c.fetchall()
+
+
+def explainable_questions(db):
+    """question and correct_option of every bank and mentor quiz question."""
+    c = db.cursor()
+    c.execute("SELECT question, correct_option FROM questions")
+    rows = c.fetchall()
+    c.execute("SELECT question, correct_option FROM mentor_quiz_questions")
+    return rows + c.fetchall()
+
+
+def user_topic_stats(db, user_ids):
+    c = db.cursor()
+    c.execute(f"""
+        SELECT user_id, topic, correct, total
+        FROM user_topic_stats
+        WHERE {db.in_ids("user_id")}
+        ORDER BY user_id, topic
+    """, (db.id_list(user_ids),))
+    return c.fetchall()
+
+
+def insert_quiz_attempts(conn, attempts):
+    conn.executemany("""
+        INSERT INTO quiz_attempts (user_id, question_id, is_correct, source, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, attempts)
+
+
+# Quiz sessions
+def insert_quiz_session(conn, values, expire_before):
+    """Store a session (id, user_id, source, question_ids, answer_key,
+    version, created_at), dropping those created before expire_before."""
+    conn.execute("""
+        DELETE FROM quiz_session_answers WHERE session_id IN (
+            SELECT id FROM quiz_sessions WHERE created_at < ?
+        )
+    """, (expire_before,))
+    conn.execute("DELETE FROM quiz_sessions WHERE created_at < ?", (expire_before,))
+    conn.execute("""
+        INSERT INTO quiz_sessions (id, user_id, source, question_ids, answer_key, version, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, values)
+
+
+def get_quiz_session(db, session_id):
+    c = db.cursor()
+    c.execute("SELECT * FROM quiz_sessions WHERE id = ?", (session_id,))
+    return c.fetchone()
+
+
+def quiz_session_answers(db, session_id):
+    c = db.cursor()
+    c.execute("""
+        SELECT question_id, selected_option
+        FROM quiz_session_answers
+        WHERE session_id = ?
+    """, (session_id,))
+    return c.fetchall()
+
+
+def record_quiz_answers(conn, session_id, user_id, source, answers, created_at):
+    """Record [(question_id, selected_option, is_correct)] against the
+    session, with a quiz attempt for each. A question the session already
+    has an answer for is skipped; returns the question ids recorded."""
+    c = conn.cursor()
+    recorded = []
+    for question_id, selected_option, is_correct in answers:
+        c.execute("""
+            INSERT INTO quiz_session_answers (session_id, question_id, selected_option)
+            VALUES (?, ?, ?)
+            ON CONFLICT DO NOTHING
+        """, (session_id, question_id, selected_option))
+        if c.rowcount == 1:
+            recorded.append((user_id, question_id, is_correct, source, created_at))
+    if recorded:
+        insert_quiz_attempts(conn, recorded)
+    return [attempt[1] for attempt in recorded]
+
+
+# Assignments
+ASSIGNMENT_STATUS_FILTERS = {
+    "submitted": "s.id IS NOT NULL",
+    "open": "s.id IS NULL AND (a.due_date IS NULL OR a.due_date = '' OR a.due_date >= :today)",
+    "overdue": "s.id IS NULL AND a.due_date IS NOT NULL AND a.due_date != '' AND a.due_date < :today",
+}
+
+
+def get_assignment(db, assignment_id):
+    c = db.cursor()
+    c.execute("SELECT * FROM assignments WHERE id = ?", (assignment_id,))
+    return c.fetchone()
+
+
+def list_assignments(db):
+    c = db.cursor()
+    c.execute("SELECT * FROM assignments ORDER BY id")
+    return c.fetchall()
+
+
+# MIN(id) keeps one submission per assignment even if a race left two
+STUDENT_ASSIGNMENTS_FROM = """
+    FROM assignments a
+    LEFT JOIN assignment_submissions s ON s.id = (
+        SELECT MIN(id) FROM assignment_submissions
+        WHERE assignment_id = a.id AND student_id = :user_id
+    )
+"""
+
+
+def student_assignment_rows(db, user_id, status=None, limit=None, offset=0):
+    """Assignments joined to this student's submission, each row carrying
+    the unpaginated match count in total."""
+    where = ASSIGNMENT_STATUS_FILTERS[status] if status else "1 = 1"
+    c = db.cursor()
+    c.execute(f"""
+        SELECT a.id, a.title, a.description, a.due_date,
+               s.id AS submission_id, s.content, s.submitted_at, s.feedback, s.rating,
+               COUNT(*) OVER () AS total
+        {STUDENT_ASSIGNMENTS_FROM}
+        WHERE {where}
+        ORDER BY a.id
+        LIMIT :limit OFFSET :offset
+    """, {
+        "user_id": user_id,
+        "today": datetime.utcnow().date().isoformat(),
+        "limit": db.unlimited if limit is None else limit,
+        "offset": offset
+    })
+    return c.fetchall()
+
+
+def student_assignment_count(db, user_id, status=None):
+    """The match count student_assignment_rows reports, for a page that
+    came back empty and so carries none."""
+    where = ASSIGNMENT_STATUS_FILTERS[status] if status else "1 = 1"
+    c = db.cursor()
+    c.execute(f"""
+        SELECT COUNT(*) AS total
+        {STUDENT_ASSIGNMENTS_FROM}
+        WHERE {where}
+    """, {"user_id": user_id, "today": datetime.utcnow().date().isoformat()})
+    return c.fetchone()["total"]
+
+
+def assignment_submissions(db, assignment_id):
+    c = db.cursor()
+    c.execute("""
+        SELECT s.id AS submission_id,
+               s.student_id,
+               u.name AS student_name,
+               s.content,
+               s.submitted_at,
+               s.feedback,
+               s.rating
+        FROM assignment_submissions s
+        JOIN users u ON u.id = s.student_id
+        WHERE s.assignment_id = ?
+        ORDER BY s.id
+    """, (assignment_id,))
+    return c.fetchall()
+
+
+def insert_assignment(conn, title, description, due_date):
+    conn.execute("""
+        INSERT INTO assignments (title, description, due_date)
+        VALUES (?, ?, ?)
+    """, (title, description, due_date))
+
+
+def save_submission(conn, assignment_id, student_id, content):
+    # the lookup runs inside the write transaction, so two quick
+    # resubmits can't both insert
+    c = conn.cursor()
+    c.execute("""
+        SELECT id FROM assignment_submissions
+        WHERE assignment_id = ? AND student_id = ?
+    """, (assignment_id, student_id))
+    existing = c.fetchone()
+
+    if existing:
+        c.execute("""
+            UPDATE assignment_submissions
+            SET content = ?, submitted_at = ?
+            WHERE id = ?
+        """, (content, datetime.utcnow().isoformat(), existing["id"]))
+    else:
+        c.execute("""
+            INSERT INTO assignment_submissions (assignment_id, student_id, content, submitted_at)
+            VALUES (?, ?, ?, ?)
+        """, (assignment_id, student_id, content, datetime.utcnow().isoformat()))
+
+
+def save_feedback(conn, assignment_id, student_id, feedback, rating):
+    """Returns False when there is no such submission."""
+    c = conn.cursor()
+    c.execute("""
+        UPDATE assignment_submissions
+        SET feedback = ?, rating = ?
+        WHERE assignment_id = ? AND student_id = ?
+    """, (feedback, rating, assignment_id, student_id))
+    return c.rowcount > 0
+
+
+# Mentor messages
+def mentor_messages_page(db, limit, mentor_id=None, status=None, before=None):
+    """Up to limit messages newest first, with the student's name.
+
+    mentor_id narrows to one mentor's inbox, status to "answered" or
+    "unanswered", and before=(created_at, id) continues a keyset page.
+    """
+    conditions = []
+    params = []
+    if mentor_id is not None:
+        conditions.append("m.mentor_id = ?")
+        params.append(mentor_id)
+    if status == "unanswered":
+        conditions.append("m.answered_at IS NULL")
+    elif status == "answered":
+        conditions.append("m.answered_at IS NOT NULL")
+    if before is not None:
+        conditions.append("(m.created_at, m.id) < (?, ?)")
+        params.extend(before)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    c = db.cursor()
+    c.execute(f"""
+        SELECT m.id,
+               u.name AS student_name,
+               m.question_text,
+               m.answer_text,
+               m.created_at,
+               m.answered_at
+        FROM mentor_messages m
+        JOIN users u ON u.id = m.student_id
+        {where}
+        ORDER BY m.created_at DESC, m.id DESC
+        LIMIT ?
+    """, params + [limit])
+    return c.fetchall()
+
+
+def unanswered_count(db, mentor_id=None):
+    """Unanswered messages for one mentor, or for everyone."""
+    c = db.cursor()
+    if mentor_id is not None:
+        c.execute("SELECT unanswered FROM mentor_inbox_counts WHERE mentor_id = ?", (mentor_id,))
+        row = c.fetchone()
+        return row["unanswered"] if row else 0
+    c.execute("SELECT COALESCE(SUM(unanswered), 0) AS unanswered FROM mentor_inbox_counts")
+    return c.fetchone()["unanswered"]
+
+
+def insert_mentor_message(conn, student_id, mentor_id, question_text):
+    conn.execute("""
+        INSERT INTO mentor_messages (student_id, mentor_id, question_text, created_at)
+        VALUES (?, ?, ?, ?)
+    """, (student_id, mentor_id, question_text, datetime.utcnow().isoformat()))
+
+
+def answer_mentor_message(conn, message_id, answer_text):
+    conn.execute("""
+        UPDATE mentor_messages
+        SET answer_text = ?, answered_at = ?
+        WHERE id = ?
+    """, (answer_text, datetime.utcnow().isoformat(), message_id))
+
+
+# Lessons
+def list_lessons(db):
+    c = db.cursor()
+    c.execute("""
+        SELECT l.id, l.title, l.description, l.video_url, l.topic, l.created_at, u.name AS mentor_name
+        FROM lessons l
+        LEFT JOIN users u ON u.id = l.created_by
+        ORDER BY l.created_at DESC
+    """)
+    return c.fetchall()
+
+
+def lessons_by(db, mentor_id):
+    c = db.cursor()
+    c.execute("""
+        SELECT l.id, l.title, l.description, l.video_url, l.topic, l.created_at
+        FROM lessons l
+        WHERE l.created_by = ?
+        ORDER BY l.created_at DESC
+    """, (mentor_id,))
+    return c.fetchall()
+
+
+def insert_lesson(conn, title, description, video_url, topic, created_by):
+    conn.execute("""
+        INSERT INTO lessons (title, description, video_url, topic, created_by, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (title, description, video_url, topic, created_by, datetime.utcnow().isoformat()))
+
+
+# Mentor quizzes
+def list_quizzes(db):
+    """Quizzes that have at least one question, with their question count."""
+    c = db.cursor()
+    c.execute("""
+        SELECT mq.id, mq.title, mq.description, mq.created_at, u.name AS mentor_name,
+               COUNT(mqq.id) AS qcount
+        FROM mentor_quizzes mq
+        JOIN users u ON u.id = mq.created_by
+        JOIN mentor_quiz_questions mqq ON mqq.quiz_id = mq.id
+        GROUP BY mq.id, u.name
+        ORDER BY mq.created_at DESC
+    """)
+    return c.fetchall()
+
+
+def quizzes_by(db, mentor_id):
+    c = db.cursor()
+    c.execute("""
+        SELECT id, title, description, created_at
+        FROM mentor_quizzes
+        WHERE created_by = ?
+        ORDER BY created_at DESC
+    """, (mentor_id,))
+    return c.fetchall()
+
+
+def quiz_questions(db, quiz_id):
+    c = db.cursor()
+    c.execute("""
+        SELECT id, question, option_a, option_b, option_c, option_d, correct_option
+        FROM mentor_quiz_questions
+        WHERE quiz_id = ?
+        ORDER BY id
+    """, (quiz_id,))
+    return c.fetchall()
+
+
+def insert_mentor_quiz(conn, title, description, created_by):
+    conn.execute("""
+        INSERT INTO mentor_quizzes (title, description, created_by, created_at)
+        VALUES (?, ?, ?, ?)
+    """, (title, description, created_by, datetime.utcnow().isoformat()))
+
+
+def insert_mentor_quiz_question(conn, values):
+    conn.execute("""
+        INSERT INTO mentor_quiz_questions (
+            quiz_id, question, option_a, option_b, option_c, option_d,
+            correct_option, topic, difficulty
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, values)
+
+
+# Explanation jobs
+def insert_explanation_job(conn, job_id, user_id, queued_at, expire_before):
+    """Store a pending job, dropping those queued before expire_before."""
+    conn.execute("DELETE FROM explanation_jobs WHERE queued_at < ?", (expire_before,))
+    conn.execute("""
+        INSERT INTO explanation_jobs (id, user_id, status, queued_at)
+        VALUES (?, ?, 'pending', ?)
+    """, (job_id, user_id, queued_at))
+
+
+def delete_explanation_job(conn, job_id):
+    conn.execute("DELETE FROM explanation_jobs WHERE id = ?", (job_id,))
+
+
+def finish_explanation_job(conn, job_id, status, explanation, finished_at):
+    conn.execute("""
+        UPDATE explanation_jobs
+        SET status = ?, explanation = ?, finished_at = ?
+        WHERE id = ? AND status = 'pending'
+    """, (status, explanation, finished_at, job_id))
+
+
+def get_explanation_job(db, job_id):
+    c = db.cursor()
+    c.execute("SELECT * FROM explanation_jobs WHERE id = ?", (job_id,))
+    return c.fetchone()
+
+
+# Catalog generations
+def catalog_generation(db, name):
+    c = db.cursor()
+    c.execute("SELECT generation FROM catalog_generations WHERE name = ?", (name,))
+    row = c.fetchone()
+    return row["generation"] if row else 0
+
+
+# Rate limit buckets
+def take_rate_tokens(conn, buckets, now):
+    """Take one token from each of [(key, capacity, refill_per_second)], or
+    from none of them if any is empty.
+
+    Returns None when the tokens were taken, else (key, seconds until it
+    holds a token again) for the first empty bucket. A bucket seen for the
+    first time starts full.
+    """
+    c = conn.cursor()
+    levels = []
+    for key, capacity, refill in buckets:
+        c.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,))
+        row = c.fetchone()
+        tokens = capacity
+        if row is not None:
+            tokens = min(capacity, row["tokens"] + max(now - row["updated_at"], 0) * refill)
+        if tokens < 1:
+            return key, (1 - tokens) / refill
+        levels.append((key, tokens - 1, now))
+    c.executemany("""
+        INSERT INTO rate_buckets (key, tokens, updated_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT (key) DO UPDATE
+        SET tokens = excluded.tokens, updated_at = excluded.updated_at
+    """, levels)
+    return None
+
+
+def return_rate_token(conn, key, capacity):
+    """Give back a token taken by take_rate_tokens, up to the capacity."""
+    conn.execute("""
+        UPDATE rate_buckets
+        SET tokens = CASE WHEN tokens + 1 > ? THEN ? ELSE tokens + 1 END
+        WHERE key = ?
+    """, (capacity, capacity, key))
@@ -0,0 +1,286 @@
+"""Production server: a preforking master with threaded workers.
+
+The master imports the app, migrates the database and warms the caches
+(question index, shared catalogs, compiled templates), closes its
+database connections and freezes the garbage collector, then forks the
+workers. Each worker starts from the warm state, sharing those pages
+with the master copy-on-write, and serves the listening socket they all
+inherited on a fixed pool of threads.
+
+Workers speak HTTP/1.0, one request per connection, and are meant to sit
+behind a reverse proxy that holds the client connections.
+
+Signals to the master:
+  TERM, INT  stop: workers stop accepting, finish the requests they have,
+             their queued explanation jobs and writes, then exit
+  HUP        reload: the master re-executes itself, so code changes are
+             picked up, forks new workers on the same socket and then
+             stops the old ones as above; no connection is refused
+             and no in-flight request, quiz submission included, is cut off
+
+A worker that dies is replaced. Workers that haven't finished
+SMARTPATH_GRACEFUL_TIMEOUT seconds after being told to stop are killed.
+
+Each worker keeps its own counters, caches and stats, so /health and
+/metrics describe the worker that answered. Every /metrics series has a
+pid label naming that worker; a scraper should sum without (pid) for
+the server's totals. A worker replaced on reload or after a crash starts
+new series under its own pid instead of resetting another worker's.
+
+Usage: python server.py [--bind 127.0.0.1:8000] [--workers N] [--threads N]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+BIND = os.getenv("SMARTPATH_BIND", "127.0.0.1:8000")
+WORKERS = int(os.getenv("SMARTPATH_WORKERS", str(os.cpu_count() or 2)))
+THREADS = int(os.getenv("SMARTPATH_THREADS", "8"))
+GRACEFUL_TIMEOUT = float(os.getenv("SMARTPATH_GRACEFUL_TIMEOUT", "30"))
+BACKLOG = int(os.getenv("SMARTPATH_BACKLOG", "1024"))
+
+# handed from a master to the one it re-executes into on HUP
+LISTEN_FD_ENV = "SMARTPATH_LISTEN_FD"
+DRAIN_PIDS_ENV = "SMARTPATH_DRAIN_PIDS"
+
+
+def log(message):
+    print(f"[server {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+class RequestHandler(WSGIRequestHandler):
+    # one request per connection, so an idle client never holds a thread
+    protocol_version = "HTTP/1.0"
+
+
+class WorkerServer(BaseWSGIServer):
+    """werkzeug's WSGI server on an inherited listening socket, handing
+    each connection to a fixed pool of threads."""
+
+    multithread = True
+
+    def __init__(self, fd, app, threads, master_pid):
+        host, port = _address(fd)
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.threads = ThreadPoolExecutor(threads, thread_name_prefix="request")
+        self.master_pid = master_pid
+
+    def process_request(self, request, client_address):
+        self.threads.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def service_actions(self):
+        # the master is gone: stop rather than serve on unsupervised
+        if os.getppid() != self.master_pid:
+            log("master exited; stopping")
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+
+def _address(fd):
+    sock = socket.socket(fileno=os.dup(fd))
+    try:
+        return sock.getsockname()[:2]
+    finally:
+        sock.close()
+
+
+def run_worker(fd, app, threads, master_pid):
+    """Serve until told to stop, drain, and exit; never returns."""
+    import db
+    from explanations import explanation_queue
+
+    server = WorkerServer(fd, app, threads, master_pid)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever, which this thread is running
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    status = 0
+    try:
+        server.serve_forever(poll_interval=0.5)
+        # requests already accepted run to the end, then what they queued
+        server.threads.shutdown(wait=True)
+        explanation_queue.close()
+        db.close_all()
+    except BaseException as e:
+        log(f"worker failed: {e!r}")
+        status = 1
+    finally:
+        os._exit(status)
+
+
+class Master:
+    def __init__(self, fd, workers, threads):
+        self.fd = fd
+        self.workers = workers
+        self.threads = threads
+        self.app = None
+        # pid -> None while serving; pid -> kill deadline once told to stop
+        self.children = {}
+        self.signals = []
+
+    def load(self):
+        """Import and warm the app, then leave nothing open to fork."""
+        import db
+        from app import create_app
+
+        app = create_app(warm=True)
+        db.close_all()
+        gc.collect()
+        # objects that exist now never move, so the collector doesn't
+        # touch (and so copy) the pages workers share with the master
+        gc.freeze()
+        self.app = app
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.fd, self.app, self.threads, os.getppid())
+        self.children[pid] = None
+        return pid
+
+    def stop(self, pid):
+        if self.children.get(pid) is None:
+            self.children[pid] = time.monotonic() + GRACEFUL_TIMEOUT
+            _signal(pid, signal.SIGTERM)
+
+    def serving(self):
+        return [pid for pid, deadline in self.children.items() if deadline is None]
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            deadline = self.children.pop(pid, "unknown")
+            if deadline is None:
+                log(f"worker {pid} exited unexpectedly ({_describe(status)})")
+
+    def kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in self.children.items():
+            if deadline is not None and now > deadline:
+                log(f"worker {pid} still busy after {GRACEFUL_TIMEOUT}s; killing it")
+                _signal(pid, signal.SIGKILL)
+                self.children[pid] = float("inf")
+
+    def run(self, draining):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+        # workers of the master this one replaced: still ours after exec
+        for pid in draining:
+            self.children[pid] = None
+        try:
+            self.load()
+        except Exception as e:
+            if not draining:
+                raise
+            log(f"reload failed, old workers keep serving: {e!r}")
+        if self.app is not None:
+            # new workers first: the socket is never left without one
+            for _ in range(self.workers):
+                self.spawn()
+            for pid in draining:
+                self.stop(pid)
+        log(f"serving with {len(self.serving())} workers x {self.threads} threads")
+
+        while True:
+            self.reap()
+            if self.signals:
+                signum = self.signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self.reexec()
+                else:
+                    log("stopping")
+                    for pid in self.serving():
+                        self.stop(pid)
+                    while self.children:
+                        self.reap()
+                        self.kill_overdue()
+                        time.sleep(0.1)
+                    return
+            if self.app is not None:
+                for _ in range(self.workers - len(self.serving())):
+                    log(f"started worker {self.spawn()}")
+            self.kill_overdue()
+            time.sleep(0.2)
+
+    def reexec(self):
+        log("reloading")
+        os.set_inheritable(self.fd, True)
+        os.environ[LISTEN_FD_ENV] = str(self.fd)
+        os.environ[DRAIN_PIDS_ENV] = ",".join(str(pid) for pid in self.children)
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def _describe(status):
+    if os.WIFSIGNALED(status):
+        return f"signal {os.WTERMSIG(status)}"
+    return f"exit status {os.waitstatus_to_exitcode(status)}"
+
+
+def listen(bind):
+    host, _, port = bind.rpartition(":")
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host.strip("[]") or "0.0.0.0", int(port)))
+    sock.listen(BACKLOG)
+    return sock.detach()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bind", default=BIND, help="host:port to listen on")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS, help="request threads per worker")
+    args = parser.parse_args()
+
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    draining = [int(pid) for pid in os.environ.pop(DRAIN_PIDS_ENV, "").split(",") if pid]
+    if fd is None:
+        fd = listen(args.bind)
+        log(f"listening on {args.bind}")
+    else:
+        fd = int(fd)
+    os.set_inheritable(fd, False)
+    # workers all wait on this socket; non-blocking, so the ones that lose
+    # the race for a connection go back to waiting instead of blocking in
+    # accept() where a stop can't reach them
+    os.set_blocking(fd, False)
+    Master(fd, max(args.workers, 1), max(args.threads, 1)).run(draining)
+
+
+if __name__ == "__main__":
+    main()
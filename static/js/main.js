@@ -31,15 +31,31 @@ function initStudentDashboard() {
     setupTabs();
     setupSettings();
     setupMentorPanels();
-    loadLearningPath();
-    loadProgress().then(() => {
-        generateLessonsFromProgress();
-        loadServerLessons();
-    });
-    loadAssignments();
+    loadStudentBootstrap();
     setupQuiz();
 }
 
+/* --- Initial data: inlined into the page, or one request for every section --- */
+async function loadStudentBootstrap() {
+    let data = window.STUDENT_BOOTSTRAP;
+    if (!data) {
+        try {
+            const res = await fetch(STUDENT_CONTEXT.bootstrapUrl);
+            data = await res.json();
+        } catch (e) {
+            console.error("Dashboard bootstrap error", e);
+            return;
+        }
+    }
+    STUDENT_PROGRESS_CACHE = data.progress;
+    renderProgress(data.progress);
+    renderLearningPath(data.learning_path);
+    generateLessonsFromProgress();
+    renderServerLessons(data.lessons);
+    renderAssignments(data.assignments);
+    renderManualQuizzes(data.manual_quizzes);
+}
+
 /* --- Settings --- */
 function setupSettings() {
     const toggleThemeBtn = document.getElementById("toggle-theme");
@@ -125,25 +141,28 @@ async function loadLearningPath() {
     const url = STUDENT_CONTEXT.learningPathUrl;
     try {
         const res = await fetch(url);
-        const data = await res.json();
-        const container = document.getElementById("learning-path-container");
-        if (!container) return;
-        container.innerHTML = "";
-        data.forEach(item => {
-            const card = document.createElement("div");
-            card.className = "card";
-            card.innerHTML = `
-                <h4>${item.topic_name}</h4>
-                <p class="small">Mastery: <strong>${item.mastery}</strong></p>
-                <p class="muted small">${item.action}</p>
-            `;
-            container.appendChild(card);
-        });
+        renderLearningPath(await res.json());
     } catch (e) {
         console.error("Learning path error", e);
     }
 }
 
+function renderLearningPath(data) {
+    const container = document.getElementById("learning-path-container");
+    if (!container) return;
+    container.innerHTML = "";
+    data.forEach(item => {
+        const card = document.createElement("div");
+        card.className = "card";
+        card.innerHTML = `
+            <h4>${item.topic_name}</h4>
+            <p class="small">Mastery: <strong>${item.mastery}</strong></p>
+            <p class="muted small">${item.action}</p>
+        `;
+        container.appendChild(card);
+    });
+}
+
 /* --- Lessons: AI + Mentor --- */
 function generateLessonsFromProgress() {
     const container = document.getElementById("lessons-container");
@@ -179,29 +198,22 @@ function generateLessonsFromProgress() {
     }
 }
 
-async function loadServerLessons() {
-    const url = STUDENT_CONTEXT.lessonsUrl;
-    try {
-        const res = await fetch(url);
-        const data = await res.json();
-        const container = document.getElementById("lessons-container");
-        if (!container) return;
+function renderServerLessons(data) {
+    const container = document.getElementById("lessons-container");
+    if (!container) return;
 
-        data.forEach(l => {
-            const card = document.createElement("div");
-            card.className = "card";
-            card.innerHTML = `
-                <h4>${l.title}</h4>
-                <p class="small muted">${l.topic || ""}</p>
-                <p class="small">${l.description || ""}</p>
-                ${l.video_url ? `<a href="${l.video_url}" target="_blank" class="btn btn-outline small" style="margin-top:6px;">Open Video</a>` : ""}
-                <p class="small muted" style="margin-top:4px;">By ${l.mentor_name}</p>
-            `;
-            container.appendChild(card);
-        });
-    } catch (e) {
-        console.error("Lessons error", e);
-    }
+    data.forEach(l => {
+        const card = document.createElement("div");
+        card.className = "card";
+        card.innerHTML = `
+            <h4>${l.title}</h4>
+            <p class="small muted">${l.topic || ""}</p>
+            <p class="small">${l.description || ""}</p>
+            ${l.video_url ? `<a href="${l.video_url}" target="_blank" class="btn btn-outline small" style="margin-top:6px;">Open Video</a>` : ""}
+            <p class="small muted" style="margin-top:4px;">By ${l.mentor_name}</p>
+        `;
+        container.appendChild(card);
+    });
 }
 
 /* --- Assignments --- */
@@ -209,41 +221,47 @@ async function loadAssignments() {
     const url = STUDENT_CONTEXT.assignmentsUrl;
     try {
         const res = await fetch(url);
-        const data = await res.json();
-        const container = document.getElementById("assignments-container");
-        if (!container) return;
-        container.innerHTML = "";
-        data.forEach(a => {
-            const card = document.createElement("div");
-            card.className = "card";
-            const sub = a.submission || {};
-            card.innerHTML = `
-                <h4>${a.title}</h4>
-                <p class="small">${a.description}</p>
-                <p class="small muted">Due: ${a.due_date || "N/A"}</p>
-                <textarea data-assignment-id="${a.id}" class="assignment-text" placeholder="Write your answer here...">${sub.content || ""}</textarea>
-                <button class="btn btn-primary small submit-assignment-btn" data-assignment-id="${a.id}">Submit</button>
-                ${sub.submitted_at ? `<p class="small muted">Submitted at: ${sub.submitted_at}</p>` : ""}
-                ${sub.feedback ? `<p class="small">Feedback: ${sub.feedback}</p>` : ""}
-                ${sub.rating ? `<p class="small">Rating: ${sub.rating}/10</p>` : ""}
-            `;
-            container.appendChild(card);
-        });
-
-        container.addEventListener("click", async (e) => {
-            if (e.target.classList.contains("submit-assignment-btn")) {
-                const id = parseInt(e.target.getAttribute("data-assignment-id"), 10);
-                const textarea = container.querySelector(`textarea[data-assignment-id="${id}"]`);
-                const content = textarea ? textarea.value : "";
-                await submitAssignment(id, content);
-                await loadAssignments();
-            }
-        });
+        renderAssignments(await res.json());
     } catch (e) {
         console.error("Assignments error", e);
     }
 }
 
+function renderAssignments(data) {
+    const container = document.getElementById("assignments-container");
+    if (!container) return;
+    container.innerHTML = "";
+    data.forEach(a => {
+        const card = document.createElement("div");
+        card.className = "card";
+        const sub = a.submission || {};
+        card.innerHTML = `
+            <h4>${a.title}</h4>
+            <p class="small">${a.description}</p>
+            <p class="small muted">Due: ${a.due_date || "N/A"}</p>
+            <textarea data-assignment-id="${a.id}" class="assignment-text" placeholder="Write your answer here...">${sub.content || ""}</textarea>
+            <button class="btn btn-primary small submit-assignment-btn" data-assignment-id="${a.id}">Submit</button>
+            ${sub.submitted_at ? `<p class="small muted">Submitted at: ${sub.submitted_at}</p>` : ""}
+            ${sub.feedback ? `<p class="small">Feedback: ${sub.feedback}</p>` : ""}
+            ${sub.rating ? `<p class="small">Rating: ${sub.rating}/10</p>` : ""}
+        `;
+        container.appendChild(card);
+    });
+
+    // the container outlives re-renders, so bind its click handler only once
+    if (container.dataset.bound) return;
+    container.dataset.bound = "1";
+    container.addEventListener("click", async (e) => {
+        if (e.target.classList.contains("submit-assignment-btn")) {
+            const id = parseInt(e.target.getAttribute("data-assignment-id"), 10);
+            const textarea = container.querySelector(`textarea[data-assignment-id="${id}"]`);
+            const content = textarea ? textarea.value : "";
+            await submitAssignment(id, content);
+            await loadAssignments();
+        }
+    });
+}
+
 async function submitAssignment(assignmentId, content) {
     const url = STUDENT_CONTEXT.assignmentSubmitUrl;
     await fetch(url, {
@@ -293,26 +311,31 @@ async function loadManualQuizzes() {
 
     try {
         const res = await fetch(url);
-        const data = await res.json();
-        select.innerHTML = "";
-        if (!data.length) {
-            const opt = document.createElement("option");
-            opt.value = "";
-            opt.textContent = "No quizzes created by mentor yet";
-            select.appendChild(opt);
-            return;
-        }
-        data.forEach(q => {
-            const opt = document.createElement("option");
-            opt.value = q.id;
-            opt.textContent = `${q.title} (${q.question_count} questions)`;
-            select.appendChild(opt);
-        });
+        renderManualQuizzes(await res.json());
     } catch (e) {
         console.error("Manual quizzes error", e);
     }
 }
 
+function renderManualQuizzes(data) {
+    const select = document.getElementById("manual-quiz-list");
+    if (!select) return;
+    select.innerHTML = "";
+    if (!data.length) {
+        const opt = document.createElement("option");
+        opt.value = "";
+        opt.textContent = "No quizzes created by mentor yet";
+        select.appendChild(opt);
+        return;
+    }
+    data.forEach(q => {
+        const opt = document.createElement("option");
+        opt.value = q.id;
+        opt.textContent = `${q.title} (${q.question_count} questions)`;
+        select.appendChild(opt);
+    });
+}
+
 async function generateQuiz(payload) {
     const url = STUDENT_CONTEXT.quizGenerateUrl;
     const container = document.getElementById("quiz-container");
@@ -325,7 +348,9 @@ async function generateQuiz(payload) {
             headers: {"Content-Type": "application/json"},
             body: JSON.stringify(payload || {})
         });
-        const questions = await res.json();
+        const data = await res.json();
+        const questions = data.questions || [];
+        const sessionId = data.session_id;
         container.innerHTML = "";
 
         if (!questions.length) {
@@ -349,22 +374,45 @@ async function generateQuiz(payload) {
             container.appendChild(card);
         });
 
+        const submitBtn = document.createElement("button");
+        submitBtn.className = "btn btn-primary";
+        submitBtn.id = "quiz-submit-btn";
+        submitBtn.textContent = "Submit quiz";
+        container.appendChild(submitBtn);
+
         // Remove any existing listeners before adding new one
         const newContainer = container.cloneNode(true);
         container.replaceWith(newContainer);
-        
-        // Add event listener without 'once' so it persists for all questions
+
         const updatedContainer = document.getElementById("quiz-container");
+        const selected = {};
         updatedContainer.addEventListener("click", async (e) => {
             if (e.target.classList.contains("quiz-opt")) {
+                if (e.target.disabled) return;
                 const qid = parseInt(e.target.getAttribute("data-qid"), 10);
-                const opt = e.target.getAttribute("data-opt");
-                const modeSelect = document.getElementById("quiz-mode");
-                const mode = modeSelect ? modeSelect.value : "smart";
-                await submitQuizAnswer(qid, opt, mode);
-                // Disable the clicked button to prevent re-submission
+                selected[qid] = e.target.getAttribute("data-opt");
+                e.target.parentElement.querySelectorAll(".quiz-opt").forEach(btn => {
+                    btn.classList.toggle("btn-primary", btn === e.target);
+                    btn.classList.toggle("btn-outline", btn !== e.target);
+                });
+            } else if (e.target.id === "quiz-submit-btn") {
+                const answers = questions
+                    .filter(q => selected[q.id])
+                    .map(q => ({question_id: q.id, selected_option: selected[q.id]}));
+                if (!answers.length) {
+                    alert("Pick an answer for at least one question.");
+                    return;
+                }
                 e.target.disabled = true;
-                e.target.style.opacity = "0.5";
+                updatedContainer.querySelectorAll(".quiz-opt").forEach(btn => {
+                    btn.disabled = true;
+                });
+                await submitQuiz(sessionId, answers, e.target);
+            } else if (e.target.classList.contains("quiz-explain")) {
+                e.target.disabled = true;
+                const qid = parseInt(e.target.getAttribute("data-qid"), 10);
+                const target = e.target.parentElement.querySelector(".quiz-explanation");
+                await explainAnswer(sessionId, qid, target);
             }
         });
     } catch (e) {
@@ -372,28 +420,35 @@ async function generateQuiz(payload) {
     }
 }
 
-async function submitQuizAnswer(questionId, selectedOpt, mode) {
-    const url = STUDENT_CONTEXT.quizSubmitUrl;
+async function submitQuiz(sessionId, answers, submitBtn) {
+    const url = STUDENT_CONTEXT.quizSubmitBatchUrl;
     try {
         const res = await fetch(url, {
             method: "POST",
             headers: {"Content-Type": "application/json"},
-            body: JSON.stringify({
-                question_id: questionId,
-                selected_option: selectedOpt,
-                mode
-            })
+            body: JSON.stringify({session_id: sessionId, answers})
         });
         const data = await res.json();
-        const fb = document.getElementById(`feedback-${questionId}`);
-        if (fb) {
-            const correct = data.correct_option;
-            if (data.is_correct) {
-                fb.innerHTML = `<span style="color:#22c55e;">Correct ✅</span><br>${data.explanation}`;
-            } else {
-                fb.innerHTML = `<span style="color:#ef4444;">Wrong ❌</span> (Correct: ${correct.toUpperCase()})<br>${data.explanation}`;
-            }
+        if (!res.ok) {
+            alert(data.error || "Could not submit quiz");
+            submitBtn.disabled = false;
+            return;
         }
+        data.results.forEach(r => {
+            const fb = document.getElementById(`feedback-${r.question_id}`);
+            if (!fb) return;
+            if (r.error) {
+                fb.textContent = r.error;
+                return;
+            }
+            const verdict = r.is_correct
+                ? `<span style="color:#22c55e;">Correct ✅</span>`
+                : `<span style="color:#ef4444;">Wrong ❌</span> (Correct: ${r.correct_option.toUpperCase()})`;
+            fb.innerHTML = `${verdict}
+                <button class="btn btn-outline small quiz-explain" data-qid="${r.question_id}">Why?</button>
+                <br><span class="quiz-explanation"></span>`;
+        });
+        submitBtn.textContent = `Score: ${data.correct}/${data.graded}`;
         // Refresh progress/learning path lightly
         loadProgress().then(() => {
             loadLearningPath();
@@ -401,6 +456,54 @@ async function submitQuizAnswer(questionId, selectedOpt, mode) {
         });
     } catch (e) {
         console.error("Submit quiz error", e);
+        submitBtn.disabled = false;
+    }
+}
+
+async function explainAnswer(sessionId, questionId, target) {
+    if (!target) return;
+    const url = STUDENT_CONTEXT.quizExplainUrl;
+    target.textContent = "Loading explanation...";
+    try {
+        const res = await fetch(url, {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({
+                session_id: sessionId,
+                question_id: questionId
+            })
+        });
+        const data = await res.json();
+        if (data.explanation) {
+            target.textContent = data.explanation;
+        } else if (data.explanation_url) {
+            pollExplanation(data.explanation_url, target);
+        } else {
+            target.textContent = data.error || "Could not load explanation.";
+        }
+    } catch (e) {
+        console.error("Explain answer error", e);
+        target.textContent = "Could not load explanation.";
+    }
+}
+
+async function pollExplanation(url, target, attempt = 0) {
+    if (!target) return;
+    try {
+        const res = await fetch(url);
+        const data = await res.json();
+        if (data.status === "pending" && attempt < 40) {
+            setTimeout(() => pollExplanation(url, target, attempt + 1), 750);
+            return;
+        }
+        if (data.status === "done" || data.status === "error") {
+            target.textContent = data.explanation;
+        } else {
+            target.textContent = "Explanation is taking too long. Try again later.";
+        }
+    } catch (e) {
+        console.error("Explanation poll error", e);
+        target.textContent = "Could not load explanation.";
     }
 }
 
@@ -458,8 +561,8 @@ function setupMentorPanels() {
             if (!msg) return;
             appendAiMessage(aiMessages, "You", msg);
             aiInput.value = "";
-            const reply = await callAiMentor(msg);
-            appendAiMessage(aiMessages, "AI Mentor", reply);
+            const replyEl = appendAiMessage(aiMessages, "AI Mentor", "");
+            await streamAiMentor(msg, replyEl, aiMessages);
         });
     }
 
@@ -484,24 +587,52 @@ function appendAiMessage(container, author, text) {
     if (!container) return;
     const div = document.createElement("div");
     div.className = "small";
-    div.innerHTML = `<strong>${author}:</strong> ${text}`;
+    div.innerHTML = `<strong>${author}:</strong> <span class="ai-text"></span>`;
+    div.querySelector(".ai-text").textContent = text;
     container.appendChild(div);
     container.scrollTop = container.scrollHeight;
+    return div.querySelector(".ai-text");
 }
 
-async function callAiMentor(message) {
+/* Streams the reply over Server-Sent Events, rendering tokens as they arrive.
+   Falls back to the plain JSON reply when the server doesn't stream. */
+async function streamAiMentor(message, target, container) {
+    if (!target) return;
     const url = STUDENT_CONTEXT.aiMentorUrl;
     try {
         const res = await fetch(url, {
             method: "POST",
             headers: {"Content-Type": "application/json"},
-            body: JSON.stringify({ message })
+            body: JSON.stringify({ message, stream: true })
         });
-        const data = await res.json();
-        return data.reply || "I couldn't generate a reply.";
+        const type = res.headers.get("Content-Type") || "";
+        if (!res.body || !type.startsWith("text/event-stream")) {
+            const data = await res.json();
+            target.textContent = data.reply || data.error || "I couldn't generate a reply.";
+            return;
+        }
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let sep;
+            while ((sep = buffer.indexOf("\n\n")) !== -1) {
+                const event = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+                if (event.startsWith("event: done")) return;
+                const dataLine = event.split("\n").find(l => l.startsWith("data: "));
+                if (!dataLine) continue;
+                target.textContent += JSON.parse(dataLine.slice(6)).text;
+                if (container) container.scrollTop = container.scrollHeight;
+            }
+        }
     } catch (e) {
-        console.error("AI mentor error", e);
-        return "Error talking to AI mentor.";
+        console.error("AI mentor stream error", e);
+        if (!target.textContent) target.textContent = "Error talking to AI mentor.";
     }
 }
 
@@ -717,15 +848,21 @@ async function saveMentorFeedback(submissionId, feedback, rating) {
 }
 
 /* --- Mentor: messages --- */
-async function loadMentorMessages() {
-    const url = MENTOR_CONTEXT.messagesUrl;
+let MENTOR_MESSAGES_CURSOR = null;
+
+async function loadMentorMessages(append = false) {
+    const url = new URL(MENTOR_CONTEXT.messagesUrl, window.location.origin);
     const container = document.getElementById("mentor-messages");
+    const moreBtn = document.getElementById("mentor-messages-more");
     if (!container) return;
+    if (append && MENTOR_MESSAGES_CURSOR) {
+        url.searchParams.set("cursor", MENTOR_MESSAGES_CURSOR);
+    }
     try {
         const res = await fetch(url);
         const data = await res.json();
-        container.innerHTML = "";
-        data.forEach(m => {
+        if (!append) container.innerHTML = "";
+        data.messages.forEach(m => {
             const card = document.createElement("div");
             card.className = "card";
             card.innerHTML = `
@@ -739,6 +876,17 @@ async function loadMentorMessages() {
             container.appendChild(card);
         });
 
+        MENTOR_MESSAGES_CURSOR = data.next_cursor;
+        if (moreBtn) moreBtn.classList.toggle("hidden", !data.next_cursor);
+        const badge = document.getElementById("mentor-unanswered-badge");
+        if (badge) {
+            badge.textContent = data.unanswered_count;
+            badge.classList.toggle("hidden", !data.unanswered_count);
+        }
+
+        // bind once; the container and button outlive reloads
+        if (container.dataset.bound) return;
+        container.dataset.bound = "1";
         container.addEventListener("click", async (e) => {
             if (e.target.classList.contains("answer-msg-btn")) {
                 const id = e.target.getAttribute("data-msg-id");
@@ -748,6 +896,7 @@ async function loadMentorMessages() {
                 await loadMentorMessages();
             }
         });
+        if (moreBtn) moreBtn.addEventListener("click", () => loadMentorMessages(true));
     } catch (e) {
         console.error("Mentor messages error", e);
     }
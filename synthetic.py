@@ -0,0 +1,159 @@
+import itertools
+import random
+from datetime import datetime, timedelta
+
+TOPICS = [
+    "Variables", "Loops", "Functions", "Conditions", "Lists",
+    "OOP", "Dictionaries", "Strings", "Recursion", "Files",
+]
+DIFFICULTIES = ["easy", "medium", "hard"]
+SYNTHETIC_PASSWORD = "synthetic"
+CHUNK_SIZE = 10000
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert(db, sql, rows):
+    """executemany in CHUNK_SIZE transactions; returns the row count."""
+    c = db.cursor()
+    total = 0
+    for chunk in _chunks(rows):
+        db.begin_exclusive()
+        c.executemany(sql, chunk)
+        db.commit()
+        total += len(chunk)
+    return total
+
+
+def generate_dataset(db, students=1000, mentors=10, questions=500, attempts=100000,
+                     assignments=20, submission_rate=0.5, messages=5000, seed=0):
+    """Bulk-load a synthetic course into db and return {table: rows added}.
+
+    Users get SYNTHETIC_PASSWORD so benchmarks can log in as them. Rows are
+    written straight through executemany in chunked transactions; the
+    projection triggers still run, so user_topic_stats and
+    mentor_inbox_counts stay consistent with what was loaded.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    c = db.cursor()
+    # a second load into the same database gets fresh emails
+    c.execute("SELECT COALESCE(MAX(id), 0) AS n FROM users")
+    run = c.fetchone()["n"]
+    counts = {}
+
+    def stamp(max_days=90):
+        return (now - timedelta(seconds=rng.randrange(max_days * 86400))).isoformat()
+
+    counts["users"] = _insert(db, """
+        INSERT INTO users (name, email, password, role) VALUES (?, ?, ?, ?)
+    """, itertools.chain(
+        ((f"Mentor {i}", f"mentor{run}-{i}@synthetic.local", SYNTHETIC_PASSWORD, "mentor")
+         for i in range(mentors)),
+        ((f"Student {i}", f"student{run}-{i}@synthetic.local", SYNTHETIC_PASSWORD, "student")
+         for i in range(students)),
+    ))
+    c.execute("SELECT id FROM users WHERE role = 'mentor' AND id > ?", (run,))
+    mentor_ids = [r["id"] for r in c.fetchall()]
+    c.execute("SELECT id FROM users WHERE role = 'student' AND id > ?", (run,))
+    student_ids = [r["id"] for r in c.fetchall()]
+
+    counts["questions"] = _insert(db, """
+        INSERT INTO questions (
+            topic, difficulty, question,
+            option_a, option_b, option_c, option_d, correct_option
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (rng.choice(TOPICS), rng.choice(DIFFICULTIES), f"Synthetic question {i}?",
+         "Option A", "Option B", "Option C", "Option D", rng.choice("abcd"))
+        for i in range(questions)
+    ))
+    c.execute("SELECT id FROM questions")
+    question_ids = [r["id"] for r in c.fetchall()]
+
+    if student_ids and question_ids:
+        # each student gets a skill level so accuracy varies realistically
+        skill = {uid: rng.uniform(0.3, 0.9) for uid in student_ids}
+        counts["quiz_attempts"] = _insert(db, """
+            INSERT INTO quiz_attempts (user_id, question_id, is_correct, source, created_at)
+            VALUES (?, ?, ?, 'bank', ?)
+        """, (
+            (uid, rng.choice(question_ids), int(rng.random() < skill[uid]), stamp())
+            for uid in (rng.choice(student_ids) for _ in range(attempts))
+        ))
+
+    counts["assignments"] = _insert(db, """
+        INSERT INTO assignments (title, description, due_date) VALUES (?, ?, ?)
+    """, (
+        (f"Synthetic assignment {i}", f"Practice set {i} for {rng.choice(TOPICS)}.",
+         (now + timedelta(days=rng.randrange(-30, 60))).date().isoformat())
+        for i in range(assignments)
+    ))
+    c.execute("SELECT id FROM assignments ORDER BY id DESC LIMIT ?", (assignments,))
+    assignment_ids = [r["id"] for r in c.fetchall()]
+
+    counts["assignment_submissions"] = _insert(db, """
+        INSERT INTO assignment_submissions (
+            assignment_id, student_id, content, submitted_at, feedback, rating
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    """, (
+        (aid, uid, "print('hello')", stamp(),
+         *(("Good work.", rng.randint(1, 10)) if rng.random() < 0.5 else (None, None)))
+        for aid in assignment_ids
+        for uid in student_ids
+        if rng.random() < submission_rate
+    ))
+
+    if mentor_ids and student_ids:
+        def message(i):
+            answered = rng.random() < 0.6
+            return (
+                rng.choice(student_ids), rng.choice(mentor_ids),
+                f"Synthetic question {i} about {rng.choice(TOPICS)}",
+                "Synthetic answer" if answered else None,
+                stamp(),
+                stamp(1) if answered else None,
+            )
+
+        counts["mentor_messages"] = _insert(db, """
+            INSERT INTO mentor_messages (
+                student_id, mentor_id, question_text, answer_text, created_at, answered_at
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (message(i) for i in range(messages)))
+
+        counts["lessons"] = _insert(db, """
+            INSERT INTO lessons (title, description, video_url, topic, created_by, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            (f"{topic} walkthrough", f"Lesson on {topic}.", "https://example.com/video",
+             topic, rng.choice(mentor_ids), stamp())
+            for topic in TOPICS
+        ))
+
+        counts["mentor_quizzes"] = _insert(db, """
+            INSERT INTO mentor_quizzes (title, description, created_by, created_at)
+            VALUES (?, ?, ?, ?)
+        """, ((f"Mentor {mentor_id} checkpoint", "Synthetic quiz", mentor_id, stamp())
+              for mentor_id in mentor_ids))
+        c.execute("SELECT id FROM mentor_quizzes ORDER BY id DESC LIMIT ?", (len(mentor_ids),))
+        quiz_ids = [r["id"] for r in c.fetchall()]
+        counts["mentor_quiz_questions"] = _insert(db, """
+            INSERT INTO mentor_quiz_questions (
+                quiz_id, question, option_a, option_b, option_c, option_d,
+                correct_option, topic, difficulty
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'manual')
+        """, (
+            (quiz_id, f"Checkpoint question {i}?", "A", "B", "C", "D",
+             rng.choice("abcd"), rng.choice(TOPICS))
+            for quiz_id in quiz_ids
+            for i in range(5)
+        ))
+
+    return counts
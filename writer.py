@@ -0,0 +1,204 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from pool import get_pool
+
+# longest the writer lingers for more writes before committing a batch
+WRITE_BATCH_WINDOW_MS = float(os.getenv("SMARTPATH_WRITE_BATCH_WINDOW_MS", "2"))
+WRITE_MAX_BATCH = int(os.getenv("SMARTPATH_WRITE_MAX_BATCH", "256"))
+# how long a request thread waits for its write to be committed
+WRITE_TIMEOUT = float(os.getenv("SMARTPATH_WRITE_TIMEOUT", "30"))
+
+_STOP = object()
+
+
+class DbWriter:
+    """Single background thread that owns the SQLite write connection.
+
+    Request threads queue write functions and get a Future back. The
+    writer takes everything queued behind the write it is about to run,
+    lingering up to the batch window for stragglers while the batch is
+    still smaller than the previous one, and runs it as one
+    BEGIN IMMEDIATE ... COMMIT. Concurrent writers share one lock
+    acquisition and one WAL sync instead of racing for the lock.
+    Each write runs under its own savepoint: one that raises is rolled
+    back and fails alone without taking the rest of the batch with it.
+
+    Write functions are called as fn(conn, *args) on the writer thread.
+    They must not commit, and must not wait on another write.
+    """
+
+    def __init__(self, connect, window_ms=WRITE_BATCH_WINDOW_MS, max_batch=WRITE_MAX_BATCH):
+        self._connect = connect
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=1000)
+        self._queue_waits = deque(maxlen=1000)
+        self._commit_times = deque(maxlen=1000)
+        self._stats = {"writes": 0, "batches": 0, "errors": 0, "failed_commits": 0}
+
+    def submit(self, fn, *args):
+        """Queue fn(conn, *args); returns a Future for its return value."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((fn, args, future, time.perf_counter()))
+        return future
+
+    def write(self, fn, *args):
+        """Queue fn(conn, *args) and wait until it is committed."""
+        return self.submit(fn, *args).result(timeout=WRITE_TIMEOUT)
+
+    def close(self):
+        """Commit whatever is queued and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            # fail what is queued now; the next submit starts a new thread
+            with self._lock:
+                self._thread = None
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    return
+                if item is not _STOP:
+                    item[2].set_exception(e)
+        last_size = 0
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                stopping = False
+                # linger for stragglers only until the batch is as big as
+                # the last one; a lone writer never pays the window
+                deadline = time.perf_counter() + self.window
+                while len(batch) < self.max_batch:
+                    try:
+                        remaining = deadline - time.perf_counter()
+                        if remaining > 0 and len(batch) < last_size:
+                            item = self._queue.get(timeout=remaining)
+                        else:
+                            item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit(conn, batch)
+                last_size = len(batch)
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        started = time.perf_counter()
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    results.append(None)
+                    continue
+                conn.execute("SAVEPOINT write")
+                try:
+                    value = fn(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    results.append((False, e))
+                else:
+                    results.append((True, value))
+                conn.execute("RELEASE write")
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                self._stats["failed_commits"] += 1
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        with self._lock:
+            self._stats["batches"] += 1
+            self._batch_sizes.append(len(batch))
+            self._commit_times.append(finished - started)
+            for (_, _, _, queued_at), result in zip(batch, results):
+                self._queue_waits.append(started - queued_at)
+                if result is None:
+                    continue
+                self._stats["writes" if result[0] else "errors"] += 1
+
+        for (_, _, future, _), result in zip(batch, results):
+            if result is None:
+                continue
+            ok, value = result
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            batch_sizes = sorted(self._batch_sizes)
+            queue_waits = sorted(self._queue_waits)
+            commit_times = sorted(self._commit_times)
+        data["queue_depth"] = self._queue.qsize()
+        if batch_sizes:
+            data["batch_size_avg"] = round(sum(batch_sizes) / len(batch_sizes), 2)
+            data["batch_size_max"] = batch_sizes[-1]
+        for name, values in (("queue_wait", queue_waits), ("commit", commit_times)):
+            if values:
+                data[f"{name}_p50_seconds"] = round(values[len(values) // 2], 6)
+                data[f"{name}_p95_seconds"] = round(values[int(len(values) * 0.95)], 6)
+                data[f"{name}_max_seconds"] = round(values[-1], 6)
+        return data
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path):
+    writer = _writers.get(path)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = _writers[path] = DbWriter(get_pool(path).connect)
+                atexit.register(writer.close)
+    return writer
+
+
+def close_writers():
+    """Commit what every writer has queued, stop their threads and forget
+    them; the next get_writer() starts a fresh one."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()